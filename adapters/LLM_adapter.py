@@ -6,6 +6,11 @@ from gymnasium.spaces import Box
 # Link to relevant ENCODER
 from elsciRL.adapters.LLM_state_generators.text_ollama import OllamaAdapter
 
+from environment.state_codec import StateCodec
+from adapters.llm_requests import OllamaClient, LLMRequestEngine
+from adapters.llm_cache import LLMResponseCache
+from environment.instrumentation import instrument, register_cache
+
 
 class Adapter:
     def __init__(self, setup_info:dict={}) -> None:        
@@ -19,13 +24,80 @@ class Adapter:
             action_history_length=setup_info.get('action_history_length', 5),
             encoder=setup_info.get('encoder', 'MiniLM_L6v2')
         )
+        # Decoder for integer state ids
+        self.state_codec = StateCodec(setup_info.get('obs_precision', 2))
+
+        # Optional concurrent request layer replacing the blocking ollama.chat call
+        self.request_engine = None
+        if setup_info.get('llm_request_engine', False):
+            client = OllamaClient(
+                model_name=self.LLM_adapter.model_name,
+                system_prompt=self.LLM_adapter.base_prompt,
+                context_length=self.LLM_adapter.manual_context_length,
+                base_url=setup_info.get('ollama_url', 'http://localhost:11434'),
+                timeout=setup_info.get('llm_timeout', 60)
+            )
+            self.request_engine = LLMRequestEngine(
+                client,
+                max_concurrency=setup_info.get('llm_max_concurrency', 4),
+                max_batch_size=setup_info.get('llm_max_batch_size', 8),
+                max_retries=setup_info.get('llm_max_retries', 3)
+            )
+            self.LLM_adapter.call_ollama_api = self.call_request_engine
+
+        # Optional persistent response cache, wraps whichever call path is active
+        self.response_cache = None
+        if setup_info.get('llm_cache_path', None):
+            self.encoder_name = setup_info.get('encoder', 'MiniLM_L6v2')
+            self.response_cache = LLMResponseCache(
+                setup_info['llm_cache_path'],
+                max_bytes=setup_info.get('llm_cache_max_bytes', 256*1024**2)
+            )
+            self.uncached_call = self.LLM_adapter.call_ollama_api
+            self.LLM_adapter.call_ollama_api = self.call_cached
+
+        # Optional call timing ('instrument': True or SAILING_INSTRUMENT=1), off by default
+        instrument(self, 'adapter.LLM', ['adapter'], setup_info)
+        instrument(self.LLM_adapter, 'llm', ['call_ollama_api'], setup_info)
+        instrument(self.LLM_adapter.encoder, 'encoder.LLM', ['encode'], setup_info)
+        if self.response_cache is not None:
+            register_cache('adapter.LLM.response_cache', self.response_cache, setup_info=setup_info)
+        if self.request_engine is not None:
+            # Prompts answered by an identical in-flight request
+            register_cache('adapter.LLM.request_coalescing', self.request_engine, setup_info=setup_info,
+                           stats=lambda engine: {'hits': engine.stats['coalesced'],
+                                                 'misses': engine.stats['requests'] - engine.stats['coalesced']})
+
+    def call_request_engine(self, prompt: str):
+        """Drop-in for OllamaAdapter.call_ollama_api that goes through the request engine."""
+        try:
+            return {'message': {'content': self.request_engine.request(prompt)}}
+        except Exception as e:
+            print(f"Error calling Ollama API: {e}")
+            return None
+
+    def call_cached(self, prompt: str):
+        """Serve responses from the persistent cache, only calling the model on a miss."""
+        key = (self.LLM_adapter.model_name, self.LLM_adapter.base_prompt, prompt,
+               self.LLM_adapter.manual_context_length, self.encoder_name)
+        cached_response = self.response_cache.get(*key)
+        if cached_response is not None:
+            return {'message': {'content': cached_response}}
+        response = self.uncached_call(prompt)
+        if response and 'message' in response:
+            self.response_cache.put(*key, response['message']['content'])
+        return response
 
         
     def adapter(self, state: str, legal_moves:list = None, episode_action_history:list = None, encode:bool=True, indexed: bool = False) -> Tensor:     
         """ Use Language description for every student for current grid position """
 
-        x = float(state.split('_')[0])
-        angle = float(state.split('_')[1])
+        # Integer state ids (Engine obs_mode 'id') are decoded without string parsing
+        if isinstance(state, str):
+            x = float(state.split('_')[0])
+            angle = float(state.split('_')[1])
+        else:
+            x, angle = self.state_codec.decode(state)
         
         # Horizontal position
         if (x>-1)&(x<1):
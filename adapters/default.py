@@ -7,6 +7,10 @@ from torch import Tensor
 from elsciRL.encoders.poss_state_encoded import StateEncoder
 from gymnasium.spaces import Discrete
 
+from adapters.grid_encoder import GridIndexEncoder
+from adapters.lazy_one_hot import LazyOneHotEncoder
+from environment.instrumentation import instrument
+
 class Adapter:
     # ------ Static Methods ---------------------------------------
     # - Defined by simulator source https://github.com/PPierzc/ai-learns-to-sail/blob/master/tasks/channel.py
@@ -59,11 +63,24 @@ class Adapter:
         self.observation_space = Discrete(2000*30)
 
         # elsciRL state encoder is large and not needed for tabular agents
-        self.one_hot_encoder = StateEncoder(self.num_states)
+        # - one_hot_mode 'lazy', 'sparse' or 'index' builds vectors on demand instead of a num_states^2 matrix
+        one_hot_mode = setup_info.get('one_hot_mode', 'eager')
+        if one_hot_mode == 'eager':
+            self.one_hot_encoder = StateEncoder(self.num_states)
+        else:
+            self.one_hot_encoder = LazyOneHotEncoder(self.num_states, mode=one_hot_mode)
         # Create a mapping from state string to unique id
         self.index_encoder: Dict[str, int] = {}
         self.encoder_idx: int = 0
         self.input_dim = 1
+        # Optional deterministic ids from the exact (x, angle) grid instead of first-seen order
+        if setup_info.get('state_id_mode', 'first_seen') == 'grid':
+            self.grid_encoder = GridIndexEncoder(setup_info['obs_precision'])
+            self.observation_space = Discrete(self.grid_encoder.num_states)
+        else:
+            self.grid_encoder = None
+        # Optional call timing ('instrument': True or SAILING_INSTRUMENT=1), off by default
+        instrument(self, 'adapter.default', ['adapter'], setup_info)
         
     
     
@@ -78,6 +95,8 @@ class Adapter:
                 # elsciRL state encoder is large and not needed for tabular agents
                 # - Causes issure for training neural agents however
                 state_encoded = self.one_hot_encoder.encode(state=state, legal_actions=legal_moves, episode_action_history=episode_action_history, indexed=indexed)
+            elif self.grid_encoder is not None:
+                state_encoded = self.grid_encoder.encode(state)
             else:
                 if state not in self.index_encoder:
                     # If the state is not in the encoder, add it
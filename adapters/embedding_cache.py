@@ -0,0 +1,45 @@
+from collections import OrderedDict
+from torch import Tensor
+
+
+class EmbeddingCache:
+    def __init__(self, max_size:int=4096) -> None:
+        """Bounded least-recently-used cache of sentence -> encoded tensor.
+        Language descriptions are piecewise constant in the state so only a few hundred
+        distinct sentences are ever encoded, max_size=0 disables caching."""
+        self.max_size = max_size
+        self.cache: OrderedDict[str, Tensor] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, sentence:str) -> Tensor:
+        """Return the stored tensor or None, counting the hit or miss."""
+        encoded = self.cache.get(sentence)
+        if encoded is None:
+            self.misses += 1
+            return None
+        self.cache.move_to_end(sentence)
+        self.hits += 1
+        return encoded
+
+    def put(self, sentence:str, encoded:Tensor) -> None:
+        if self.max_size <= 0:
+            return
+        self.cache[sentence] = encoded
+        self.cache.move_to_end(sentence)
+        while len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self.cache)
+
+    def __contains__(self, sentence:str) -> bool:
+        return sentence in self.cache
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {'size': len(self.cache), 'max_size': self.max_size,
+                'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'hit_rate': self.hits/lookups if lookups > 0 else 0.0}
@@ -0,0 +1,30 @@
+import torch
+from torch import Tensor
+
+from environment.state_codec import StateCodec
+
+
+class GridIndexEncoder:
+    def __init__(self, obs_precision:int) -> None:
+        """Deterministic state ids computed from the exact (x, angle) grid.
+        The id of a state is its StateCodec id so it is identical across processes and repeats.
+        All encodings are views into one preallocated tensor, the per-id views are created
+        once on first use and reused so no allocation happens per step."""
+        self.state_codec = StateCodec(obs_precision)
+        self.num_states = self.state_codec.num_states
+        self.pool = torch.arange(self.num_states, dtype=torch.float32)
+        self.views = [None]*self.num_states
+
+    def state_id(self, state:any) -> int:
+        if isinstance(state, str):
+            return self.state_codec.from_str(state)
+        return int(state)
+
+    def encode(self, state:any) -> Tensor:
+        """(1,) float tensor holding the grid id, same shape as the first-seen index encoding."""
+        state_id = self.state_id(state)
+        encoded = self.views[state_id]
+        if encoded is None:
+            encoded = self.pool[state_id:state_id+1]
+            self.views[state_id] = encoded
+        return encoded
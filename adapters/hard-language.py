@@ -1,9 +1,12 @@
 import torch
 
+from environment.instrumentation import instrument
+
 class LanguageAdapter:
     def __init__(self, setup_info):
         # (Optional) Use a real language encoder (sentence transformer, etc.) as needed
-        pass
+        # Optional call timing ('instrument': True or SAILING_INSTRUMENT=1), off by default
+        instrument(self, 'adapter.hard_language', ['adapter'], setup_info)
 
     def adapter(self, state, legal_moves=[], episode_action_history=[], encode=True, indexed=False):
         # Create a human-interpretable description
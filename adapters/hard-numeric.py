@@ -1,9 +1,12 @@
 import torch
 
+from environment.instrumentation import instrument
+
 class DefaultAdapter:
     def __init__(self, setup_info):
         # No discretization needed; continuous state (4 floats)
-        pass
+        # Optional call timing ('instrument': True or SAILING_INSTRUMENT=1), off by default
+        instrument(self, 'adapter.hard_numeric', ['adapter'], setup_info)
 
     def adapter(self, state, legal_moves=[], episode_action_history=[], encode=True, indexed=False):
         # state: [cross_track_error, course_angle_err, distance, r]
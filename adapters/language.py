@@ -7,6 +7,10 @@ from torch import Tensor
 from elsciRL.encoders.language_transformers.MiniLM_L6v2 import LanguageEncoder
 from gymnasium.spaces import Box
 
+from environment.state_codec import StateCodec
+from adapters.embedding_cache import EmbeddingCache
+from environment.instrumentation import instrument, register_cache
+
 class Adapter:
     _cached_state_idx: Dict[str, int] = dict()
 
@@ -16,6 +20,34 @@ class Adapter:
         # Observation is string: "x_angle"
         # -> encoder output is 1x384 tensor from miniLM
         self.observation_space = Box(low=-1, high=1, shape=(1,384), dtype=np.float32)
+        # Decoder for integer state ids
+        self.state_codec = StateCodec(setup_info.get('obs_precision', 2))
+        # Sentences are piecewise constant in x, angle and last action so encodings are cached
+        self.embedding_cache = EmbeddingCache(setup_info.get('embedding_cache_size', 4096))
+        if setup_info.get('embedding_cache_warmup', False):
+            self.warmup()
+        # Optional call timing ('instrument': True or SAILING_INSTRUMENT=1), off by default
+        instrument(self, 'adapter.language', ['adapter'], setup_info)
+        instrument(self.encoder, 'encoder.language', ['encode'], setup_info)
+        register_cache('adapter.language.embedding_cache', self.embedding_cache, setup_info=setup_info)
+
+    def warmup(self) -> None:
+        """Pre-encode every sentence the adapter can produce.
+        x is sampled at each description threshold and between them, angle on the 0.1 rad grid."""
+        x_thresholds = [-10, -7, -5, -3, -1, 0, 1, 3, 5, 7, 10]
+        x_values = x_thresholds + [(a+b)/2 for a, b in zip(x_thresholds[:-1], x_thresholds[1:])] + [-11, 11]
+        angle_values = [np.round(k/10, 1) for k in range(-17, 18)]
+        sentences = set()
+        for x in x_values:
+            for angle in angle_values:
+                state = str(x)+'_'+str(angle)
+                for action_history in [[], [0], [1]]:
+                    sentences.add(self.adapter(state, episode_action_history=action_history, encode=False))
+        sentences = sorted(sentences)
+        # Single batched forward pass, rows kept as 1x384 to match encode() of one sentence
+        encoded = self.encoder.encode(state=sentences)
+        for i, sentence in enumerate(sentences):
+            self.embedding_cache.put(sentence, encoded[i:i+1])
     
     def adapter(self, state:any, legal_moves:list = None, episode_action_history:list = None, encode:bool = True, indexed: bool = False) -> Tensor:
         """ Use Language description for every position in the river."""
@@ -29,8 +61,12 @@ class Adapter:
             # - angle<0 is slightly left
             # - angle>0 is slightly right
 
-        x = float(state.split('_')[0])
-        angle = float(state.split('_')[1])
+        # Integer state ids (Engine obs_mode 'id') are decoded without string parsing
+        if isinstance(state, str):
+            x = float(state.split('_')[0])
+            angle = float(state.split('_')[1])
+        else:
+            x, angle = self.state_codec.decode(state)
         
         # Horizontal position
         if (x>-1)&(x<1):
@@ -103,7 +139,10 @@ class Adapter:
 
         # Encode to Tensor for agents
         if encode:
-            state_encoded = self.encoder.encode(state=state)
+            state_encoded = self.embedding_cache.get(state)
+            if state_encoded is None:
+                state_encoded = self.encoder.encode(state=state)
+                self.embedding_cache.put(state, state_encoded)
         else:
             state_encoded = state
 
@@ -0,0 +1,57 @@
+import sys
+import torch
+from typing import Any, Dict
+from torch import Tensor
+
+ONE_HOT_MODES = ['eager', 'lazy', 'sparse', 'index']
+
+
+class LazyOneHotEncoder:
+    def __init__(self, num_states:int, mode:str='lazy', device:str=None) -> None:
+        """Drop-in for elsciRL's StateEncoder without the (num_states x num_states) identity matrix.
+        States get an index in first-seen order like StateEncoder, vectors are only built when requested:
+        - lazy: dense one-hot float vector created per call
+        - sparse: torch sparse COO one-hot vector
+        - index: (1,) long tensor of the state index, for embedding layers
+        Construction is O(1) whatever the number of states."""
+        if mode not in ONE_HOT_MODES[1:]:
+            raise ValueError(f"mode must be one of {ONE_HOT_MODES[1:]}, got {mode}")
+        self.device = device if device else ("cuda" if torch.cuda.is_available() else "cpu")
+        self.mode = mode
+        self.name = "LazyOneHotEncoder"
+        self.input_type = "list"
+        self.output_type = "tensor"
+        self.output_dim = 1 if mode == 'index' else num_states
+        self.num_states = num_states
+        self.encoder: Dict[Any, int] = {}
+        self.encoder_idx = 0
+
+    def index(self, state:Any) -> int:
+        state_idx = self.encoder.get(state)
+        if state_idx is None:
+            if self.encoder_idx >= self.num_states:
+                raise ValueError(f"More than {self.num_states} distinct states seen by the one-hot encoder")
+            state_idx = self.encoder_idx
+            self.encoder[state] = state_idx
+            self.encoder_idx += 1
+        return state_idx
+
+    def encode(self, state:Any = None, legal_actions:list = None, episode_action_history:list = None,
+               indexed: bool = False) -> Tensor:
+        state_idx = self.index(state)
+        if self.mode == 'index':
+            return torch.tensor([state_idx], dtype=torch.long, device=self.device)
+        if self.mode == 'sparse':
+            return torch.sparse_coo_tensor([[state_idx]], [1.0], (self.num_states,), device=self.device)
+        vector = torch.zeros(self.num_states, device=self.device)
+        vector[state_idx] = 1
+        return vector
+
+    def memory_footprint(self) -> int:
+        """Approximate bytes held by the encoder (the state -> index dict and its keys)."""
+        return sys.getsizeof(self.encoder) + sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in self.encoder.items())
+
+    @staticmethod
+    def eager_footprint(num_states:int) -> int:
+        """Bytes of the identity matrix elsciRL's StateEncoder allocates up front, for comparison."""
+        return (num_states+1)*num_states*4
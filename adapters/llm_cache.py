@@ -0,0 +1,90 @@
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+
+class LLMResponseCache:
+    def __init__(self, path:str, max_bytes:int=256*1024**2, evict_every:int=100) -> None:
+        """Persistent LLM response cache shared safely between processes.
+        Stored in SQLite (WAL mode) keyed by a hash of model name, system prompt, prompt,
+        context length and encoder. When the stored responses exceed max_bytes the least
+        recently used entries are evicted down to 90% of the limit (checked every evict_every inserts)."""
+        self.path = path
+        self.max_bytes = max_bytes
+        self.evict_every = evict_every
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            model TEXT,
+            context_length INTEGER,
+            encoder TEXT,
+            prompt TEXT,
+            response TEXT,
+            size INTEGER,
+            last_access REAL)""")
+        self.connection.execute('CREATE INDEX IF NOT EXISTS responses_last_access ON responses(last_access)')
+        self.connection.commit()
+        self.hits = 0
+        self.misses = 0
+        self.inserts = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(model:str, system_prompt:str, prompt:str, context_length:int, encoder:str) -> str:
+        return hashlib.sha256(json.dumps([model, system_prompt, prompt, context_length, encoder]).encode()).hexdigest()
+
+    def get(self, model:str, system_prompt:str, prompt:str, context_length:int, encoder:str) -> str:
+        """Stored response or None, counting the hit or miss."""
+        key = LLMResponseCache.key(model, system_prompt, prompt, context_length, encoder)
+        with self.lock:
+            row = self.connection.execute('SELECT response FROM responses WHERE key=?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.connection.execute('UPDATE responses SET last_access=? WHERE key=?', (time.time(), key))
+            self.connection.commit()
+        return row[0]
+
+    def put(self, model:str, system_prompt:str, prompt:str, context_length:int, encoder:str, response:str) -> None:
+        key = LLMResponseCache.key(model, system_prompt, prompt, context_length, encoder)
+        size = len(prompt.encode()) + len(response.encode())
+        with self.lock:
+            self.connection.execute('INSERT OR REPLACE INTO responses VALUES (?,?,?,?,?,?,?,?)',
+                                    (key, model, context_length, encoder, prompt, response, size, time.time()))
+            self.connection.commit()
+            self.inserts += 1
+            if self.inserts % self.evict_every == 0:
+                self._evict()
+
+    def _evict(self) -> None:
+        total = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = 0.9*self.max_bytes
+        removed = []
+        for key, size in self.connection.execute('SELECT key, size FROM responses ORDER BY last_access'):
+            if total <= target:
+                break
+            removed.append((key,))
+            total -= size
+        self.connection.executemany('DELETE FROM responses WHERE key=?', removed)
+        self.connection.commit()
+        self.evictions += len(removed)
+
+    def stats(self) -> dict:
+        with self.lock:
+            entries, total = self.connection.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses').fetchone()
+        lookups = self.hits + self.misses
+        return {'entries': entries, 'bytes': total, 'max_bytes': self.max_bytes,
+                'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'hit_rate': self.hits/lookups if lookups > 0 else 0.0}
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
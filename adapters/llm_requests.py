@@ -0,0 +1,145 @@
+import json
+import time
+import random
+import threading
+import urllib.request
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class OllamaClient:
+    def __init__(self, model_name:str='llama3.2', system_prompt:str='', context_length:int=2000,
+                 base_url:str='http://localhost:11434', timeout:float=60) -> None:
+        """Minimal blocking client for the Ollama /api/chat endpoint, same messages as OllamaAdapter."""
+        self.model_name = model_name
+        self.system_prompt = system_prompt
+        self.context_length = context_length
+        self.url = base_url.rstrip('/') + '/api/chat'
+        self.timeout = timeout
+
+    def chat(self, prompt:str) -> str:
+        body = json.dumps({
+            'model': self.model_name,
+            'stream': False,
+            'messages': [
+                {'role': 'system', 'content': self.system_prompt},
+                {'role': 'user', 'content': prompt[:self.context_length]}
+            ]
+        }).encode()
+        request = urllib.request.Request(self.url, data=body, headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read())['message']['content']
+
+
+class LLMRequestEngine:
+    def __init__(self, client, max_concurrency:int=4, max_batch_size:int=8, batch_window:float=0.005,
+                 max_retries:int=3, backoff:float=0.5, timeout:float=None) -> None:
+        """Thread-pooled request layer in front of an LLM client.
+        - at most max_concurrency requests are in flight at once
+        - identical prompts that are already in flight share one request
+        - distinct prompts submitted within batch_window are dispatched together (up to max_batch_size),
+          as one client.chat_batch(prompts) call if the client has one, otherwise concurrently
+        - failed requests are retried with exponential back-off and jitter
+        - timeout bounds how long request() waits for a result"""
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.pool = ThreadPoolExecutor(max_workers=max_concurrency)
+        self.in_flight: dict[str, Future] = {}
+        self.pending: list[str] = []
+        self.lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)
+        self.closed = False
+        self.stats = {'requests': 0, 'coalesced': 0, 'batches': 0, 'calls': 0, 'retries': 0, 'failures': 0}
+        self.dispatcher = threading.Thread(target=self._dispatch_loop, daemon=True)
+        self.dispatcher.start()
+
+    # --------------------------
+    # Public API
+    def submit(self, prompt:str) -> Future:
+        """Queue a prompt and return a Future of the response text."""
+        with self.lock:
+            if self.closed:
+                raise RuntimeError("LLMRequestEngine is closed")
+            self.stats['requests'] += 1
+            future = self.in_flight.get(prompt)
+            if future is not None:
+                self.stats['coalesced'] += 1
+                return future
+            future = Future()
+            self.in_flight[prompt] = future
+            self.pending.append(prompt)
+            self.wakeup.notify()
+        return future
+
+    def request(self, prompt:str) -> str:
+        """Blocking single request."""
+        return self.submit(prompt).result(timeout=self.timeout)
+
+    def map(self, prompts:list) -> list:
+        """Responses for many prompts, submitted together so they are batched and run concurrently."""
+        futures = [self.submit(prompt) for prompt in prompts]
+        return [future.result(timeout=self.timeout) for future in futures]
+
+    def close(self) -> None:
+        with self.lock:
+            self.closed = True
+            self.wakeup.notify()
+        self.dispatcher.join()
+        self.pool.shutdown(wait=True)
+
+    # --------------------------
+    # Dispatch
+    def _dispatch_loop(self) -> None:
+        while True:
+            with self.lock:
+                while not self.pending and not self.closed:
+                    self.wakeup.wait()
+                if self.closed and not self.pending:
+                    return
+            # Let more prompts arrive to fill the micro-batch
+            if self.batch_window > 0:
+                time.sleep(self.batch_window)
+            with self.lock:
+                while self.pending:
+                    batch = self.pending[:self.max_batch_size]
+                    self.pending = self.pending[self.max_batch_size:]
+                    self.stats['batches'] += 1
+                    if hasattr(self.client, 'chat_batch'):
+                        self.pool.submit(self._run_batch, batch)
+                    else:
+                        for prompt in batch:
+                            self.pool.submit(self._run_batch, [prompt])
+
+    def _run_batch(self, prompts:list) -> None:
+        try:
+            responses = self._call_with_retry(prompts)
+        except Exception as error:
+            with self.lock:
+                self.stats['failures'] += len(prompts)
+                futures = [self.in_flight.pop(prompt) for prompt in prompts]
+            for future in futures:
+                future.set_exception(error)
+            return
+        with self.lock:
+            futures = [self.in_flight.pop(prompt) for prompt in prompts]
+        for future, response in zip(futures, responses):
+            future.set_result(response)
+
+    def _call_with_retry(self, prompts:list) -> list:
+        for attempt in range(self.max_retries+1):
+            try:
+                with self.lock:
+                    self.stats['calls'] += 1
+                if len(prompts) > 1:
+                    return self.client.chat_batch(prompts)
+                return [self.client.chat(prompts[0])]
+            except Exception:
+                if attempt == self.max_retries:
+                    raise
+                with self.lock:
+                    self.stats['retries'] += 1
+                time.sleep(self.backoff*(2**attempt)*(0.5 + random.random()))
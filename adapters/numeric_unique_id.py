@@ -2,19 +2,31 @@ from typing import Dict
 import torch
 from torch import Tensor
 
+from adapters.grid_encoder import GridIndexEncoder
+from environment.instrumentation import instrument
+
 class Adapter:
     def __init__(self, setup_info:dict={}) -> None:  
         # Create a mapping from state string to unique id
         self.index_encoder: Dict[str, int] = {}
         self.encoder_idx: int = 0
         self.input_dim = 1
+        # Optional deterministic ids from the exact (x, angle) grid instead of first-seen order
+        if setup_info.get('state_id_mode', 'first_seen') == 'grid':
+            self.grid_encoder = GridIndexEncoder(setup_info['obs_precision'])
+        else:
+            self.grid_encoder = None
+        # Optional call timing ('instrument': True or SAILING_INSTRUMENT=1), off by default
+        instrument(self, 'adapter.numeric_unique_id', ['adapter'], setup_info)
         
     def adapter(self, state:any, legal_moves:list = None, episode_action_history:list = None, encode:bool = True, indexed: bool = False) -> Tensor:
         """ Default adapter to define the state space for the agent in the correct elsciRL format."""
 
         # Encode to Tensor for agents
         if encode:
-            if state not in self.index_encoder:
+            if self.grid_encoder is not None:
+                state_encoded = self.grid_encoder.encode(state)
+            elif state not in self.index_encoder:
                 # If the state is not in the encoder, add it
                 state_encoded = torch.tensor([self.encoder_idx]).float()  # Use the index as the state encoded value
                 # Store the encoded state in the encoder dictionary
@@ -1,125 +1,253 @@
 import os
-import glob
+import argparse
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
+from PIL import Image
+from concurrent.futures import ProcessPoolExecutor
+from matplotlib.figure import Figure
+from matplotlib.collections import LineCollection
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 
-@staticmethod
-def vel(theta, theta_0=0, theta_dead=np.pi / 12):
-    return 1 - np.exp(-(theta - theta_0) ** 2 / theta_dead)
+from environment.engine import Engine
 
-@staticmethod
-def rew(theta, theta_0=0, theta_dead=np.pi / 12):
-    return vel(theta, theta_0, theta_dead) * np.cos(theta)
+# Parsed policies of an experiment folder are cached next to it in this columnar file
+POLICY_SIDECAR = 'trace_policies.npz'
+
+
+def parse_policy(policy:str) -> np.ndarray:
+    """'[1, 0, 1]' action history string to an int8 action array."""
+    policy = policy.strip().strip('[]')
+    if not policy:
+        return np.zeros(0, dtype=np.int8)
+    return np.array([int(i) for i in policy.split(',')], dtype=np.int8)
+
+
+def load_policies(exp_path:str) -> tuple:
+    """(agents, policies) of every training result folder in exp_path, sorted by folder name.
+    Each policy is the most common action history in the folder's results.csv. Parsed policies are
+    stored in a columnar sidecar (folder, agent, results.csv mtime, offsets, concatenated actions)
+    and only folders whose results.csv changed are parsed again."""
+    sidecar_path = os.path.join(exp_path, POLICY_SIDECAR)
+    cached = {}
+    if os.path.exists(sidecar_path):
+        with np.load(sidecar_path) as sidecar:
+            offsets = sidecar['offsets']
+            for i, (folder, mtime) in enumerate(zip(sidecar['folders'], sidecar['mtimes'])):
+                cached[str(folder)] = (mtime, sidecar['actions'][offsets[i]:offsets[i+1]])
+
+    folders, agents, mtimes, policies = [], [], [], []
+    changed = False
+    for result_folder in sorted(os.listdir(exp_path)):
+        results_path = os.path.join(exp_path, result_folder, 'results.csv')
+        if ('training' not in result_folder) or (not os.path.exists(results_path)):
+            continue
+        mtime = os.path.getmtime(results_path)
+        if (result_folder in cached) and (cached[result_folder][0] == mtime):
+            policy = cached[result_folder][1]
+        else:
+            results = pd.read_csv(results_path, usecols=['action_history'])
+            policy = parse_policy(results['action_history'].mode()[0])
+            changed = True
+        folders.append(result_folder)
+        agents.append(result_folder.split('__')[0])
+        mtimes.append(mtime)
+        policies.append(policy)
+
+    if changed or (len(folders) != len(cached)):
+        offsets = np.cumsum([0] + [len(policy) for policy in policies])
+        tmp_path = sidecar_path + '.tmp.npz'
+        np.savez(tmp_path, folders=np.array(folders, dtype=str), agents=np.array(agents, dtype=str),
+                 mtimes=np.array(mtimes, dtype=np.float64), offsets=offsets,
+                 actions=np.concatenate(policies) if policies else np.zeros(0, dtype=np.int8))
+        os.replace(tmp_path, sidecar_path)
+    return agents, policies
+
+
+def replay_policies(policies:list, precision:int=4) -> tuple:
+    """Boat path of every policy from (0, 0, 0) replayed at once with the Engine dynamics.
+    Returns (x, y, lengths), x and y are (num_policies, max_length) with the position after each
+    action, entries past a policy's length are padding."""
+    lengths = np.array([len(policy) for policy in policies], dtype=np.int64)
+    actions = np.zeros((len(policies), max(lengths.max(initial=0), 1)), dtype=np.int8)
+    for i, policy in enumerate(policies):
+        actions[i, :len(policy)] = policy
+    # Angle moves by exactly one 0.1 step per action, so its value before each action is the rounded
+    # running count of steps, bit-identical to repeatedly rounding angle+a
+    steps = 2*actions.astype(np.int64) - 1
+    turns = np.cumsum(steps, axis=1) - steps
+    a = np.where(actions == 1, 0.1, -0.1)
+    theta = np.round(turns/10, 1) + a
+    speed = Engine.vel(theta)
+    x = np.cumsum(np.round(speed*np.sin(theta), precision), axis=1)
+    y = np.cumsum(np.round(speed*np.cos(theta), 4), axis=1)
+    return x, y, lengths
+
+
+def trace_limits(x:np.ndarray, y:np.ndarray, lengths:np.ndarray) -> tuple:
+    """Axis limits of the river (with matplotlib's default 5% margin). Paths leaving it widen the
+    limits in steps of 5 so plots share a few layouts."""
+    xlim, ylim = [-11, 11], [-1.25, 26.25]
+    if len(lengths) > 0:
+        mask = np.arange(x.shape[1]) < lengths[:, None]
+        for lim, values in ((xlim, x[mask]), (ylim, y[mask])):
+            if values.min() < lim[0]:
+                lim[0] = 5*np.floor(values.min()/5) - 1
+            if values.max() > lim[1]:
+                lim[1] = 5*np.ceil(values.max()/5) + 1
+    return tuple(xlim), tuple(ylim)
+
+
+def trace_artists(x:np.ndarray, y:np.ndarray, lengths:np.ndarray) -> tuple:
+    """(paths, colours, end_x, end_y) of the policies, coloured by where each path ended."""
+    rows = np.arange(len(lengths))
+    end_x = x[rows, lengths-1]
+    end_y = y[rows, lengths-1]
+    # Red: hit a wall, green: reached the goal
+    colours = np.where(np.abs(end_x) >= 10, 'r', np.where(np.abs(end_y) >= 24, 'g', 'k'))
+    paths = [np.column_stack((x[i, :n], y[i, :n])) for i, n in enumerate(lengths)]
+    return paths, list(colours), end_x, end_y
+
+
+def trace_figure(title:str, x:np.ndarray, y:np.ndarray, lengths:np.ndarray) -> Figure:
+    """Sailboat path of each policy from (0, 0)."""
+    figure = Figure()
+    ax = figure.add_subplot(1, 1, 1)
+    ax.scatter(0,0,marker='x', color='b')
+    paths, colours, end_x, end_y = trace_artists(x, y, lengths)
+    ax.add_collection(LineCollection(paths, colors=colours, alpha=0.75))
+    ax.scatter(end_x, end_y, marker='x', color='r')
+    ax.plot([10,10],[0,25],'r')
+    ax.plot([-10,-10],[0,25],'r')
+    xlim, ylim = trace_limits(x, y, lengths)
+    ax.set_xlim(xlim)
+    ax.set_ylim(ylim)
+    figure.suptitle(title + "\n Sailboat Path for each Trained Agent's Output Policy")
+    ax.set_xlabel("Horizontal Position (x)")
+    ax.set_ylabel("Vertical Position (y)")
+    return figure
+
+
+class TracePlotter:
+    def __init__(self) -> None:
+        """Saves trace plots from one reused Agg canvas. Everything but the title, paths and end
+        markers is drawn once per axis limits and restored from a cached bitmap for each plot."""
+        self.fig = Figure()
+        self.canvas = FigureCanvasAgg(self.fig)
+        ax = self.fig.add_subplot(1, 1, 1)
+        self.ax = ax
+        ax.scatter(0,0,marker='x', color='b')
+        ax.plot([10,10],[0,25],'r')
+        ax.plot([-10,-10],[0,25],'r')
+        ax.set_xlabel("Horizontal Position (x)")
+        ax.set_ylabel("Vertical Position (y)")
+        self.paths = ax.add_collection(LineCollection([], alpha=0.75, animated=True))
+        self.ends = ax.scatter([], [], marker='x', color='r', animated=True)
+        self.title = self.fig.suptitle(" ", animated=True)
+        self.backgrounds = {}
+
+    def background(self, limits:tuple):
+        background = self.backgrounds.get(limits)
+        if background is None:
+            self.ax.set_xlim(limits[0])
+            self.ax.set_ylim(limits[1])
+            self.canvas.draw()
+            background = self.canvas.copy_from_bbox(self.fig.bbox)
+            self.backgrounds[limits] = background
+        return background
+
+    def save(self, path:str, title:str, x:np.ndarray, y:np.ndarray, lengths:np.ndarray) -> None:
+        limits = trace_limits(x, y, lengths)
+        background = self.background(limits)
+        if (self.ax.get_xlim(), self.ax.get_ylim()) != limits:
+            self.ax.set_xlim(limits[0])
+            self.ax.set_ylim(limits[1])
+        paths, colours, end_x, end_y = trace_artists(x, y, lengths)
+        self.paths.set_segments(paths)
+        self.paths.set_color(colours)
+        self.ends.set_offsets(np.column_stack((end_x, end_y)))
+        self.title.set_text(title + "\n Sailboat Path for each Trained Agent's Output Policy")
+        self.canvas.restore_region(background)
+        self.ax.draw_artist(self.paths)
+        self.ax.draw_artist(self.ends)
+        self.fig.draw_artist(self.title)
+        Image.fromarray(np.asarray(self.canvas.buffer_rgba())[:, :, :3]).save(path, compress_level=1)
+
+
+# One plotter per worker process
+PLOTTER = None
+
+
+def trace_experiment(exp_path:str, title:str, save:bool=True) -> dict:
+    """Replays the policies of one experiment folder and saves a trace plot per agent
+    (trace_plot_<agent>.png) unless it is newer than the policy sidecar.
+    Runs in the worker processes, returns {agent: (x, y, lengths)} for the figures of trace_plot."""
+    global PLOTTER
+    agents, policies = load_policies(exp_path)
+    if not policies:
+        return {}
+    x, y, lengths = replay_policies(policies)
+    agents = np.array(agents)
+    sidecar_mtime = os.path.getmtime(os.path.join(exp_path, POLICY_SIDECAR))
+    traces = {}
+    for agent in dict.fromkeys(agents):
+        idx = np.flatnonzero((agents == agent) & (lengths > 0))
+        traces[agent] = (x[idx], y[idx], lengths[idx])
+        plot_path = os.path.join(exp_path, f'trace_plot_{agent}.png')
+        if save and not (os.path.exists(plot_path) and os.path.getmtime(plot_path) >= sidecar_mtime):
+            if PLOTTER is None:
+                PLOTTER = TracePlotter()
+            PLOTTER.save(plot_path, title + ' - ' + agent, *traces[agent])
+    return traces
 
 
 class Analysis:
-    def __init__(self, save_dir):
+    def __init__(self, save_dir, workers:int=None, figures:bool=True):
         self.save_dir = save_dir
-        
+        self.workers = workers if workers else os.cpu_count()
+        # Return matplotlib figures from trace_plot, the saved PNGs are enough for batch analysis
+        self.figures = figures
+
     def trace_plot(self):
-        """Define experiment directories to run and override names for
-        improved plot titles."""
+        """Trace plot of each agent's output policies for every experiment folder in save_dir.
+        Folders are scanned, replayed and saved (trace_plot_<agent>.png) in a process pool,
+        figures are returned without being shown so this runs on a headless machine."""
         # TODO MOVE ALL THIS FOLDER SEARCHING INTO ELSCIRL
-        path = self.save_dir 
-        path_folders = os.listdir(path)
-        plot_list = {}
+        path = self.save_dir
+        path_folders = sorted(os.listdir(path))
+        jobs = {}
         for n,folder in enumerate(path_folders):
             if os.path.isdir(path+'/'+folder):
-                exp_path = path + '/' + folder
-                exp_path_folders = os.listdir(exp_path)
-
-                count_check = 0
-                previous_agent = ''
-                policy_output_dict = {}
-                policy_list = []
-                for result_folders in exp_path_folders:
-                    if os.path.isdir(exp_path+'/'+result_folders):
-                        agent = result_folders.split('__')[0]
-                        if 'training' in result_folders:
-                            # Update output dict with policy list
-                            if (agent != previous_agent) and (previous_agent != ''):
-                                print("Agent: ", previous_agent)
-                                print("Policy List: ", policy_list)
-                                if previous_agent not in policy_output_dict.keys():
-                                    policy_output_dict[previous_agent] = policy_list
-                                else:
-                                    prior_policy_list = policy_output_dict[previous_agent]
-                                    prior_policy_list.append(policy_list[0])
-                                    policy_output_dict[previous_agent] = prior_policy_list
-                                policy_list = []
-                            testing_results_path = exp_path + '/' + result_folders
-                            results = pd.read_csv(testing_results_path+"/results.csv")
-                            
-                            policy = results['action_history'].mode()[0]
-                            policy_fix = policy.split(',')
-                            policy_fix = [int(i.replace('[1','1').replace('[0','0').replace('1]','1').replace('0]','0')) for i in policy_fix]
-                            policy_list.append(policy_fix)
-                            count_check += 1
-                            previous_agent = agent
-                # Add final policy list to output dict
-                if previous_agent not in policy_output_dict.keys():
-                    policy_output_dict[previous_agent] = policy_list
+                # Experiments with instructions are titled by the parent folder
+                if 'instr' in folder.lower():
+                    exp_title = path.split('/')[-1]
                 else:
-                    prior_policy_list = policy_output_dict[previous_agent]
-                    prior_policy_list.append(policy_list[0])
-                    policy_output_dict[previous_agent] = prior_policy_list
-                # Plotting
-                for agent in policy_output_dict.keys():
-                    figure = plt.figure()
-                    ax = figure.add_subplot(1, 1, 1)
-                    #print(count_check)
-                    # Re-applies actions made by agent to observe path
-                    if 'instr' in folder.lower():
-                        exp_title = path.split('/')[-1] + ' - ' + agent
-                    else:
-                        exp_title = folder + ' - ' + agent
-                    
-                    ax.scatter(0,0,marker='x', color='b')
-                    training_policies = policy_output_dict[agent]
-                    for action_list in training_policies:
-                        x = 0
-                        y = 0
-                        angle = 0
-                        x_list=[]
-                        y_list=[]
-                        for action in action_list:
-                            a = [-0.1,0.1][action]
-                            
-                            #print(x,"|", y, "|", angle)
-                            x += np.round((vel(angle + a) * np.sin(angle + a)),4) # Round x to 2dp
-                            y += np.round((vel(angle + a) * np.cos(angle + a)),4) # Round y to 2dp
-                            angle=np.around(angle+a,1)
-                            # if (x > 3)&(x<5):
-                            #     print("---")
-                            #     print("{:0.4f}".format(x),"|", "{:0.4f}".format(y), "|", "{:0.1f}".format(angle))
-                            x_list.append(x)
-                            y_list.append(y)
-
-                        if np.abs(x_list[-1])>=10:
-                            ax.plot(x_list,y_list,'r',alpha=0.75)
-                        elif np.abs(y_list[-1])>=24:
-                            ax.plot(x_list,y_list,'g',alpha=0.75)
-                        elif np.abs(y_list[-1])<0:
-                            ax.plot(x_list,y_list,'r',alpha=0.75)
-                        else:
-                            ax.plot(x_list,y_list,'k',alpha=0.75)
-                            
-                        ax.scatter(x_list[-1],y_list[-1],marker='x', color='r')
-                        ax.plot([10,10],[0,25],'r')
-                        ax.plot([-10,-10],[0,25],'r')
-                        figure.suptitle(exp_title + "\n Sailboat Path for each Trained Agent's Output Policy")
-                        ax.set_xlabel("Horizontal Position (x)")
-                        ax.set_ylabel("Vertical Position (y)")
-                    
-                    #save_path = os.path.join(path, folder, 'trace_plot.png')
-
-                    # plt.savefig(save_path)
-                    plt.show()
-                    plt.close()
-
-                    plot_list['plot'+str(n)+str(agent)] = figure
+                    exp_title = folder
+                jobs[n] = (path + '/' + folder, exp_title)
 
+        if self.workers > 1 and len(jobs) > 1:
+            workers = min(self.workers, len(jobs))
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = pool.map(trace_experiment, *zip(*jobs.values()), chunksize=max(1, len(jobs)//(4*workers)))
+                traces = dict(zip(jobs.keys(), results))
+        else:
+            traces = {n: trace_experiment(exp_path, exp_title) for n, (exp_path, exp_title) in jobs.items()}
+
+        plot_list = {}
+        if not self.figures:
+            return plot_list
+        for n, experiment_traces in traces.items():
+            for agent, agent_traces in experiment_traces.items():
+                plot_list['plot'+str(n)+str(agent)] = trace_figure(jobs[n][1] + ' - ' + agent, *agent_traces)
         return plot_list
 
-                
+
+def main():
+    parser = argparse.ArgumentParser(description="Save trace plots for every experiment folder of a results directory")
+    parser.add_argument('save_dir')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+    Analysis(args.save_dir, workers=args.workers, figures=False).trace_plot()
+
+
+if __name__=='__main__':
+    main()
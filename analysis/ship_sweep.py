@@ -0,0 +1,205 @@
+# Wind/wave scenario sweep of the ship environment (environment/sailing-hard-env.py)
+# - A grid of sea states is expanded into scenarios and evaluated in a process pool
+# - Each worker builds one ship Engine and reuses it for every scenario it runs, only the sea state
+#   attributes read by Engine.ode are changed between scenarios
+# - Metrics are streamed to one CSV row per scenario as scenarios finish, rerunning with the same output
+#   skips scenarios already in it so an interrupted overnight sweep resumes
+# - Needs the kcs module of the ship environment on the path
+# - Run from the repository root: python -m analysis.ship_sweep sweep.csv --wind-speed 0 5 10 --wind-dir 0 90 180 270
+import os
+import csv
+import json
+import time
+import argparse
+import itertools
+import importlib
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from environment.ship_integrators import load_ship_engine
+
+# Sea state keys of the ship Engine's local_setup_info
+SCENARIO_KEYS = ['wind_flag', 'wind_speed', 'wind_dir', 'wave_flag', 'wave_height', 'wave_period', 'wave_dir']
+METRIC_KEYS = ['episodes', 'success_rate', 'passed_rate', 'truncated_rate', 'mean_return', 'mean_steps',
+               'mean_final_distance', 'mean_abs_cross_track', 'seconds']
+
+
+def expand_grid(grid:dict) -> list:
+    """Scenarios of every combination of the grid's values, {key: value or list of values}.
+    wind_flag/wave_flag default to 1 for scenarios with a nonzero wind_speed/wave_height."""
+    unknown = set(grid) - set(SCENARIO_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown scenario keys {sorted(unknown)}, expected {SCENARIO_KEYS}")
+    keys = [key for key in SCENARIO_KEYS if key in grid]
+    values = [grid[key] if isinstance(grid[key], (list, tuple)) else [grid[key]] for key in keys]
+    scenarios = []
+    for combination in itertools.product(*values):
+        scenario = {key: 0 for key in SCENARIO_KEYS}
+        scenario.update(zip(keys, combination))
+        if 'wind_flag' not in grid:
+            scenario['wind_flag'] = int(scenario['wind_speed'] != 0)
+        if 'wave_flag' not in grid:
+            scenario['wave_flag'] = int(scenario['wave_height'] != 0)
+        scenarios.append(scenario)
+    return scenarios
+
+
+def scenario_key(scenario:dict) -> tuple:
+    return tuple(float(scenario[key]) for key in SCENARIO_KEYS)
+
+
+def load_policy(policy:str):
+    """policy(obs, legal_moves, rng) -> action. 'random', 'straight' (rudder amidships) or
+    'module:function' importable from the repository root."""
+    if policy == 'random':
+        return lambda obs, legal_moves, rng: int(rng.choice(legal_moves))
+    if policy == 'straight':
+        return lambda obs, legal_moves, rng: 1
+    module, _, function = policy.partition(':')
+    if not function:
+        raise ValueError(f"policy must be 'random', 'straight' or 'module:function', got {policy}")
+    return getattr(importlib.import_module(module), function)
+
+
+# One engine and policy per worker process
+WORKER = None
+
+
+def init_worker(local_setup_info:dict, policy:str) -> None:
+    global WORKER
+    WORKER = (load_ship_engine()(local_setup_info), load_policy(policy))
+
+
+def run_scenario(scenario:dict, episodes:int, max_steps:int, seed:int) -> dict:
+    """Evaluates the worker's policy for episodes episodes in one sea state. Episode i uses seed+i in
+    every scenario, so all scenarios are scored on the same goals."""
+    engine, policy = WORKER
+    # Engine.ode reads the sea state from the engine on every call
+    for key in SCENARIO_KEYS:
+        setattr(engine, key, scenario[key])
+    start = time.perf_counter()
+    returns, steps, final_distances, cross_track = [], [], [], []
+    reached, truncated = 0, 0
+    for episode in range(episodes):
+        np.random.seed(seed + episode)
+        rng = np.random.default_rng(seed + episode)
+        obs = engine.reset()
+        episode_return, episode_steps, terminated = 0, 0, False
+        episode_cross_track = 0
+        decisions = 0
+        while not terminated and episode_steps < max_steps:
+            obs, reward, terminated, info = engine.step(None, policy(obs, [0, 1, 2], rng))
+            episode_return += reward
+            episode_steps += info.get('substeps', 1)
+            episode_cross_track += abs(float(obs[0]))
+            decisions += 1
+        reached += int(terminated and engine.distance <= 0.5)
+        truncated += int(not terminated)
+        returns.append(episode_return)
+        steps.append(episode_steps)
+        final_distances.append(engine.distance)
+        cross_track.append(episode_cross_track/max(decisions, 1))
+    return {'episodes': episodes,
+            'success_rate': reached/episodes,
+            'passed_rate': (episodes - reached - truncated)/episodes,
+            'truncated_rate': truncated/episodes,
+            'mean_return': float(np.mean(returns)),
+            'mean_steps': float(np.mean(steps)),
+            'mean_final_distance': float(np.mean(final_distances)),
+            'mean_abs_cross_track': float(np.mean(cross_track)),
+            'seconds': time.perf_counter() - start}
+
+
+class ScenarioSweep:
+    def __init__(self, output_path:str, local_setup_info:dict={}, policy:str='random', episodes:int=10,
+                 max_steps:int=500, seed:int=0, workers:int=None) -> None:
+        """Evaluates a policy over sea state scenarios, one CSV row of metrics per scenario.
+        local_setup_info is the ship Engine setup shared by all scenarios (integrator, action_repeat, ...),
+        policy is a name or 'module:function' so it can be loaded in the worker processes."""
+        self.output_path = output_path
+        self.local_setup_info = local_setup_info
+        self.policy = policy
+        self.episodes = episodes
+        self.max_steps = max_steps
+        self.seed = seed
+        self.workers = workers if workers else os.cpu_count()
+
+    def completed(self) -> set:
+        """Scenarios already in the output file."""
+        if not os.path.exists(self.output_path):
+            return set()
+        with open(self.output_path, newline='') as file:
+            return {scenario_key(row) for row in csv.DictReader(file)}
+
+    def run(self, scenarios:list) -> int:
+        """Runs every scenario not yet in the output file, returns the number run."""
+        done = self.completed()
+        todo = [scenario for scenario in scenarios if scenario_key(scenario) not in done]
+        if not todo:
+            return 0
+        write_header = not os.path.exists(self.output_path) or os.path.getsize(self.output_path) == 0
+        with open(self.output_path, 'a', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=SCENARIO_KEYS + METRIC_KEYS)
+            if write_header:
+                writer.writeheader()
+
+            def write(scenario, metrics):
+                writer.writerow({**scenario, **metrics})
+                file.flush()
+
+            args = (self.episodes, self.max_steps, self.seed)
+            if self.workers > 1 and len(todo) > 1:
+                with ProcessPoolExecutor(max_workers=min(self.workers, len(todo)), initializer=init_worker,
+                                         initargs=(self.local_setup_info, self.policy)) as pool:
+                    futures = {pool.submit(run_scenario, scenario, *args): scenario for scenario in todo}
+                    for future in as_completed(futures):
+                        write(futures[future], future.result())
+            else:
+                init_worker(self.local_setup_info, self.policy)
+                for scenario in todo:
+                    write(scenario, run_scenario(scenario, *args))
+        return len(todo)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate a policy of the ship environment over a grid of wind/wave conditions")
+    parser.add_argument('output', help="Aggregate CSV, one row per scenario")
+    parser.add_argument('--grid', help="JSON file of {scenario key: value or list of values}")
+    for key in SCENARIO_KEYS:
+        parser.add_argument('--' + key.replace('_', '-'), type=float, nargs='+')
+    parser.add_argument('--setup', help="JSON file of the shared ship Engine local_setup_info")
+    parser.add_argument('--integrator', default=None)
+    parser.add_argument('--action-repeat', type=int, default=None)
+    parser.add_argument('--policy', default='random')
+    parser.add_argument('--episodes', type=int, default=10)
+    parser.add_argument('--max-steps', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    grid = {}
+    if args.grid:
+        with open(args.grid) as file:
+            grid = json.load(file)
+    for key in SCENARIO_KEYS:
+        if getattr(args, key) is not None:
+            grid[key] = getattr(args, key)
+    local_setup_info = {}
+    if args.setup:
+        with open(args.setup) as file:
+            local_setup_info = json.load(file)
+    if args.integrator:
+        local_setup_info['integrator'] = args.integrator
+    if args.action_repeat:
+        local_setup_info['action_repeat'] = args.action_repeat
+
+    scenarios = expand_grid(grid)
+    sweep = ScenarioSweep(args.output, local_setup_info, policy=args.policy, episodes=args.episodes,
+                          max_steps=args.max_steps, seed=args.seed, workers=args.workers)
+    start = time.perf_counter()
+    ran = sweep.run(scenarios)
+    print(f"Ran {ran} of {len(scenarios)} scenarios in {time.perf_counter()-start:.1f}s -> {args.output}")
+
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,83 @@
+# Throughput benchmark of the scalar Engine against the batched VectorEngine
+# - Run from the repository root: python -m benchmarks.engine_throughput
+import time
+import argparse
+import numpy as np
+
+from environment.engine import Engine
+from environment.vector_engine import VectorEngine
+
+LOCAL_SETUP_INFO = {'y_limit': 25, 'supervised_rewards': "True", 'obs_precision': 2}
+
+
+def random_actions(num_boats:int, num_steps:int, seed:int=0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 2, size=(num_steps, num_boats))
+
+
+def check_parity(actions:np.ndarray, local_setup_info:dict=LOCAL_SETUP_INFO):
+    """Replay every boat's action sequence through the scalar Engine and compare bit-for-bit."""
+    num_steps, num_boats = actions.shape
+    vector_engine = VectorEngine(local_setup_info, num_boats=num_boats)
+    vector_engine.reset()
+    engines = [Engine(local_setup_info) for _ in range(num_boats)]
+    for engine in engines:
+        engine.reset()
+    for t in range(num_steps):
+        _, v_reward, v_terminated, v_info = vector_engine.step(actions[t])
+        v_obs = vector_engine.obs_to_str(v_info['final_obs'])
+        for i, engine in enumerate(engines):
+            obs, reward, terminated, _ = engine.step(None, int(actions[t, i]))
+            assert obs == v_obs[i], (t, i, obs, v_obs[i])
+            assert engine.y == v_info['final_y'][i], (t, i, engine.y, v_info['final_y'][i])
+            assert reward == v_reward[i], (t, i, reward, v_reward[i])
+            assert terminated == v_terminated[i], (t, i, terminated, v_terminated[i])
+            if terminated:
+                engine.reset()
+    return True
+
+
+def scalar_throughput(actions:np.ndarray, local_setup_info:dict=LOCAL_SETUP_INFO) -> float:
+    """Boat-steps per second stepping one scalar Engine per boat."""
+    num_steps, num_boats = actions.shape
+    engines = [Engine(local_setup_info) for _ in range(num_boats)]
+    states = [engine.reset() for engine in engines]
+    start = time.perf_counter()
+    for t in range(num_steps):
+        for i, engine in enumerate(engines):
+            states[i], _, terminated, _ = engine.step(states[i], int(actions[t, i]))
+            if terminated:
+                states[i] = engine.reset()
+    return num_steps*num_boats/(time.perf_counter()-start)
+
+
+def vector_throughput(actions:np.ndarray, local_setup_info:dict=LOCAL_SETUP_INFO) -> float:
+    """Boat-steps per second stepping all boats in one VectorEngine."""
+    num_steps, num_boats = actions.shape
+    vector_engine = VectorEngine(local_setup_info, num_boats=num_boats)
+    vector_engine.reset()
+    start = time.perf_counter()
+    for t in range(num_steps):
+        vector_engine.step(actions[t])
+    return num_steps*num_boats/(time.perf_counter()-start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scalar Engine vs VectorEngine throughput")
+    parser.add_argument('--boats', type=int, default=1000)
+    parser.add_argument('--steps', type=int, default=200)
+    args = parser.parse_args()
+
+    check_parity(random_actions(64, 500, seed=1))
+    print("Parity check passed (64 boats x 500 steps)")
+
+    actions = random_actions(args.boats, args.steps)
+    scalar = scalar_throughput(actions)
+    vector = vector_throughput(actions)
+    print(f"Scalar Engine: {scalar:,.0f} boat-steps/s")
+    print(f"VectorEngine:  {vector:,.0f} boat-steps/s ({args.boats} boats)")
+    print(f"Speed-up:      {vector/scalar:.1f}x")
+
+
+if __name__=='__main__':
+    main()
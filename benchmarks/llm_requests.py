@@ -0,0 +1,43 @@
+# Throughput of sequential Ollama calls against the LLMRequestEngine, using the local stub server
+# - Run from the repository root: python -m benchmarks.llm_requests
+import time
+import argparse
+
+from adapters.llm_requests import OllamaClient, LLMRequestEngine
+from benchmarks.ollama_stub import OllamaStub
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM request layer throughput against a stub Ollama server")
+    parser.add_argument('--prompts', type=int, default=200)
+    parser.add_argument('--distinct', type=int, default=100, help="Number of distinct prompts")
+    parser.add_argument('--latency', type=float, default=0.02, help="Stub response latency (s)")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    stub = OllamaStub(latency=args.latency, failure_rate=args.failure_rate).start()
+    client = OllamaClient(model_name='stub', base_url=stub.url, timeout=10)
+    prompts = [f"The boat is in state {i % args.distinct}" for i in range(args.prompts)]
+
+    if args.failure_rate == 0:
+        start = time.perf_counter()
+        for prompt in prompts:
+            client.chat(prompt)
+        sequential = args.prompts/(time.perf_counter()-start)
+        print(f"Sequential:    {sequential:,.1f} prompts/s")
+
+    stub.request_count = 0
+    engine = LLMRequestEngine(client, max_concurrency=args.concurrency, backoff=0.01)
+    start = time.perf_counter()
+    responses = engine.map(prompts)
+    concurrent = args.prompts/(time.perf_counter()-start)
+    engine.close()
+    assert responses == ['Described: ' + prompt for prompt in prompts]
+    print(f"Request engine: {concurrent:,.1f} prompts/s ({stub.request_count} HTTP requests for {args.prompts} prompts)")
+    print(f"Stats: {engine.stats}")
+    stub.stop()
+
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,70 @@
+# Local stub HTTP server mimicking the Ollama API
+# - POST /api/chat: echoes the user prompt after a fixed latency
+# - GET /api/tags: lists the stub model
+# - Optional failure_rate returns HTTP 500 to exercise retries
+import json
+import time
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class OllamaStub:
+    def __init__(self, latency:float=0.05, failure_rate:float=0.0, model_name:str='stub', port:int=0) -> None:
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.model_name = model_name
+        self.request_count = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status:int, payload:dict):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == '/api/tags':
+                    self._send(200, {'models': [{'name': stub.model_name}]})
+                else:
+                    self._send(404, {'error': 'not found'})
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                request = json.loads(self.rfile.read(length))
+                with stub.lock:
+                    stub.request_count += 1
+                time.sleep(stub.latency)
+                if random.random() < stub.failure_rate:
+                    self._send(500, {'error': 'stub failure'})
+                    return
+                if self.path != '/api/chat':
+                    self._send(404, {'error': 'not found'})
+                    return
+                prompt = request['messages'][-1]['content']
+                self._send(200, {'model': request['model'], 'done': True,
+                                 'message': {'role': 'assistant', 'content': 'Described: ' + prompt}})
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,326 @@
+# Micro-benchmark and regression suite
+# - Engine.reset/step throughput of both environment modules, per-call adapter latency, peak memory per
+#   1,000 episodes and Analysis.trace_plot on a synthetic output tree
+# - Language and LLM encoders are replaced by a deterministic stub and the LLM call by a canned response,
+#   so adapter latency is the repo's own code and not model inference
+# - Results are compared against a JSON baseline and the run fails (exit code 1) when a metric is worse
+#   than the baseline by more than the threshold, or exit code 2 when there is no baseline to compare against
+# - Run from the repository root:
+#     python -m benchmarks.regression --save-baseline     # record benchmarks/baseline.json
+#     python -m benchmarks.regression                     # compare against it
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import platform
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+import torch
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+LOCAL_SETUP_INFO = {'y_limit': 25, 'supervised_rewards': "True", 'obs_precision': 2}
+
+
+class StubEncoder:
+    def __init__(self, *args, **kwargs) -> None:
+        """Stand-in for the MiniLM LanguageEncoder, a fixed 1x384 vector per sentence."""
+        self.dim = 384
+
+    def vector(self, sentence:str) -> np.ndarray:
+        seed = int.from_bytes(hashlib.blake2b(sentence.encode(), digest_size=8).digest(), 'little')
+        return np.random.default_rng(seed).standard_normal(self.dim, dtype=np.float32)
+
+    def encode(self, state:any, legal_actions:list=None, episode_action_history:list=None, indexed:bool=False):
+        sentences = [state] if isinstance(state, str) else list(state)
+        return torch.from_numpy(np.stack([self.vector(sentence) for sentence in sentences]))
+
+
+def engine_states(num:int, seed:int=0) -> list:
+    """Observations visited by random episodes of the sailing Engine, the adapter inputs."""
+    from environment.engine import Engine
+    rng = np.random.default_rng(seed)
+    engine = Engine(LOCAL_SETUP_INFO)
+    states, history = [], []
+    state = engine.reset()
+    while len(states) < num:
+        action = int(rng.integers(0, 2))
+        states.append((state, list(history[-1:])))
+        state, _, terminated, _ = engine.step(state, action)
+        history.append(action)
+        if terminated:
+            state = engine.reset()
+            history = []
+    return states
+
+
+# ------ Benchmarks -------------------------------------------
+# Each returns {metric: (value, 'higher' or 'lower' is better)}
+
+def bench_engine(episodes:int=200, seed:int=0) -> dict:
+    from environment.engine import Engine
+    rng = np.random.default_rng(seed)
+    actions = rng.integers(0, 2, size=100000).tolist()
+    engine = Engine(LOCAL_SETUP_INFO)
+    resets, steps = 0, 0
+    reset_seconds, step_seconds = 0.0, 0.0
+    for _ in range(episodes):
+        start = time.perf_counter()
+        state = engine.reset()
+        reset_seconds += time.perf_counter() - start
+        resets += 1
+        terminated = False
+        start = time.perf_counter()
+        while not terminated and steps < len(actions):
+            state, _, terminated, _ = engine.step(state, actions[steps])
+            steps += 1
+        step_seconds += time.perf_counter() - start
+    return {'engine.reset_per_s': (resets/reset_seconds, 'higher'),
+            'engine.step_per_s': (steps/step_seconds, 'higher')}
+
+
+def bench_ship_engine(episodes:int=5, max_steps:int=200, seed:int=0) -> dict:
+    from environment.ship_integrators import load_ship_engine
+    ShipEngine = load_ship_engine()
+    rng = np.random.default_rng(seed)
+    metrics = {}
+    for integrator in ['solve_ivp', 'rk4']:
+        engine = ShipEngine({'integrator': integrator})
+        resets, steps = 0, 0
+        reset_seconds, step_seconds = 0.0, 0.0
+        for episode in range(episodes):
+            np.random.seed(seed + episode)
+            start = time.perf_counter()
+            engine.reset()
+            reset_seconds += time.perf_counter() - start
+            resets += 1
+            start = time.perf_counter()
+            for _ in range(max_steps):
+                steps += 1
+                if engine.step(None, int(rng.integers(0, 3)))[2]:
+                    break
+            step_seconds += time.perf_counter() - start
+        metrics[f'ship_engine.{integrator}.reset_per_s'] = (resets/reset_seconds, 'higher')
+        metrics[f'ship_engine.{integrator}.step_per_s'] = (steps/step_seconds, 'higher')
+    return metrics
+
+
+def make_adapters() -> dict:
+    """{name: (adapter, state kind)} of every adapter in adapters/, encoders stubbed."""
+    import importlib.util
+    import adapters.language
+    from elsciRL.adapters.LLM_state_generators import text_ollama
+    adapters.language.LanguageEncoder = StubEncoder
+    text_ollama.ENCODERS = {name: StubEncoder for name in text_ollama.ENCODERS}
+    from adapters.default import Adapter as DefaultAdapter
+    from adapters.numeric_unique_id import Adapter as NumericAdapter
+    from adapters.LLM_adapter import Adapter as LLMAdapter
+
+    setup_info = {'obs_precision': 2}
+    llm_adapter = LLMAdapter(setup_info)
+    llm_adapter.LLM_adapter.call_ollama_api = lambda prompt: {'message': {'content': 'Described: ' + prompt[-80:]}}
+    found = {'default': (DefaultAdapter(setup_info | {'one_hot_mode': 'lazy'}), 'sailing'),
+             'default_grid': (DefaultAdapter(setup_info | {'one_hot_mode': 'lazy', 'state_id_mode': 'grid'}), 'sailing'),
+             'numeric_unique_id': (NumericAdapter(setup_info), 'sailing'),
+             'language': (adapters.language.Adapter(setup_info), 'sailing'),
+             'LLM_adapter': (llm_adapter, 'sailing')}
+    # Ship adapters live in hyphenated files
+    adapters_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'adapters')
+    for file_name, class_name in [('hard-numeric.py', 'DefaultAdapter'), ('hard-language.py', 'LanguageAdapter')]:
+        spec = importlib.util.spec_from_file_location(file_name[:-3].replace('-', '_'), os.path.join(adapters_dir, file_name))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        found[file_name[:-3]] = (getattr(module, class_name)(setup_info), 'ship')
+    return found
+
+
+def bench_adapters(calls:int=2000, seed:int=0) -> dict:
+    sailing_states = engine_states(calls, seed)
+    rng = np.random.default_rng(seed)
+    ship_states = [rng.standard_normal(4).astype(np.float32) for _ in range(calls)]
+    metrics = {}
+    for name, (adapter, kind) in make_adapters().items():
+        latencies = np.empty(calls)
+        for i in range(calls):
+            if kind == 'sailing':
+                state, history = sailing_states[i]
+            else:
+                state, history = ship_states[i], []
+            start = time.perf_counter()
+            adapter.adapter(state, legal_moves=[0, 1], episode_action_history=history, encode=True)
+            latencies[i] = time.perf_counter() - start
+        metrics[f'adapter.{name}.median_us'] = (float(np.median(latencies))*1e6, 'lower')
+        metrics[f'adapter.{name}.p95_us'] = (float(np.percentile(latencies, 95))*1e6, 'lower')
+    return metrics
+
+
+def bench_memory(episodes:int=1000, seed:int=0) -> dict:
+    """Peak traced allocation while running episodes of the sailing Engine with the bounded ring buffer
+    history (the lifetime history lists grow with the number of steps by design)."""
+    from environment.engine import Engine
+    rng = np.random.default_rng(seed)
+    actions = rng.integers(0, 2, size=4096).tolist()
+    tracemalloc.start()
+    engine = Engine(LOCAL_SETUP_INFO | {'history': False, 'history_buffer': True})
+    steps = 0
+    for _ in range(episodes):
+        state = engine.reset()
+        terminated = False
+        while not terminated:
+            state, _, terminated, _ = engine.step(state, actions[steps % len(actions)])
+            steps += 1
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'memory.engine_peak_mb_per_1000_episodes': (peak/1024**2 * 1000/episodes, 'lower')}
+
+
+def synthetic_tree(root:str, experiments:int=4, agents:int=3, repeats:int=2, rows:int=20, seed:int=0) -> str:
+    """Output tree of the shape trace_plot reads, experiment/<agent>__training_<n>/results.csv."""
+    import pandas as pd
+    from environment.engine import Engine
+    rng = np.random.default_rng(seed)
+    engine = Engine(LOCAL_SETUP_INFO)
+    for experiment in range(experiments):
+        for agent in range(agents):
+            for repeat in range(repeats):
+                folder = os.path.join(root, f'experiment_{experiment}', f'Qlearntab{agent}__training_results_{repeat}')
+                os.makedirs(folder, exist_ok=True)
+                histories = []
+                for _ in range(rows):
+                    state, terminated, history = engine.reset(), False, []
+                    while not terminated and len(history) < 500:
+                        action = int(rng.integers(0, 2))
+                        state, _, terminated, _ = engine.step(state, action)
+                        history.append(action)
+                    histories.append(str(history))
+                pd.DataFrame({'episode': range(rows), 'action_history': histories}).to_csv(
+                    os.path.join(folder, 'results.csv'), index=False)
+    return root
+
+
+def bench_trace_plot(seed:int=0) -> dict:
+    from analysis.sailing_graphs import Analysis
+    root = tempfile.mkdtemp(prefix='trace_bench_')
+    try:
+        synthetic_tree(root, seed=seed)
+        analysis = Analysis(root, workers=1)
+        start = time.perf_counter()
+        analysis.trace_plot()
+        cold = time.perf_counter() - start
+        start = time.perf_counter()
+        analysis.trace_plot()
+        warm = time.perf_counter() - start
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return {'trace_plot.cold_s': (cold, 'lower'), 'trace_plot.warm_s': (warm, 'lower')}
+
+
+BENCHMARKS = {'engine': bench_engine, 'ship_engine': bench_ship_engine, 'adapters': bench_adapters,
+              'memory': bench_memory, 'trace_plot': bench_trace_plot}
+
+
+# ------ Runner -----------------------------------------------
+
+def best(results:list) -> dict:
+    """Best value of each metric over repeated runs, the least noisy estimate of the machine's speed."""
+    merged = {}
+    for result in results:
+        for metric, (value, better) in result.items():
+            if metric not in merged:
+                merged[metric] = (value, better)
+            elif (value > merged[metric][0]) == (better == 'higher'):
+                merged[metric] = (value, better)
+    return merged
+
+
+def run(names:list, repeat:int=3) -> tuple:
+    """(metrics, skipped) of the named benchmarks, each run repeat times (memory once)."""
+    metrics, skipped = {}, {}
+    for name in names:
+        try:
+            runs = [BENCHMARKS[name]() for _ in range(1 if name == 'memory' else repeat)]
+        except ImportError as e:
+            skipped[name] = str(e)
+            continue
+        metrics.update(best(runs))
+    return metrics, skipped
+
+
+def compare(metrics:dict, baseline:dict, threshold:float) -> list:
+    """(metric, baseline, current, change) of every metric worse than baseline by more than threshold.
+    change is the relative slowdown, positive is worse."""
+    regressions = []
+    for metric, (value, better) in metrics.items():
+        if metric not in baseline['metrics']:
+            continue
+        reference = baseline['metrics'][metric]['value']
+        if reference == 0:
+            continue
+        change = (reference - value)/reference if better == 'higher' else (value - reference)/reference
+        if change > threshold:
+            regressions.append((metric, reference, value, change))
+    return regressions
+
+
+def machine() -> dict:
+    return {'platform': platform.platform(), 'python': platform.python_version(),
+            'processor': platform.processor(), 'cpu_count': os.cpu_count()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark engines, adapters and analysis against a JSON baseline")
+    parser.add_argument('--benchmarks', nargs='+', default=list(BENCHMARKS), choices=list(BENCHMARKS))
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help="Write the results as the new baseline")
+    parser.add_argument('--threshold', type=float, default=0.25, help="Allowed relative regression")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    metrics, skipped = run(args.benchmarks, args.repeat)
+    results = {'machine': machine(), 'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+               'metrics': {metric: {'value': value, 'better': better} for metric, (value, better) in metrics.items()}}
+    for name, reason in skipped.items():
+        print(f"Skipped {name}: {reason}")
+
+    baseline = None
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if baseline['machine'] != results['machine']:
+            print(f"Warning: baseline was recorded on a different machine {baseline['machine']}")
+    print(f"{'metric':<48}{'value':>14}{'baseline':>14}{'change':>9}")
+    for metric, (value, better) in metrics.items():
+        reference = baseline['metrics'].get(metric, {}).get('value') if baseline else None
+        if reference:
+            change = (value - reference)/reference
+            print(f"{metric:<48}{value:>14.4g}{reference:>14.4g}{change:>+8.0%}")
+        else:
+            print(f"{metric:<48}{value:>14.4g}{'-':>14}{'-':>9}")
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump(results, file, indent=2)
+        print(f"Saved baseline {args.baseline}")
+        return
+    if baseline is None:
+        # Baselines are machine specific and not committed, a missing one must not pass as "no regressions"
+        print(f"ERROR: no baseline at {args.baseline}, nothing was compared. "
+              f"Record one on this machine with --save-baseline", file=sys.stderr)
+        sys.exit(2)
+    regressions = compare(metrics, baseline, args.threshold)
+    for metric, reference, value, change in regressions:
+        print(f"REGRESSION {metric}: {reference:.4g} -> {value:.4g} ({change:.0%} worse, threshold {args.threshold:.0%})")
+    if regressions:
+        sys.exit(1)
+    print(f"No regressions beyond {args.threshold:.0%}")
+
+
+if __name__=='__main__':
+    main()
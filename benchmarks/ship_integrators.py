@@ -0,0 +1,79 @@
+# Accuracy vs speed of the ship environment's integrator backends
+# - Every backend replays the same goals and random rudder actions, errors are measured on the
+#   ship trajectory (x, y, heading) against the original solve_ivp results and a tight-tolerance
+#   solve_ivp reference
+# - Needs the kcs module of the ship environment on the path
+# - Run from the repository root: python -m benchmarks.ship_integrators
+import time
+import argparse
+import numpy as np
+
+from environment.ship_integrators import SolveIVPIntegrator, load_ship_engine
+
+
+def rollout(engine, actions:np.ndarray, seed:int) -> tuple:
+    """(trajectory, seconds) of (x, y, psi) after each step, stops at termination."""
+    np.random.seed(seed)
+    engine.reset()
+    trajectory = np.full((len(actions), 3), np.nan)
+    start = time.perf_counter()
+    for t, action in enumerate(actions):
+        engine.step(None, int(action))
+        trajectory[t] = engine.obs_state[3], engine.obs_state[4], engine.obs_state[5]
+        if engine.episode_ended:
+            break
+    return trajectory, time.perf_counter()-start, t+1
+
+
+def trajectory_error(trajectory:np.ndarray, reference:np.ndarray) -> tuple:
+    """Max position error and max heading error over the steps both trajectories reached."""
+    n = min(np.sum(~np.isnan(trajectory[:, 0])), np.sum(~np.isnan(reference[:, 0])))
+    position = np.hypot(trajectory[:n, 0]-reference[:n, 0], trajectory[:n, 1]-reference[:n, 1]).max()
+    heading = np.abs((trajectory[:n, 2]-reference[:n, 2] + np.pi) % (2*np.pi) - np.pi).max()
+    return position, heading
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ship environment integrator accuracy vs speed")
+    parser.add_argument('--episodes', type=int, default=5)
+    parser.add_argument('--steps', type=int, default=300)
+    parser.add_argument('--substeps', type=int, nargs='+', default=[1, 2, 3, 5, 10])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    ShipEngine = load_ship_engine()
+    rng = np.random.default_rng(args.seed)
+    actions = rng.integers(0, 3, size=(args.episodes, args.steps))
+
+    # Tight-tolerance reference
+    reference_engine = ShipEngine({})
+    reference_engine.integrator = SolveIVPIntegrator(reference_engine.ode, reference_engine.dt, rtol=1e-10, atol=1e-10)
+    references = [rollout(reference_engine, actions[i], args.seed+i)[0] for i in range(args.episodes)]
+
+    backends = [('solve_ivp', {'integrator': 'solve_ivp'})]
+    backends += [(f'rk4 x{n}', {'integrator': 'rk4', 'integrator_substeps': n}) for n in args.substeps]
+    baseline = None
+    print(f"{'backend':<12}{'steps/s':>10}{'speed-up':>10}{'vs solve_ivp pos/heading':>28}{'vs reference pos/heading':>28}")
+    for name, local_setup_info in backends:
+        engine = ShipEngine(local_setup_info)
+        seconds, steps = 0, 0
+        errors_original, errors_reference = [], []
+        trajectories = []
+        for i in range(args.episodes):
+            trajectory, episode_seconds, episode_steps = rollout(engine, actions[i], args.seed+i)
+            seconds += episode_seconds
+            steps += episode_steps
+            trajectories.append(trajectory)
+            errors_reference.append(trajectory_error(trajectory, references[i]))
+        if baseline is None:
+            baseline = (trajectories, steps/seconds)
+        errors_original = [trajectory_error(trajectories[i], baseline[0][i]) for i in range(args.episodes)]
+        original = np.max(errors_original, axis=0)
+        reference = np.max(errors_reference, axis=0)
+        rate = steps/seconds
+        print(f"{name:<12}{rate:>10,.0f}{rate/baseline[1]:>9.1f}x"
+              f"{original[0]:>17.2e} /{original[1]:>9.2e}{reference[0]:>17.2e} /{reference[1]:>9.2e}")
+
+
+if __name__=='__main__':
+    main()
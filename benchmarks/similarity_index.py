@@ -0,0 +1,85 @@
+# Latency of instruction matching with the prerendered SimilarityIndex
+# - The prerendered states can be grown --scale times (noisy copies) to mimic a finer obs_precision
+# - Instructions are noisy state embeddings, so the exact top-k is meaningful
+# - Run from the repository root: python -m benchmarks.similarity_index --scale 10
+import time
+import argparse
+import numpy as np
+import torch
+
+from prerender.similarity import SimilarityIndex
+
+PT_PATH = 'prerender/encoded_observed_states.pt'
+TXT_PATH = 'prerender/observed_states.txt'
+
+
+def grow(index:SimilarityIndex, scale:int, seed:int=0) -> SimilarityIndex:
+    rng = np.random.default_rng(seed)
+    vectors = index.normalized*index.norms[:, None]
+    copies = [vectors] + [vectors + rng.normal(0, 0.01, vectors.shape).astype(np.float32) for _ in range(scale - 1)]
+    keys = [f'{key}#{i}' for i in range(scale) for key in index.keys]
+    return SimilarityIndex(np.concatenate(copies), keys, block_rows=index.block_rows)
+
+
+def per_state_loop(vectors:torch.Tensor, query:torch.Tensor, feedback:torch.Tensor) -> int:
+    """elsciRL_SEARCH's per-state cosine loop (with encodings precomputed), for reference."""
+    cos = torch.nn.CosineSimilarity(dim=0)
+    best, best_row = -1, -1
+    for row, state in enumerate(vectors):
+        sim = cos(torch.add(state, feedback), query).item()
+        if sim > best:
+            best, best_row = sim, row
+    return best_row
+
+
+def timed(function, repeat:int) -> float:
+    """Best of repeat, in ms."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return 1000*min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the prerendered state similarity index")
+    parser.add_argument('--pt-path', default=PT_PATH)
+    parser.add_argument('--txt-path', default=TXT_PATH)
+    parser.add_argument('--scale', type=int, default=10, help="Grow the prerendered states this many times")
+    parser.add_argument('--queries', type=int, default=256)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 4, 8, 16])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    index = SimilarityIndex.from_legacy(args.pt_path, args.txt_path)
+    if args.scale > 1:
+        index = grow(index, args.scale)
+    rng = np.random.default_rng(1)
+    states = index.normalized[rng.choice(len(index), args.queries)]
+    queries = states + rng.normal(0, 0.02, states.shape).astype(np.float32)
+    feedback = rng.normal(0, 0.01, queries.shape).astype(np.float32)
+    print(f"{len(index)} states, {args.queries} queries, k={args.k}")
+
+    loop_ms = timed(lambda: per_state_loop(torch.from_numpy(index.normalized), torch.from_numpy(queries[0]),
+                                           torch.from_numpy(feedback[0])), 1)
+    print(f"per-state torch loop        {loop_ms:10.3f} ms/instruction")
+    single_ms = timed(lambda: index.search(queries[:1], args.k), args.repeat)
+    print(f"exact, single               {single_ms:10.3f} ms/instruction")
+    batch_ms = timed(lambda: index.search(queries, args.k), args.repeat)/args.queries
+    print(f"exact, batched              {batch_ms:10.3f} ms/instruction")
+    feedback_ms = timed(lambda: index.search(queries, args.k, feedback=feedback), args.repeat)/args.queries
+    print(f"exact + feedback, batched   {feedback_ms:10.3f} ms/instruction")
+
+    start = time.perf_counter()
+    index.build_clusters()
+    print(f"clusters: {len(index.centroids)} built in {time.perf_counter()-start:.2f}s")
+    for nprobe in args.nprobe:
+        approximate_ms = timed(lambda: index.search(queries, args.k, nprobe=nprobe), args.repeat)/args.queries
+        recall = index.recall(queries, args.k, nprobe)
+        print(f"approximate, nprobe={nprobe:<3}     {approximate_ms:10.3f} ms/instruction, recall@{args.k} {recall:.3f}")
+
+
+if __name__=='__main__':
+    main()
@@ -5,6 +5,9 @@
 import numpy as np
 import matplotlib.pyplot as plt
 
+from environment.history import EngineHistory
+from environment.instrumentation import instrument
+
 class Engine:
     def __init__(self, local_setup_info:dict={}) -> None:
         """Defines the environment function from the generator engine.
@@ -47,9 +50,34 @@ class Engine:
         self.supervised_rewards = local_setup_info['supervised_rewards']
         # Precision parameter
         self.obs_precision = local_setup_info['obs_precision']
+        # Optional lookup table mode, replaces the per-step vel/rew/sin/cos with index lookups
+        if local_setup_info.get('table_mode', False):
+            from environment.transition_table import TransitionTable, DEFAULT_CACHE_DIR
+            self.table = TransitionTable.get(self.obs_precision, self.y_limit, self.supervised_rewards,
+                                             cache_dir=local_setup_info.get('table_cache_dir', DEFAULT_CACHE_DIR))
+        else:
+            self.table = None
+        self.angle_row = -1
+        # Optional integer observation mode, emits StateCodec ids instead of "x_angle" strings
+        if local_setup_info.get('obs_mode', 'str') == 'id':
+            from environment.state_codec import StateCodec
+            self.state_codec = StateCodec(self.obs_precision)
+        else:
+            self.state_codec = None
         # Initialize history
+        # - Lifetime action/observation lists as read by elsciRL and the adapters, 'history': False skips them
+        # - 'history_buffer': True also records each episode into bounded ring buffers (engine.history)
+        self.record_history = local_setup_info.get('history', True)
         self.action_history = []
         self.obs_history = []
+        self.history = EngineHistory(capacity=local_setup_info.get('history_capacity', 10000),
+                                     enabled=local_setup_info.get('history_buffer', False))
+        # Render output, 'figure' returns a new matplotlib Figure per call, 'rgb_array' returns a
+        # uint8 (H, W, 3) frame from a FrameRenderer that caches the background and sprites
+        self.render_mode = local_setup_info.get('render_mode', 'figure')
+        self.renderer = None
+        # Optional call timing ('instrument': True or SAILING_INSTRUMENT=1), off by default
+        instrument(self, 'engine', ['reset', 'step', 'render'], local_setup_info)
 
     # --------------------------
     # Defined functions used by engine source
@@ -62,8 +90,11 @@ class Engine:
         return Engine.vel(theta, theta_0, theta_dead) * np.cos(theta)
     # --------------------------
 
-    def reset(self, start_obs:str=None):
+    def reset(self, start_obs:str|int=None):
         """Fully reset the environment."""
+        # Start positions can also be given as state ids in obs_mode 'id'
+        if (start_obs is not None) and (not isinstance(start_obs, str)):
+            start_obs = self.state_codec.to_str(start_obs)
         # Allow reset to be at fixed start position or random
         if start_obs:
             self.x = np.round(float(start_obs.split('_')[0]),self.obs_precision)
@@ -72,8 +103,15 @@ class Engine:
             self.x = 0 #np.round(np.random.randint(-9.9, 9.9),4) # Changed to rand_int to reduce num of start states
             self.angle = 0  # always start with angle 0
         self.y = 0
-        obs = "{n:.{d}f}".format(n=self.x, d=self.obs_precision)+'_'+"{:0.1f}".format(self.angle)
-        self.obs_history.append(obs)
+        if self.table is not None:
+            self.angle_row = self.table.row(self.angle)
+        if self.state_codec is not None:
+            obs = self.state_codec.encode(self.x, self.angle)
+        else:
+            obs = "{n:.{d}f}".format(n=self.x, d=self.obs_precision)+'_'+"{:0.1f}".format(self.angle)
+        if self.record_history:
+            self.obs_history.append(obs)
+        self.history.start_episode(self.x, self.y, self.angle)
         return obs
 
     
@@ -82,19 +120,26 @@ class Engine:
         # Added to ensure format is correct
         # TODO: move this into elsciRL agents
         if isinstance(action, np.int64):
-            self.action_history.append(action.item())
+            action = action.item()
         elif isinstance(action, np.ndarray):
-            self.action_history.append(action.item())
-        else:
+            action = action.item()
+        if self.record_history:
             self.action_history.append(action)
+        if self.angle_row >= 0:
+            return self.table_step(action)
         a = [-0.1, 0.1][action]
         # Observation space
         self.x += np.round((Engine.vel(self.angle + a) * np.sin(self.angle + a)),self.obs_precision) # Round x to Ndp
         self.y += np.round((Engine.vel(self.angle + a) * np.cos(self.angle + a)),4) # Round y to 4dp
         self.angle = np.round(self.angle+a,1) 
         #obs = str(self.x)+'_'+str(self.angle)
-        obs = "{n:.{d}f}".format(n=self.x, d=self.obs_precision)+'_'+"{:0.1f}".format(self.angle) # fix - https://docs.python.org/3.4/library/string.html#format-specification-mini-language
-        self.obs_history.append(obs)
+        if self.state_codec is not None:
+            obs = self.state_codec.encode(self.x, self.angle)
+        else:
+            obs = "{n:.{d}f}".format(n=self.x, d=self.obs_precision)+'_'+"{:0.1f}".format(self.angle) # fix - https://docs.python.org/3.4/library/string.html#format-specification-mini-language
+        if self.record_history:
+            self.obs_history.append(obs)
+        self.history.record(action, self.x, self.y, self.angle)
         # Reward signal
         # - Added flag for whether we give agent immediate positive reward
         # - Update: Added scale factor if using supervised rewards to not override goal rewards
@@ -127,6 +172,42 @@ class Engine:
         
         return obs, reward, terminated, info
 
+    def table_step(self, action:int):
+        """Same transition as step() using the precomputed TransitionTable lookups."""
+        row = self.angle_row
+        self.x += self.table.dx[row, action]
+        self.y += self.table.dy[row, action]
+        self.angle = self.table.next_angle[row, action]
+        self.angle_row = self.table.next_row[row, action]
+        if self.state_codec is not None:
+            obs = self.state_codec.encode(self.x, self.angle)
+        elif self.angle_row >= 0:
+            obs = "{n:.{d}f}".format(n=self.x, d=self.obs_precision)+'_'+self.table.angle_str[self.angle_row]
+        else:
+            obs = "{n:.{d}f}".format(n=self.x, d=self.obs_precision)+'_'+"{:0.1f}".format(self.angle)
+        if self.record_history:
+            self.obs_history.append(obs)
+        self.history.record(action, self.x, self.y, self.angle)
+        # Same reward types as step(), the int 0 without supervised rewards
+        reward = self.table.reward[row, action] if self.supervised_rewards=="True" else 0
+
+        # Termination signal, same priority as step()
+        if np.abs(self.x)>self.x_limit:
+            reward = -1
+            terminated = True
+        elif np.abs(self.y)>self.y_limit:
+            reward = 1
+            terminated = True
+        elif self.table.angle_terminal[row, action]:
+            reward = -1
+            terminated = True
+        else:
+            terminated = False
+
+        info = None
+
+        return obs, reward, terminated, info
+
     def legal_move_generator(self, obs:any=None):
         """Define legal moves at each position"""
         # Action space: [0,1] for turn slightly left or right
@@ -147,10 +228,18 @@ class Engine:
             x = self.x
             y = self.y
             angle = self.angle
+        elif not isinstance(state, str):
+            x, angle = self.state_codec.decode(state)
+            y = 5 # Not output by environment so using dummy value for display
         else:
             x = float(state.split('_')[0])
             y = 5 # Not output by environment so using dummy value for display
             angle = float(state.split('_')[1])
+        if self.render_mode == 'rgb_array':
+            if self.renderer is None:
+                from environment.renderer import FrameRenderer
+                self.renderer = FrameRenderer(x_limit=self.x_limit)
+            return self.renderer.render(x, y, angle)
         #print("PLOT DATA = ", x, y, angle)
         # Angle is bearing into wind -pi/2 < angle < pi/2
         if angle < np.pi/2:
@@ -0,0 +1,244 @@
+# Streaming episode export to animated GIF or MP4
+# - Frames come from the FrameRenderer and are written one at a time, nothing is kept per episode
+# - Frames are quantized piecewise: the static background once, the x label once per distinct observation
+#   (memoized in a byte-bounded LRU). y is not part of the observation, the y label and the boat are an overlay
+#   blended per frame and only their small region is quantized again
+# - GIF frames are encoded with Pillow against one fixed palette, MP4 frames are piped to a local ffmpeg
+# - Run from the repository root: python -m environment.episode_export episodes.gif --episodes 3
+import os
+import shutil
+import argparse
+import subprocess
+import numpy as np
+from collections import OrderedDict
+from PIL import Image, GifImagePlugin
+
+from environment.engine import Engine
+from environment.renderer import FrameRenderer
+from environment.instrumentation import register_cache
+
+
+class GifWriter:
+    def __init__(self, path:str, fps:float=4, loop:int=0) -> None:
+        """Animated GIF written frame by frame. The palette is fixed from the first frame,
+        the renderer only draws a handful of colours so every later frame maps onto it."""
+        self.path = path
+        self.duration = int(round(1000/fps))
+        self.loop = loop
+        self.file = None
+        self.palette = None
+
+    def start(self, frame:np.ndarray) -> None:
+        """Fixes the palette from the first complete frame."""
+        if self.palette is None:
+            self.palette = Image.fromarray(frame).quantize(colors=256, dither=Image.Dither.NONE)
+
+    def quantize(self, frame:np.ndarray) -> np.ndarray:
+        """Palette indices of an RGB frame or region, pixels map independently so regions can be
+        quantized separately."""
+        return np.asarray(Image.fromarray(frame).quantize(palette=self.palette, dither=Image.Dither.NONE))
+
+    def encode_quantized(self, indices:np.ndarray) -> bytes:
+        image = Image.fromarray(indices, mode='P')
+        image.putpalette(self.palette.getpalette())
+        return b''.join(GifImagePlugin.getdata(image, duration=self.duration))
+
+    def encode(self, frame:np.ndarray) -> bytes:
+        self.start(frame)
+        return self.encode_quantized(self.quantize(frame))
+
+    def write(self, payload:bytes) -> None:
+        if self.file is None:
+            self.file = open(self.path, 'wb')
+            header, _ = GifImagePlugin.getheader(self.palette.copy(), info={'loop': self.loop, 'duration': self.duration})
+            self.file.write(b''.join(header))
+        self.file.write(payload)
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.write(b';')
+            self.file.close()
+            self.file = None
+
+
+class FFmpegWriter:
+    def __init__(self, path:str, fps:float=4) -> None:
+        """MP4 (H.264) written by piping raw RGB frames to a local ffmpeg process."""
+        if shutil.which('ffmpeg') is None:
+            raise RuntimeError("MP4 export needs ffmpeg on the PATH, export to .gif instead")
+        self.path = path
+        self.fps = fps
+        self.process = None
+
+    def start(self, frame:np.ndarray) -> None:
+        """Starts ffmpeg with the frame size of the first frame."""
+        if self.process is None:
+            height, width = frame.shape[:2]
+            self.process = subprocess.Popen(
+                ['ffmpeg', '-y', '-loglevel', 'error', '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+                 '-s', f'{width}x{height}', '-r', str(self.fps), '-i', '-',
+                 '-vcodec', 'libx264', '-pix_fmt', 'yuv420p', self.path],
+                stdin=subprocess.PIPE)
+
+    def quantize(self, frame:np.ndarray) -> np.ndarray:
+        """Raw RGB frames are written as is."""
+        return frame
+
+    def encode_quantized(self, frame:np.ndarray) -> bytes:
+        return frame.tobytes()
+
+    def encode(self, frame:np.ndarray) -> bytes:
+        self.start(frame)
+        return frame.tobytes()
+
+    def write(self, payload:bytes) -> None:
+        self.process.stdin.write(payload)
+
+    def close(self) -> None:
+        if self.process is not None:
+            self.process.stdin.close()
+            if self.process.wait() != 0:
+                raise RuntimeError(f"ffmpeg failed writing {self.path}")
+            self.process = None
+
+
+class EpisodeExporter:
+    def __init__(self, path:str, fps:float=4, x_limit:float=10, cache_bytes:int=64*1024**2,
+                 state_codec=None) -> None:
+        """Streams episodes to path (.gif or .mp4) at fps frames per second.
+        The quantized x label of each observation is cached up to cache_bytes, states given as ids are
+        decoded with state_codec (the Engine's StateCodec in obs_mode 'id')."""
+        extension = os.path.splitext(path)[1].lower()
+        if extension == '.gif':
+            self.writer = GifWriter(path, fps)
+        elif extension == '.mp4':
+            self.writer = FFmpegWriter(path, fps)
+        else:
+            raise ValueError(f"Unsupported export format {extension}, use .gif or .mp4")
+        self.renderer = FrameRenderer(x_limit=x_limit)
+        self.state_codec = state_codec
+        self.cache_bytes = cache_bytes
+        self.cache = OrderedDict()
+        self.cached_bytes = 0
+        self.background = None
+        self.frames = 0
+        self.hits = 0
+        self.misses = 0
+        register_cache('episode_export.frames', self)
+
+    def _write(self, key:tuple, x:float, y:float, angle:float) -> None:
+        """Frame of the boat at (x, y, angle), key identifies the observation (x, angle)."""
+        frame = self.renderer.render_base(x)
+        overlays = self.renderer.overlays(x, y, angle)
+        for sprite in overlays:
+            self.renderer.blend(frame, *sprite)
+        if self.background is None:
+            self.writer.start(frame)
+            self.background = self.writer.quantize(self.renderer.background)
+        # Quantized x label of the observation, pasted over the quantized background
+        label = self.cache.get(key)
+        if label is None:
+            self.misses += 1
+            label = self.quantize_region(frame, self.renderer.bounds(*self.renderer.x_label(x)))
+            if label[1].nbytes <= self.cache_bytes:
+                self.cache[key] = label
+                self.cached_bytes += label[1].nbytes
+                while self.cached_bytes > self.cache_bytes:
+                    _, (_, evicted) = self.cache.popitem(last=False)
+                    self.cached_bytes -= evicted.nbytes
+        else:
+            self.hits += 1
+            self.cache.move_to_end(key)
+        quantized = self.background.copy()
+        # Overlay (y label and boat) blended in RGB, only its region is quantized per frame
+        for bounds, patch in [label] + [self.quantize_region(frame, self.renderer.bounds(*sprite)) for sprite in overlays]:
+            row0, row1, col0, col1 = bounds
+            quantized[row0:row1, col0:col1] = patch
+        self.writer.write(self.writer.encode_quantized(quantized))
+        self.frames += 1
+
+    def quantize_region(self, frame:np.ndarray, bounds:tuple) -> tuple:
+        """(bounds, quantized pixels) of a (row0, row1, col0, col1) region of an RGB frame."""
+        row0, row1, col0, col1 = bounds
+        if row1 <= row0 or col1 <= col0:
+            # Off-frame sprite, nothing to replace
+            return bounds, self.background[row0:row1, col0:col1]
+        return bounds, self.writer.quantize(np.ascontiguousarray(frame[row0:row1, col0:col1]))
+
+    def write_state(self, state:any, y:float=5) -> None:
+        """Frame of an observation, y is not part of the observation (Engine.render(state) shows y=5)."""
+        if not isinstance(state, str):
+            state = self.state_codec.to_str(state)
+        x, angle = state.split('_')
+        self._write(('state', state), float(x), y, float(angle))
+
+    def write_position(self, x:float, y:float, angle:float) -> None:
+        """Frame of the boat at its full (x, y, angle) position, cached by (x, angle)."""
+        x, angle = round(float(x), 6), round(float(angle), 1)
+        self._write(('state', x, angle), x, float(y), angle)
+
+    def write_observations(self, obs_history:list) -> None:
+        """Frames of an episode's observations, e.g. Engine.obs_history."""
+        for state in obs_history:
+            self.write_state(state)
+
+    def write_positions(self, positions:np.ndarray) -> None:
+        """Frames of (n, 3) x, y, angle rows, e.g. Engine.history.episode_positions() (with 'history_buffer': True)."""
+        for x, y, angle in positions:
+            self.write_position(x, y, angle)
+
+    def record_episode(self, engine:Engine, policy, start_obs:any=None, max_steps:int=1000) -> float:
+        """Live rollout streamed as it is played, policy(state, legal_moves) returns the action.
+        Returns the episode return."""
+        if self.state_codec is None:
+            self.state_codec = engine.state_codec
+        state = engine.reset(start_obs)
+        self.write_state(state, engine.y)
+        episode_return = 0
+        for _ in range(max_steps):
+            action = policy(state, engine.legal_move_generator(state))
+            state, reward, terminated, _ = engine.step(state, action)
+            episode_return += reward
+            self.write_state(state, engine.y)
+            if terminated:
+                break
+        return episode_return
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {'frames': self.frames, 'cached_frames': len(self.cache), 'cached_bytes': self.cached_bytes,
+                'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits/lookups if lookups > 0 else 0.0}
+
+    def close(self) -> None:
+        self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export random-policy sailing episodes to GIF or MP4")
+    parser.add_argument('path', help="Output .gif or .mp4 file")
+    parser.add_argument('--episodes', type=int, default=1)
+    parser.add_argument('--max-steps', type=int, default=200)
+    parser.add_argument('--fps', type=float, default=4)
+    parser.add_argument('--obs-precision', type=int, default=2)
+    parser.add_argument('--y-limit', type=float, default=25)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    engine = Engine({'obs_precision': args.obs_precision, 'y_limit': args.y_limit, 'supervised_rewards': "False"})
+    with EpisodeExporter(args.path, fps=args.fps, x_limit=engine.x_limit) as exporter:
+        for _ in range(args.episodes):
+            exporter.record_episode(engine, lambda state, legal_moves: int(rng.choice(legal_moves)),
+                                    max_steps=args.max_steps)
+    print(f"Wrote {args.path}: {exporter.stats()}")
+
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,87 @@
+# Bounded, array-backed episode history for the sailing Engine
+# - Actions and (x, y, angle) positions are kept in NumPy ring buffers of fixed capacity
+# - Each value is written twice (at i and i+capacity) so any window of up to capacity items
+#   is one contiguous slice, letting the current episode and last-k actions be returned as views
+import numpy as np
+from collections import deque
+
+
+class RingBuffer:
+    def __init__(self, capacity:int, shape:tuple=(), dtype=np.float64) -> None:
+        self.capacity = capacity
+        self.data = np.zeros((2*capacity,) + shape, dtype=dtype)
+        self.count = 0
+
+    def append(self, value) -> None:
+        idx = self.count % self.capacity
+        self.data[idx] = value
+        self.data[idx+self.capacity] = value
+        self.count += 1
+
+    def window(self, start:int, end:int=None) -> np.ndarray:
+        """View of the items with absolute positions [start, end), clipped to what is still stored."""
+        end = self.count if end is None else min(end, self.count)
+        start = max(start, self.count - self.capacity, 0)
+        if end <= start:
+            return self.data[:0]
+        offset = start % self.capacity
+        return self.data[offset:offset + (end - start)]
+
+
+class EngineHistory:
+    def __init__(self, capacity:int=10000, enabled:bool=True) -> None:
+        """Per-episode history of actions and boat positions, opt-in with the Engine's 'history_buffer' key.
+        Holds at most capacity actions and positions, older entries are overwritten, so the returned views
+        are only valid until the buffer wraps (copy them to keep them).
+        Episode segment offsets (first position and action of each episode) are kept for
+        the episodes that can still be (at least partially) sliced from the buffers."""
+        self.enabled = enabled
+        self.capacity = capacity if enabled else 1
+        self.actions = RingBuffer(self.capacity, dtype=np.int8)
+        self.positions = RingBuffer(self.capacity, shape=(3,), dtype=np.float64)
+        # (position offset, action offset) of each retained episode
+        self.episode_offsets = deque(maxlen=self.capacity)
+        self.num_episodes = 0
+
+    def start_episode(self, x:float, y:float, angle:float) -> None:
+        self.num_episodes += 1
+        if not self.enabled:
+            return
+        self.episode_offsets.append((self.positions.count, self.actions.count))
+        self.positions.append((x, y, angle))
+
+    def record(self, action:int, x:float, y:float, angle:float) -> None:
+        if not self.enabled:
+            return
+        self.actions.append(action)
+        self.positions.append((x, y, angle))
+
+    # --------------------------
+    # Views (no copies)
+    def episode_actions(self, episode:int=-1) -> np.ndarray:
+        """Actions of a retained episode (default current), truncated to the buffer capacity."""
+        if not self.episode_offsets:
+            return self.actions.data[:0]
+        _, action_start = self.episode_offsets[episode]
+        action_end = self._next_offsets(episode)[1]
+        return self.actions.window(action_start, action_end)
+
+    def episode_positions(self, episode:int=-1) -> np.ndarray:
+        """(n, 3) x, y, angle rows of a retained episode (default current) starting at its reset position."""
+        if not self.episode_offsets:
+            return self.positions.data[:0]
+        position_start, _ = self.episode_offsets[episode]
+        position_end = self._next_offsets(episode)[0]
+        return self.positions.window(position_start, position_end)
+
+    def last_actions(self, k:int) -> np.ndarray:
+        """Up to the last k actions of the current episode as a view."""
+        actions = self.episode_actions()
+        return actions[max(len(actions)-k, 0):]
+
+    def _next_offsets(self, episode:int) -> tuple:
+        """Offsets one past the end of an episode."""
+        idx = episode % len(self.episode_offsets)
+        if idx + 1 < len(self.episode_offsets):
+            return self.episode_offsets[idx+1]
+        return (self.positions.count, self.actions.count)
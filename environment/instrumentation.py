@@ -0,0 +1,174 @@
+# Hot-path instrumentation for the engines and adapters
+# - Off by default. When off nothing is wrapped, so calls run exactly as without instrumentation
+# - When on, the selected methods of an instance are replaced by timed wrappers recording call counts,
+#   cumulative time and a window of recent latencies for percentiles
+# - Caches with hits/misses counters are read when a snapshot is taken, nothing is added to their hot path
+# - Enable with the 'instrument': True setup key, instrumentation.enable() or the SAILING_INSTRUMENT=1
+#   environment variable. SAILING_INSTRUMENT_JSON/SAILING_INSTRUMENT_PROM write a JSON snapshot/Prometheus
+#   text file at exit
+import os
+import json
+import time
+import array
+import atexit
+import weakref
+import numpy as np
+
+PERCENTILES = [50, 90, 99]
+
+
+class LatencyStats:
+    def __init__(self, window:int=4096) -> None:
+        """Count, total and max of a call's latency plus the last window latencies for percentiles."""
+        self.window = window
+        self.samples = array.array('d', bytes(8*window))
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds:float) -> None:
+        self.samples[self.count % self.window] = seconds
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def wrap(self, function):
+        perf_counter = time.perf_counter
+        add = self.add
+
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                add(perf_counter() - start)
+        timed.__wrapped__ = function
+        return timed
+
+    def snapshot(self) -> dict:
+        recent = np.frombuffer(self.samples, dtype=np.float64)[:min(self.count, self.window)]
+        percentiles = np.percentile(recent, PERCENTILES) if len(recent) > 0 else np.zeros(len(PERCENTILES))
+        return {'count': self.count, 'total_s': self.total, 'mean_s': self.total/self.count if self.count else 0.0,
+                'max_s': self.max, **{f'p{p}_s': float(v) for p, v in zip(PERCENTILES, percentiles)}}
+
+
+class Instrumentation:
+    def __init__(self) -> None:
+        """Registry of timed calls and caches, one per process (INSTRUMENTS)."""
+        self.enabled = False
+        self.started = time.perf_counter()
+        self.timers = {}
+        self.caches = {}
+
+    def enable(self, json_path:str=None, prometheus_path:str=None) -> None:
+        """Instrument engines and adapters created from now on, optionally exporting at exit."""
+        if not self.enabled:
+            self.started = time.perf_counter()
+        self.enabled = True
+        if json_path:
+            atexit.register(self.write_json, json_path)
+        if prometheus_path:
+            atexit.register(self.write_prometheus, prometheus_path)
+
+    def timer(self, name:str) -> LatencyStats:
+        stats = self.timers.get(name)
+        if stats is None:
+            stats = self.timers[name] = LatencyStats()
+        return stats
+
+    def instrument(self, obj:any, prefix:str, methods:list) -> None:
+        """Replaces obj.method with a timed wrapper recorded as prefix.method, instances with the
+        same prefix share their statistics."""
+        for method in methods:
+            setattr(obj, method, self.timer(prefix + '.' + method).wrap(getattr(obj, method)))
+
+    def register_cache(self, name:str, cache:any, stats=None) -> None:
+        """Cache read at snapshot time, stats(cache) returns a dict with 'hits' and 'misses'
+        (default cache.stats()). Only a weak reference is kept."""
+        self.caches.setdefault(name, []).append((weakref.ref(cache), stats))
+
+    def cache_snapshot(self) -> dict:
+        caches = {}
+        for name, entries in self.caches.items():
+            hits, misses = 0, 0
+            for ref, stats in entries:
+                cache = ref()
+                if cache is None:
+                    continue
+                values = stats(cache) if stats else cache.stats()
+                hits += values['hits']
+                misses += values['misses']
+            lookups = hits + misses
+            caches[name] = {'hits': hits, 'misses': misses, 'hit_rate': hits/lookups if lookups else 0.0}
+        return caches
+
+    def snapshot(self) -> dict:
+        """Calls and caches so far. Wall time not spent in instrumented calls is time in elsciRL
+        (nested calls such as encoders inside adapter() are also counted by their parent)."""
+        return {'enabled': self.enabled, 'uptime_s': time.perf_counter() - self.started,
+                'calls': {name: stats.snapshot() for name, stats in sorted(self.timers.items())},
+                'caches': self.cache_snapshot()}
+
+    def reset(self) -> None:
+        """Clears the recorded statistics, instrumented objects keep recording into new ones."""
+        for stats in self.timers.values():
+            stats.__init__(stats.window)
+        self.started = time.perf_counter()
+
+    def write_json(self, path:str) -> None:
+        write_atomic(path, json.dumps(self.snapshot(), indent=2))
+
+    def prometheus(self) -> str:
+        """Snapshot in the Prometheus text exposition format, latencies as summaries."""
+        snapshot = self.snapshot()
+        lines = ['# HELP sailing_call_seconds Latency of instrumented engine and adapter calls',
+                 '# TYPE sailing_call_seconds summary']
+        for name, stats in snapshot['calls'].items():
+            for p in PERCENTILES:
+                lines.append(f'sailing_call_seconds{{call="{name}",quantile="{p/100}"}} {stats[f"p{p}_s"]:.9g}')
+            lines.append(f'sailing_call_seconds_sum{{call="{name}"}} {stats["total_s"]:.9g}')
+            lines.append(f'sailing_call_seconds_count{{call="{name}"}} {stats["count"]}')
+        lines += ['# HELP sailing_cache_lookups_total Cache lookups by result',
+                  '# TYPE sailing_cache_lookups_total counter']
+        for name, stats in snapshot['caches'].items():
+            lines.append(f'sailing_cache_lookups_total{{cache="{name}",result="hit"}} {stats["hits"]}')
+            lines.append(f'sailing_cache_lookups_total{{cache="{name}",result="miss"}} {stats["misses"]}')
+        lines += ['# HELP sailing_cache_hit_ratio Cache hit rate',
+                  '# TYPE sailing_cache_hit_ratio gauge']
+        for name, stats in snapshot['caches'].items():
+            lines.append(f'sailing_cache_hit_ratio{{cache="{name}"}} {stats["hit_rate"]:.6g}')
+        lines += ['# HELP sailing_uptime_seconds Seconds since instrumentation was enabled',
+                  '# TYPE sailing_uptime_seconds gauge',
+                  f'sailing_uptime_seconds {snapshot["uptime_s"]:.6g}']
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path:str) -> None:
+        """Text file for the node exporter textfile collector (or any scraper reading files)."""
+        write_atomic(path, self.prometheus())
+
+
+def write_atomic(path:str, text:str) -> None:
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as file:
+        file.write(text)
+    os.replace(tmp_path, path)
+
+
+INSTRUMENTS = Instrumentation()
+if os.environ.get('SAILING_INSTRUMENT', '0') not in ('', '0'):
+    INSTRUMENTS.enable(os.environ.get('SAILING_INSTRUMENT_JSON'), os.environ.get('SAILING_INSTRUMENT_PROM'))
+
+
+def instrument(obj:any, prefix:str, methods:list, setup_info:dict={}) -> bool:
+    """Instruments obj's methods if enabled globally or by setup_info['instrument'], returns whether it did.
+    Called once from __init__, so disabled instrumentation costs nothing per call."""
+    if not (INSTRUMENTS.enabled or setup_info.get('instrument', False)):
+        return False
+    INSTRUMENTS.instrument(obj, prefix, methods)
+    return True
+
+
+def register_cache(name:str, cache:any, stats=None, setup_info:dict={}) -> None:
+    if INSTRUMENTS.enabled or setup_info.get('instrument', False):
+        INSTRUMENTS.register_cache(name, cache, stats)
@@ -0,0 +1,213 @@
+# Fast headless renderer for the sailing Engine
+# - Everything is drawn once with matplotlib (Agg, no pyplot figure registry) and cached as bitmaps:
+#   the static background (title, axes, river walls, wind arrow), one boat sprite per heading and
+#   one glyph per axis label character
+# - A frame is a copy of the background with the boat sprite alpha-blended in with NumPy and the
+#   axis labels laid out from the cached glyphs, so no matplotlib drawing happens per frame
+import numpy as np
+from collections import OrderedDict
+from matplotlib.text import Text
+from matplotlib.colors import to_rgb
+from matplotlib.figure import Figure
+from matplotlib.transforms import IdentityTransform
+from matplotlib.font_manager import findfont, get_font
+from matplotlib.backends.backend_agg import FigureCanvasAgg, RendererAgg
+
+
+class FrameRenderer:
+    def __init__(self, x_limit:float=10, river_length:float=25, figsize:tuple=(5,5), dpi:int=128,
+                 sprite_cache_size:int=1024) -> None:
+        """Renders boat positions to uint8 (H, W, 3) arrays with the same layout as Engine.render().
+        Axis limits are fixed to the river (plus matplotlib's default 5% margin) so the background
+        and sprites line up for every frame. Sprites are kept in an LRU of sprite_cache_size entries."""
+        self.x_limit = x_limit
+        self.river_length = river_length
+        self.dpi = dpi
+        self.sprite_cache_size = sprite_cache_size
+        self.sprites = OrderedDict()
+
+        self.fig = Figure(figsize=figsize, dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.fig)
+        self.ax = self.fig.add_subplot()
+        ax = self.ax
+        ax.quiver(0,river_length,0,-1,angles='uv',scale_units='xy',scale=1,color='r')
+        ax.text(0,river_length+0.25,'Wind',color='r')
+        ax.plot([x_limit,x_limit],[0,river_length],'r')
+        ax.plot([-x_limit,-x_limit],[0,river_length],'r')
+        ax.set_title("Sailboat Position with Direction against Wind")
+        x_margin = 0.05*2*x_limit
+        y_margin = 0.05*river_length
+        ax.set_xlim(-x_limit-x_margin, x_limit+x_margin)
+        ax.set_ylim(-y_margin, river_length+y_margin)
+        # Axis labels change every frame, blank labels keep the layout and give their anchor positions
+        self.xlabel = ax.set_xlabel(" ")
+        self.ylabel = ax.set_ylabel(" ")
+        self.canvas.draw()
+        self.background = np.asarray(self.canvas.buffer_rgba())[:, :, :3].copy()
+        self.width, self.height = self.canvas.get_width_height()
+
+        # Transparent scratch figure with identical axes geometry, boat sprites are drawn here
+        self.scratch = Figure(figsize=figsize, dpi=dpi)
+        self.scratch.patch.set_alpha(0)
+        self.scratch_canvas = FigureCanvasAgg(self.scratch)
+        self.scratch_ax = self.scratch.add_axes(ax.get_position())
+        self.scratch_ax.set_xlim(ax.get_xlim())
+        self.scratch_ax.set_ylim(ax.get_ylim())
+        self.scratch_ax.set_axis_off()
+        # Boat sprites are drawn at the middle of the river and shifted to the boat position
+        self.sprite_origin = (0, river_length/2)
+        # Glyphs are drawn straight onto a reused renderer
+        self.text_renderer = RendererAgg(self.width, self.height, dpi)
+
+    @staticmethod
+    def heading_vector(angle:float) -> tuple:
+        """Boat direction arrow, angle is bearing into wind -pi/2 < angle < pi/2."""
+        if angle < np.pi/2:
+            return np.sin(angle), np.cos(angle)
+        elif angle == np.pi/2:
+            return 1, 0
+        elif angle == -np.pi/2:
+            return -1, 0
+        return np.sin(angle), -np.cos(angle)
+
+    def pixel(self, x:float, y:float) -> tuple:
+        """(row, col) of a data point in the frame."""
+        px, py = self.ax.transData.transform((x, y))
+        return int(round(self.height - py)), int(round(px))
+
+    # --------------------------
+    # Sprites
+    @staticmethod
+    def crop(rgba:np.ndarray) -> tuple:
+        """(row, col, rgba) of the smallest box holding every drawn (non-transparent) pixel."""
+        rows = np.flatnonzero(rgba[:, :, 3].any(axis=1))
+        cols = np.flatnonzero(rgba[:, :, 3].any(axis=0))
+        if len(rows) == 0:
+            return 0, 0, np.zeros((0, 0, 4), dtype=np.uint8)
+        return rows[0], cols[0], rgba[rows[0]:rows[-1]+1, cols[0]:cols[-1]+1].copy()
+
+    def _cached(self, key:tuple, draw) -> tuple:
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            sprite = draw()
+            self.sprites[key] = sprite
+            if len(self.sprites) > self.sprite_cache_size:
+                self.sprites.popitem(last=False)
+        else:
+            self.sprites.move_to_end(key)
+        return sprite
+
+    def boat_sprite(self, angle:float, labelled:bool) -> tuple:
+        """Boat marker, heading arrow and optional 'Sailboat' label, offsets relative to the boat pixel."""
+        def draw():
+            x, y = self.sprite_origin
+            U, V = FrameRenderer.heading_vector(angle)
+            artists = [self.scratch_ax.scatter(x,y,c='b',marker='x',alpha=1),
+                       self.scratch_ax.quiver(x,y,U,V,angles='uv',scale_units='xy',scale=1)]
+            if labelled:
+                artists.append(self.scratch_ax.text(x+0.5,y-1,'Sailboat',color='b'))
+            self.scratch_canvas.draw()
+            for artist in artists:
+                artist.remove()
+            row, col, rgba = FrameRenderer.crop(np.asarray(self.scratch_canvas.buffer_rgba()))
+            origin_row, origin_col = self.pixel(x, y)
+            return row-origin_row, col-origin_col, rgba
+        return self._cached(('boat', float(angle), labelled), draw)
+
+    def glyph(self, label:Text, char:str) -> tuple:
+        """Alpha mask of one character in the label's font, its offsets from the pen position on
+        the baseline and the pen advance in pixels."""
+        def draw():
+            prop = label.get_fontproperties()
+            pen_x, baseline_y = 100, 100
+            artist = Text(pen_x, baseline_y, char, transform=IdentityTransform(), fontproperties=prop,
+                          horizontalalignment='left', verticalalignment='baseline')
+            artist.set_figure(self.scratch)
+            self.text_renderer.clear()
+            artist.draw(self.text_renderer)
+            row, col, rgba = FrameRenderer.crop(np.asarray(self.text_renderer.buffer_rgba()))
+            font = get_font(findfont(prop))
+            font.set_size(prop.get_size_in_points(), self.dpi)
+            advance = font.load_char(ord(char)).linearHoriAdvance/65536
+            return row-(self.height-baseline_y), col-pen_x, rgba[:, :, 3].copy(), advance
+        return self._cached(('glyph', id(label), char), draw)
+
+    def line_metrics(self, label:Text) -> tuple:
+        """(ascent, descent) in pixels of a label line, the box its alignment refers to."""
+        def measure():
+            _, height, descent = self.text_renderer.get_text_width_height_descent(
+                "lp (-0.123456789)", label.get_fontproperties(), ismath=False)
+            return height-descent, descent
+        return self._cached(('metrics', id(label)), measure)
+
+    def label_sprite(self, label:Text, text:str) -> tuple:
+        """(row, col, rgba) of an axis label laid out from cached glyphs at its position in the frame.
+        Alignment follows matplotlib's 'anchor' rotation mode, the y label is rotated by 90 degrees."""
+        glyphs = [self.glyph(label, char) for char in text]
+        ascent, descent = self.line_metrics(label)
+        # Strip in the text's own frame with the baseline at row ascent
+        pens = np.cumsum([0] + [advance for *_, advance in glyphs])
+        width = int(np.ceil(pens[-1])) + 2
+        height = int(np.ceil(ascent + descent)) + 2
+        strip = np.zeros((height, width), dtype=np.uint8)
+        for (d_row, d_col, mask, _), pen in zip(glyphs, pens):
+            r0 = max(int(round(ascent)) + d_row, 0)
+            c0 = max(int(round(pen)) + d_col, 0)
+            region = strip[r0:r0+mask.shape[0], c0:c0+mask.shape[1]]
+            np.maximum(region, mask[:region.shape[0], :region.shape[1]], out=region)
+        anchor_col = {'left': 0, 'center': pens[-1]/2, 'right': pens[-1]}[label.get_horizontalalignment()]
+        anchor_row = {'top': 0, 'center': (ascent+descent)/2, 'center_baseline': ascent,
+                      'bottom': ascent+descent, 'baseline': ascent}[label.get_verticalalignment()]
+        px, py = label.get_transform().transform(label.get_position())
+        frame_row, frame_col = self.height - py, px
+        if label.get_rotation() == 90:
+            # Counter-clockwise about the anchor, text reads bottom to top
+            strip = np.rot90(strip)
+            row, col = frame_row - (width - anchor_col), frame_col - anchor_row
+        else:
+            row, col = frame_row - anchor_row, frame_col - anchor_col
+        rgba = np.empty(strip.shape + (4,), dtype=np.uint8)
+        rgba[:, :, :3] = np.round(np.array(to_rgb(label.get_color()))*255).astype(np.uint8)
+        rgba[:, :, 3] = strip
+        return int(round(row)), int(round(col)), rgba
+
+    def blend(self, frame:np.ndarray, row:int, col:int, rgba:np.ndarray) -> None:
+        """Alpha-blend an RGBA sprite into frame at (row, col), clipped to the frame bounds."""
+        h, w = rgba.shape[:2]
+        r0, c0 = max(row, 0), max(col, 0)
+        r1, c1 = min(row+h, self.height), min(col+w, self.width)
+        if r1 <= r0 or c1 <= c0:
+            return
+        src = (slice(r0-row, r1-row), slice(c0-col, c1-col))
+        region = frame[r0:r1, c0:c1]
+        sprite = rgba[src]
+        a = sprite[:, :, 3:]*np.float32(1/255)
+        region[:] = (region*(1-a) + sprite[:, :, :3]*a + 0.5).astype(np.uint8)
+
+    # --------------------------
+    def render(self, x:float, y:float, angle:float) -> np.ndarray:
+        """uint8 (H, W, 3) RGB frame of the boat at (x, y) heading angle."""
+        frame = self.render_base(x)
+        for sprite in self.overlays(x, y, angle):
+            self.blend(frame, *sprite)
+        return frame
+
+    def render_base(self, x:float) -> np.ndarray:
+        """Part of a frame that does not depend on y or the boat: background and x label."""
+        frame = self.background.copy()
+        self.blend(frame, *self.x_label(x))
+        return frame
+
+    def x_label(self, x:float) -> tuple:
+        """(row, col, rgba) of the x axis label, the only part of render_base(x) that depends on x."""
+        return self.label_sprite(self.xlabel, f"Horizontal Position ({x})")
+
+    def overlays(self, x:float, y:float, angle:float) -> list:
+        """(row, col, rgba) sprites blended over render_base(x) in order: y label and boat."""
+        row, col = self.pixel(x, y)
+        d_row, d_col, rgba = self.boat_sprite(angle, y > 1)
+        return [self.label_sprite(self.ylabel, f"Vertical Position ({y})"), (row+d_row, col+d_col, rgba)]
+
+    def bounds(self, row:int, col:int, rgba:np.ndarray) -> tuple:
+        """(row0, row1, col0, col1) of a sprite clipped to the frame."""
+        return (max(row, 0), min(row+rgba.shape[0], self.height), max(col, 0), min(col+rgba.shape[1], self.width))
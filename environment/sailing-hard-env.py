@@ -1,10 +1,22 @@
 # Ship Sailing
 # - https://github.com/MarineAutonomy/Deep-Reinforcement-Learning-Based-Control-for-Ship-Navigation
 
+import math
 import numpy as np
-from scipy.integrate import solve_ivp
 import kcs
 
+from environment.ship_integrators import make_integrator
+from environment.instrumentation import instrument
+
+# Rudder commands of the 3 actions (rad)
+ACTION_SET = [-35*np.pi/180, 0, 35*np.pi/180]
+
+
+def wrap_heading(state:np.ndarray) -> None:
+    """Wraps the heading psi of a (7,) ship state to [0, 2pi) in place."""
+    state[5] %= 2 * np.pi
+
+
 class Engine:
     def __init__(self, local_setup_info: dict):
         # Store optional setup info
@@ -33,13 +45,34 @@ class Engine:
         self.initial_obs_state = local_setup_info.get("initial_obs_state", None)
         self.wp_counter = 1
 
+        # ODE integration over each 0.3s step, 'solve_ivp' (adaptive, original) or 'rk4' (fixed step)
+        self.dt = 0.3
+        self.integrator = make_integrator(local_setup_info.get("integrator", "solve_ivp"), self.ode, self.dt,
+                                          substeps=local_setup_info.get("integrator_substeps", 3))
+        # Action repeat, each step holds the rudder command for action_repeat 0.3s sub-steps
+        self.action_repeat = local_setup_info.get("action_repeat", 1)
+        # Unit vector from the start to the goal, set on reset
+        self.goal_hat = (1.0, 0.0)
+
         self.action_history = []
         self.obs_history = []
+        # Optional call timing ('instrument': True or SAILING_INSTRUMENT=1), off by default
+        instrument(self, 'ship_engine', ['reset', 'step', 'render'], local_setup_info)
+
+    def ode(self, t, v, delta_c):
+        return kcs.KCS_ode(t, v, delta_c,
+                           wind_flag=self.wind_flag,
+                           wind_speed=self.wind_speed,
+                           wind_dir=self.wind_dir,
+                           wave_flag=self.wave_flag,
+                           wave_height=self.wave_height,
+                           wave_period=self.wave_period,
+                           wave_dir=self.wave_dir)
 
     def reset(self, start_obs=None):
         # Reset environment state, optionally to a specific observation
         if self.train_test_flag == 0:
-            self.obs_state = [1, 0, 0, 0, 0, 0, 0]
+            self.obs_state = np.array([1, 0, 0, 0, 0, 0, 0], dtype=np.float64)
 
             radius = np.random.randint(8, 28)
             random_theta = 2 * np.pi * np.random.random()
@@ -65,7 +98,8 @@ class Engine:
             self.counter += 1
             observation = np.array([0, course_angle_err, radius, 0], dtype=np.float32)
         else:
-            self.obs_state = self.initial_obs_state
+            # Copied so integrating in place leaves the configured initial state untouched
+            self.obs_state = np.array(self.initial_obs_state, dtype=np.float64)
             self.x_goal = self.test_x_waypoints[1]
             self.y_goal = self.test_y_waypoints[1]
 
@@ -88,104 +122,92 @@ class Engine:
             dist_to_goal = np.sqrt((self.x_goal - x) ** 2 + (self.y_goal - y) ** 2)
             observation = np.array([0, course_angle_err, dist_to_goal, 0], dtype=np.float32)
 
+        goal_norm = math.hypot(self.x_goal, self.y_goal)
+        if goal_norm > 0:
+            self.goal_hat = (self.x_goal/goal_norm, self.y_goal/goal_norm)
+        else:
+            # Goal at the start, no start -> goal line, cross track error is measured against the initial heading
+            self.goal_hat = (1.0, 0.0)
         self.action_history = []
         self.obs_history = [observation.copy()]
         return observation
 
     def step(self, state, action_no):
-        # Action set
-        action_set = [-35*np.pi/180, 0, 35*np.pi/180]
-        delta_c = action_set[action_no]
-
-        tspan = (0, 0.3)
-        yinit = self.obs_state
-
-        sol = solve_ivp(lambda t, v: kcs.KCS_ode(t, v, delta_c,
-                                                 wind_flag=self.wind_flag,
-                                                 wind_speed=self.wind_speed,
-                                                 wind_dir=self.wind_dir,
-                                                 wave_flag=self.wave_flag,
-                                                 wave_height=self.wave_height,
-                                                 wave_period=self.wave_period,
-                                                 wave_dir=self.wave_dir),
-                        tspan, yinit, t_eval=tspan, dense_output=True)
-
-        # extract solution
-        u = sol.y[0][-1]
-        v = sol.y[1][-1]
-        r = sol.y[2][-1]
-        x = sol.y[3][-1]
-        y = sol.y[4][-1]
-        psi_rad = sol.y[5][-1]
-        psi = psi_rad % (2 * np.pi)
-        delta = sol.y[6][-1]
-
-        self.obs_state[0] = u
-        self.obs_state[1] = v
-        self.obs_state[2] = r
-        self.obs_state[3] = x
-        self.obs_state[4] = y
-        self.obs_state[5] = psi
-        self.obs_state[6] = delta
-
-        x_init = 0
-        y_init = 0
+        delta_c = ACTION_SET[action_no]
+        info = {}
+        if self.action_repeat == 1:
+            self.integrator.step(self.obs_state, delta_c)
+            wrap_heading(self.obs_state)
+            cross_track_error, course_angle_err, distance, r, reward, terminated = self.evaluate()
+        else:
+            # Rudder command held over all sub-steps in one integration call, rewards are summed and
+            # termination is checked after every sub-step
+            # - The heading is wrapped between sub-steps, as after every single step
+            states = self.integrator.trajectory(self.obs_state, self.action_repeat, delta_c, post_step=wrap_heading)
+            reward = 0
+            for substeps, sub_state in enumerate(states, start=1):
+                self.obs_state[:] = sub_state
+                cross_track_error, course_angle_err, distance, r, sub_reward, terminated = self.evaluate()
+                reward += sub_reward
+                if terminated:
+                    break
+            info['substeps'] = substeps
+
+        observation = np.array([cross_track_error, course_angle_err, distance, r], dtype=np.float32)
+        self.obs_history.append(observation.copy())
+        self.action_history.append(action_no)
+        if terminated:
+            self.episode_ended = True
+        return observation, reward, terminated, info
+
+    def evaluate(self):
+        """Observation values, reward and termination of the current state.
+        Computed on Python floats, no temporary arrays."""
+        u, v, r, x, y, psi, delta = self.obs_state.tolist()
         x_goal = self.x_goal
         y_goal = self.y_goal
 
         # DISTANCE TO GOAL
-        distance = ((x - x_goal)**2 + (y - y_goal)**2) ** 0.5
+        vec2_x = x_goal - x
+        vec2_y = y_goal - y
+        distance = math.sqrt(vec2_x*vec2_x + vec2_y*vec2_y)
         self.distance = distance
 
         # CROSS TRACK ERROR
-        vec1 = np.array([x_goal - x_init, y_goal - y_init])
-        vec2 = np.array([x_goal - x, y_goal - y])
-        vec1_hat = vec1 / np.linalg.norm(vec1)
-        cross_track_error = np.cross(vec2, vec1_hat)
+        # - Cross product of the vector to the goal with the unit start -> goal vector (start is the origin)
+        vec1_hat_x, vec1_hat_y = self.goal_hat
+        cross_track_error = vec2_x*vec1_hat_y - vec2_y*vec1_hat_x
 
         # COURSE ANGLE ERROR
-        x_dot = u * np.cos(psi) - v * np.sin(psi)
-        y_dot = u * np.sin(psi) + v * np.cos(psi)
-
-        Uvec = np.array([x_dot, y_dot])
-        Uvec_hat = Uvec / np.linalg.norm(Uvec)
-        vec2_hat = vec2 / np.linalg.norm(vec2)
-
-        course_angle = np.arctan2(Uvec[1], Uvec[0])
-        psi_vec2 = np.arctan2(vec2[1], vec2[0])
-
+        x_dot = u * math.cos(psi) - v * math.sin(psi)
+        y_dot = u * math.sin(psi) + v * math.cos(psi)
+        course_angle = math.atan2(y_dot, x_dot)
+        psi_vec2 = math.atan2(vec2_y, vec2_x)
         course_angle_err = course_angle - psi_vec2
-        course_angle_err = (course_angle_err + np.pi) % (2 * np.pi) - np.pi
+        course_angle_err = (course_angle_err + math.pi) % (2 * math.pi) - math.pi
 
         # REWARDS
-        R1 = 2 * np.exp(-0.08 * cross_track_error ** 2) - 1
-        R2 = 1.3 * np.exp(-10 * (abs(course_angle_err))) - 0.3
+        R1 = 2 * math.exp(-0.08 * cross_track_error ** 2) - 1
+        R2 = 1.3 * math.exp(-10 * (abs(course_angle_err))) - 0.3
         R3 = -distance * 0.25
         reward = R1 + R2 + R3
 
-        observation = np.array([cross_track_error, course_angle_err, distance, r], dtype=np.float32)
-        self.obs_history.append(observation.copy())
-        self.action_history.append(action_no)
-
-        terminated = False
-        info = {}
-
         # DESTINATION CHECK
         if abs(distance) <= 0.5:
-            reward = 100
-            self.episode_ended = True
-            terminated = True
-            return observation, reward, terminated, info
+            return cross_track_error, course_angle_err, distance, r, 100, True
 
-        # TERMINATION CHECK (skipped for brevity, include for full code)
-        angle_btw23 = np.arccos(np.clip(np.dot(vec2_hat, Uvec_hat), -1.0, 1.0))
-        angle_btw12 = np.arccos(np.clip(np.dot(vec1_hat, vec2_hat), -1.0, 1.0))
-        if angle_btw12 > np.pi / 2 and angle_btw23 > np.pi / 2:
-            self.episode_ended = True
-            terminated = True
-            return observation, reward, terminated, info
-
-        return observation, reward, terminated, info
+        # TERMINATION CHECK
+        # - Goal is behind the ship and the ship has passed it (both angles over 90 degrees)
+        terminated = False
+        speed = math.hypot(x_dot, y_dot)
+        if speed > 0:
+            cos_23 = (vec2_x*x_dot + vec2_y*y_dot)/(distance*speed)
+            cos_12 = (vec1_hat_x*vec2_x + vec1_hat_y*vec2_y)/distance
+            angle_btw23 = math.acos(min(max(cos_23, -1.0), 1.0))
+            angle_btw12 = math.acos(min(max(cos_12, -1.0), 1.0))
+            terminated = angle_btw12 > np.pi / 2 and angle_btw23 > np.pi / 2
+
+        return cross_track_error, course_angle_err, distance, r, reward, terminated
 
     def legal_move_generator(self, state=None):
         # Always 3 discrete actions
@@ -0,0 +1,219 @@
+# Sailing task as an explicit MDP
+# - Enumerates the states reachable from Engine.reset() and exports P and R per action as scipy.sparse matrices
+# - Vectorized value/policy iteration give a ground-truth baseline without running STANDARD_RL
+# - Run from the repository root: python -m environment.sailing_mdp
+import json
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import spsolve
+
+from environment.engine import Engine
+from environment.transition_table import TransitionTable
+
+
+class SailingMDP:
+    def __init__(self, local_setup_info:dict={}, y_resolution:float=0.5) -> None:
+        """MDP over (x, y, angle) with the Engine dynamics.
+        x and angle are kept exactly on the obs_precision and 0.1 rad grids. The hidden y
+        coordinate takes too many distinct values to enumerate exactly, so it is held on a
+        y_resolution grid and each step splits probability between the two neighbouring y
+        cells by linear interpolation (the expected y progress per step is exact).
+        All terminal outcomes lead to a single absorbing state with zero reward."""
+        self.local_setup_info = local_setup_info
+        self.obs_precision = local_setup_info['obs_precision']
+        self.y_limit = local_setup_info['y_limit']
+        self.supervised_rewards = local_setup_info['supervised_rewards']
+        self.x_limit = 10
+        self.y_resolution = y_resolution
+        self.table = TransitionTable.get(self.obs_precision, self.y_limit, self.supervised_rewards)
+        self.x_scale = 10**self.obs_precision
+        # Grid sizes, x in integer units of 10^-obs_precision
+        self.x_offset = self.x_limit*self.x_scale
+        self.num_x = 2*self.x_offset + 1
+        self.num_y = int(np.floor(self.y_limit/self.y_resolution)) + 1
+        self.num_angle = len(self.table.angle)
+        self.num_actions = len(self.table.actions)
+        # Filled by build()
+        self.states = None
+        self.start_idx = None
+        self.P = None
+        self.R = None
+
+    # --------------------------
+    # Flat grid index helpers
+    def grid_id(self, x_int, y_idx, angle_row):
+        return ((x_int + self.x_offset)*self.num_y + y_idx)*self.num_angle + angle_row
+
+    def grid_coords(self, grid_id):
+        rest, angle_row = np.divmod(grid_id, self.num_angle)
+        x_idx, y_idx = np.divmod(rest, self.num_y)
+        return x_idx - self.x_offset, y_idx, angle_row
+
+    def successors(self, grid_ids:np.ndarray, action:int):
+        """Vectorized transition of grid states for one action.
+        Returns:
+            lo, hi: grid ids of the two y cells the next state falls between
+            w_hi: probability of the hi cell
+            reward: immediate reward
+            terminal: True if the step ends the episode"""
+        x_int, y_idx, angle_row = self.grid_coords(grid_ids)
+        dx = np.rint(self.table.dx[angle_row, action]*self.x_scale).astype(np.int64)
+        next_x = x_int + dx
+        next_y = y_idx*self.y_resolution + self.table.dy[angle_row, action]
+        next_row = self.table.next_row[angle_row, action]
+        reward = self.table.reward[angle_row, action].copy()
+        # Termination priority matches Engine.step: walls, goal, angle limit
+        hit_wall = np.abs(next_x) > self.x_limit*self.x_scale
+        reached_goal = ~hit_wall & (np.abs(next_y) > self.y_limit)
+        angle_limit = ~hit_wall & ~reached_goal & self.table.angle_terminal[angle_row, action]
+        reward[hit_wall | angle_limit] = -1
+        reward[reached_goal] = 1
+        terminal = hit_wall | reached_goal | angle_limit
+        # Split between neighbouring y cells
+        y_cell = np.clip(next_y/self.y_resolution, 0, self.num_y-1)
+        y_lo = np.floor(y_cell).astype(np.int64)
+        w_hi = y_cell - y_lo
+        y_hi = np.minimum(y_lo+1, self.num_y-1)
+        safe_x = np.where(terminal, 0, next_x)
+        safe_row = np.where(terminal, 0, next_row)
+        lo = self.grid_id(safe_x, y_lo, safe_row)
+        hi = self.grid_id(safe_x, y_hi, safe_row)
+        return lo, hi, w_hi, reward, terminal
+
+    # --------------------------
+    def enumerate_states(self) -> np.ndarray:
+        """Breadth-first search of the grid states reachable from Engine.reset()."""
+        engine = Engine(self.local_setup_info)
+        engine.reset()
+        start_row = self.table.row(engine.angle)
+        start = np.array([self.grid_id(int(round(engine.x*self.x_scale)), 0, start_row)], dtype=np.int64)
+        visited = [start]
+        seen = np.zeros(self.num_x*self.num_y*self.num_angle, dtype=bool)
+        seen[start] = True
+        frontier = start
+        while len(frontier) > 0:
+            next_states = []
+            for action in range(self.num_actions):
+                lo, hi, w_hi, _, terminal = self.successors(frontier, action)
+                next_states.append(lo[~terminal])
+                next_states.append(hi[~terminal & (w_hi > 0)])
+            frontier = np.unique(np.concatenate(next_states))
+            frontier = frontier[~seen[frontier]]
+            seen[frontier] = True
+            visited.append(frontier)
+        return np.sort(np.concatenate(visited))
+
+    def build(self):
+        """Export P[a] and R[a] as sparse matrices over the reachable states.
+        Index len(states) is the absorbing terminal state."""
+        self.states = self.enumerate_states()
+        engine = Engine(self.local_setup_info)
+        engine.reset()
+        self.start_idx = self.state_index(engine.x, engine.y, engine.angle)
+        n = len(self.states)
+        terminal_idx = n
+        rows = np.arange(n)
+        self.P = []
+        self.R = []
+        for action in range(self.num_actions):
+            lo, hi, w_hi, reward, terminal = self.successors(self.states, action)
+            lo_idx = np.where(terminal, terminal_idx, np.searchsorted(self.states, lo))
+            hi_idx = np.where(terminal, terminal_idx, np.searchsorted(self.states, hi))
+            w_hi = np.where(terminal, 0, w_hi)
+            # Absorbing terminal row
+            P_rows = np.concatenate([rows, rows, [terminal_idx]])
+            P_cols = np.concatenate([lo_idx, hi_idx, [terminal_idx]])
+            P_vals = np.concatenate([1-w_hi, w_hi, [1.0]])
+            P_a = sparse.csr_matrix((P_vals, (P_rows, P_cols)), shape=(n+1, n+1))
+            P_a.eliminate_zeros()
+            self.P.append(P_a)
+            self.R.append(np.append(reward, 0.0))
+        return self
+
+    # --------------------------
+    # Solvers
+    def value_iteration(self, gamma:float=0.95, tol:float=1e-8, max_iter:int=10000):
+        """Returns the optimal value V and greedy policy over states (+ terminal)."""
+        V = np.zeros(self.P[0].shape[0])
+        for _ in range(max_iter):
+            Q = np.stack([R_a + gamma*(P_a @ V) for P_a, R_a in zip(self.P, self.R)], axis=1)
+            V_new = Q.max(axis=1)
+            if np.max(np.abs(V_new - V)) < tol:
+                V = V_new
+                break
+            V = V_new
+        return V, Q.argmax(axis=1)
+
+    def policy_iteration(self, gamma:float=0.95, max_iter:int=1000):
+        """Exact policy evaluation with a sparse linear solve per iteration."""
+        n = self.P[0].shape[0]
+        policy = np.zeros(n, dtype=np.int64)
+        identity = sparse.identity(n, format='csr')
+        for _ in range(max_iter):
+            P_pi = self.policy_matrix(policy)
+            R_pi = np.choose(policy, self.R)
+            V = spsolve((identity - gamma*P_pi).tocsc(), R_pi)
+            Q = np.stack([R_a + gamma*(P_a @ V) for P_a, R_a in zip(self.P, self.R)], axis=1)
+            new_policy = Q.argmax(axis=1)
+            # Keep the current action on ties to guarantee termination
+            new_policy = np.where(Q[np.arange(n), policy] >= Q[np.arange(n), new_policy]-1e-12, policy, new_policy)
+            if np.array_equal(new_policy, policy):
+                break
+            policy = new_policy
+        return V, policy
+
+    def policy_matrix(self, policy:np.ndarray):
+        """Transition matrix of a deterministic policy, selecting each row from P[policy[s]]."""
+        P_pi = sparse.csr_matrix(self.P[0].shape)
+        for action, P_a in enumerate(self.P):
+            P_pi = P_pi + sparse.diags((policy == action).astype(float)) @ P_a
+        return P_pi.tocsr()
+
+    # --------------------------
+    def state_index(self, x:float, y:float, angle:float) -> int:
+        """Index of the MDP state nearest to an engine position (y rounded to the y grid)."""
+        y_idx = int(np.clip(np.round(y/self.y_resolution), 0, self.num_y-1))
+        grid_id = self.grid_id(int(round(x*self.x_scale)), y_idx, self.table.row(angle))
+        idx = np.searchsorted(self.states, grid_id)
+        if (idx >= len(self.states)) or (self.states[idx] != grid_id):
+            return -1
+        return idx
+
+    def state_str(self, idx:int) -> str:
+        """The Engine "x_angle" observation of a state index."""
+        x_int, _, angle_row = self.grid_coords(self.states[idx])
+        return "{n:.{d}f}".format(n=x_int/self.x_scale, d=self.obs_precision)+'_'+self.table.angle_str[angle_row]
+
+    def rollout(self, policy:np.ndarray, action_cap:int=100):
+        """Play a solved policy in the real Engine to check it against training results.
+        Returns:
+            total_reward, action_history"""
+        engine = Engine(self.local_setup_info)
+        obs = engine.reset()
+        total_reward = 0
+        for _ in range(action_cap):
+            idx = self.state_index(engine.x, engine.y, engine.angle)
+            action = int(policy[idx]) if idx >= 0 else 0
+            obs, reward, terminated, _ = engine.step(obs, action)
+            total_reward += reward
+            if terminated:
+                break
+        return total_reward, engine.action_history
+
+
+def main():
+    import time
+    with open('./configs/config_local.json') as f:
+        local_setup_info = json.load(f)
+    start = time.perf_counter()
+    mdp = SailingMDP(local_setup_info).build()
+    print(f"Built MDP with {len(mdp.states):,} states in {time.perf_counter()-start:.1f}s")
+    start = time.perf_counter()
+    V, policy = mdp.value_iteration()
+    print(f"Value iteration solved in {time.perf_counter()-start:.1f}s, V(start) = {V[mdp.start_idx]:.4f}")
+    total_reward, actions = mdp.rollout(policy, local_setup_info.get('training_action_cap', 100))
+    print(f"Greedy rollout: reward {total_reward}, {len(actions)} actions")
+
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,118 @@
+# ODE integrator backends for the ship environment (environment/sailing-hard-env.py)
+# - solve_ivp: adaptive RK45 from scipy, the original behaviour
+# - rk4: classical fixed-step Runge-Kutta with a configurable number of substeps per environment step,
+#   all stages are written into preallocated buffers so only the ODE itself allocates
+# - Both work on any state shape, a (7,) ship state or an (N, 7) batch with a batched ODE
+# - load_ship_engine() loads the ship Engine, whose hyphenated module name cannot be imported
+import os
+import importlib.util
+import numpy as np
+from scipy.integrate import solve_ivp
+
+INTEGRATORS = ['solve_ivp', 'rk4']
+HARD_ENV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sailing-hard-env.py')
+
+
+class SolveIVPIntegrator:
+    def __init__(self, ode, dt:float, **options) -> None:
+        """Advances the state by dt with scipy's adaptive solve_ivp, ode(t, y, *args).
+        options are passed to solve_ivp (method, rtol, atol)."""
+        self.ode = ode
+        self.dt = dt
+        self.options = options
+
+    def fun(self, t, v, *args):
+        """ode on the flat vector solve_ivp integrates, reshaped for batched states."""
+        return np.ravel(self.ode(t, v.reshape(self.shape), *args))
+
+    def step(self, y:np.ndarray, *args) -> np.ndarray:
+        """Integrates y in place over (0, dt) and returns it."""
+        self.shape = y.shape
+        fun = self.ode if y.ndim == 1 else self.fun
+        sol = solve_ivp(fun, (0, self.dt), y.ravel(), t_eval=(self.dt,), args=args, **self.options)
+        y[...] = sol.y[:, -1].reshape(y.shape)
+        return y
+
+    def trajectory(self, y:np.ndarray, steps:int, *args, post_step=None) -> np.ndarray:
+        """States after each of steps consecutive dt steps with fixed args, from one solve_ivp call.
+        post_step(state) is applied in place to each returned state only, the solve itself is not interrupted.
+        Returns a (steps,)+y.shape array, y is left unchanged."""
+        self.shape = y.shape
+        fun = self.ode if y.ndim == 1 else self.fun
+        t_eval = self.dt*np.arange(1, steps+1)
+        sol = solve_ivp(fun, (0, t_eval[-1]), y.ravel(), t_eval=t_eval, args=args, **self.options)
+        states = sol.y.T.reshape((steps,) + y.shape)
+        if post_step is not None:
+            for state in states:
+                post_step(state)
+        return states
+
+
+class RK4Integrator:
+    def __init__(self, ode, dt:float, substeps:int=3, shape:tuple=(7,)) -> None:
+        """Advances the state by dt with substeps classical RK4 steps of dt/substeps.
+        ode(t, y, *args) must accept and return arrays of the given state shape."""
+        self.ode = ode
+        self.dt = dt
+        self.substeps = substeps
+        self.h = dt/substeps
+        self.k1 = np.zeros(shape)
+        self.k2 = np.zeros(shape)
+        self.k3 = np.zeros(shape)
+        self.k4 = np.zeros(shape)
+        self.stage = np.zeros(shape)
+
+    def step(self, y:np.ndarray, *args) -> np.ndarray:
+        """Integrates y in place over (0, dt) and returns it."""
+        h = self.h
+        t = 0.0
+        k1, k2, k3, k4, stage = self.k1, self.k2, self.k3, self.k4, self.stage
+        for _ in range(self.substeps):
+            k1[...] = self.ode(t, y, *args)
+            np.multiply(k1, h/2, out=stage)
+            stage += y
+            k2[...] = self.ode(t + h/2, stage, *args)
+            np.multiply(k2, h/2, out=stage)
+            stage += y
+            k3[...] = self.ode(t + h/2, stage, *args)
+            np.multiply(k3, h, out=stage)
+            stage += y
+            k4[...] = self.ode(t + h, stage, *args)
+            # y += h/6 * (k1 + 2*k2 + 2*k3 + k4)
+            k2 += k3
+            k2 *= 2
+            k2 += k1
+            k2 += k4
+            k2 *= h/6
+            y += k2
+            t += h
+        return y
+
+    def trajectory(self, y:np.ndarray, steps:int, *args, post_step=None) -> np.ndarray:
+        """States after each of steps consecutive dt steps with fixed args, identical to calling
+        step() followed by post_step(state) (in place, e.g. the heading wrap) steps times.
+        Returns a (steps,)+y.shape array, y is left unchanged."""
+        states = np.empty((steps,) + y.shape)
+        state = y.copy()
+        for i in range(steps):
+            self.step(state, *args)
+            if post_step is not None:
+                post_step(state)
+            states[i] = state
+        return states
+
+
+def make_integrator(name:str, ode, dt:float, substeps:int=3, shape:tuple=(7,)):
+    if name == 'solve_ivp':
+        return SolveIVPIntegrator(ode, dt)
+    if name == 'rk4':
+        return RK4Integrator(ode, dt, substeps, shape)
+    raise ValueError(f"integrator must be one of {INTEGRATORS}, got {name}")
+
+
+def load_ship_engine():
+    """Engine class of environment/sailing-hard-env.py (not importable by name)."""
+    spec = importlib.util.spec_from_file_location('sailing_hard_env', HARD_ENV_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.Engine
@@ -0,0 +1,188 @@
+# Vectorized Ship Sailing
+# - Batched version of environment/sailing-hard-env.py that moves N ships per call
+# - The (N, 7) state [u, v, r, x, y, psi, delta] of every ship is integrated in one ODE step,
+#   observations, rewards and termination follow Engine.step with array operations
+import numpy as np
+import kcs
+
+from environment.ship_integrators import make_integrator
+
+
+class BatchedShipODE:
+    def __init__(self, ode_kwargs:dict, vectorized:any='auto') -> None:
+        """kcs.KCS_ode over an (N, 7) state with one rudder command per ship.
+        KCS_ode is written for one (7,) state. If it also evaluates element-wise on a (7, N)
+        state it is called once per step, otherwise once per ship. With vectorized='auto'
+        this is decided by comparing both on a probe batch."""
+        self.ode_kwargs = ode_kwargs
+        if vectorized == 'auto':
+            vectorized = self.probe()
+        self.vectorized = vectorized
+
+    def single(self, t, y, delta_c):
+        return kcs.KCS_ode(t, y, delta_c, **self.ode_kwargs)
+
+    def probe(self) -> bool:
+        states = np.array([[1, 0, 0, 0, 0, 0, 0], [0.9, 0.05, 0.01, 2, -1, 1, 0.2]], dtype=np.float64)
+        delta_c = np.array([35*np.pi/180, -35*np.pi/180])
+        try:
+            batched = np.asarray(self.single(0.0, states.T, delta_c), dtype=np.float64).T
+        except (ValueError, TypeError, IndexError):
+            return False
+        looped = np.array([self.single(0.0, states[i], delta_c[i]) for i in range(len(states))], dtype=np.float64)
+        return batched.shape == looped.shape and np.allclose(batched, looped, rtol=1e-12, atol=1e-12)
+
+    def __call__(self, t, y, delta_c):
+        if self.vectorized:
+            return np.asarray(self.single(t, y.T, delta_c)).T
+        return np.array([self.single(t, y[i], delta_c[i]) for i in range(len(y))])
+
+
+class VectorShipEngine:
+    def __init__(self, local_setup_info:dict={}, num_ships:int=1) -> None:
+        """Batched ship environment holding the state, goal and waypoints of N ships in arrays.
+        Expects the same local_setup_info as the ship Engine (wind/wave flags, train_test_flag,
+        test waypoints, integrator), plus:
+        - test_x_waypoints/test_y_waypoints/initial_obs_state: shared or one row per ship
+        - seed: seed of the random training goals
+        - ship_ode_vectorized: True/False/'auto', whether kcs.KCS_ode is called once for all ships
+        - integrator: 'rk4' (default) or 'solve_ivp', the latter only for a single ship as one adaptive
+          solve over the flattened batch couples the step size of every ship
+        Ships that reach their goal or pass it are automatically reset with a new goal."""
+        self.num_ships = num_ships
+        self.output_size = 3
+        self.dt = 0.3
+        self.train_test_flag = local_setup_info.get("train_test_flag", 0)
+        self.rng = np.random.default_rng(local_setup_info.get("seed", None))
+        # Action index -> rudder command, matches ACTION_SET of the ship Engine
+        self.action_angles = np.array([-35*np.pi/180, 0, 35*np.pi/180])
+
+        if self.train_test_flag != 0:
+            x_waypoints = np.atleast_2d(np.asarray(local_setup_info["test_x_waypoints"], dtype=np.float64))
+            y_waypoints = np.atleast_2d(np.asarray(local_setup_info["test_y_waypoints"], dtype=np.float64))
+            initial_obs_state = np.atleast_2d(np.asarray(local_setup_info["initial_obs_state"], dtype=np.float64))
+            self.test_x_waypoints = np.broadcast_to(x_waypoints, (num_ships, x_waypoints.shape[1]))
+            self.test_y_waypoints = np.broadcast_to(y_waypoints, (num_ships, y_waypoints.shape[1]))
+            self.initial_obs_state = np.broadcast_to(initial_obs_state, (num_ships, 7))
+
+        ode_kwargs = {key: local_setup_info.get(key, 0) for key in
+                      ['wind_flag', 'wind_speed', 'wind_dir', 'wave_flag', 'wave_height', 'wave_period', 'wave_dir']}
+        self.ode = BatchedShipODE(ode_kwargs, local_setup_info.get("ship_ode_vectorized", 'auto'))
+        integrator = local_setup_info.get("integrator", "rk4")
+        if integrator == 'solve_ivp' and num_ships > 1:
+            raise ValueError("solve_ivp integrates the whole (N, 7) batch as one system and does not match "
+                             "the single ship Engine for N > 1, use integrator='rk4'")
+        self.integrator = make_integrator(integrator, self.ode, self.dt,
+                                          substeps=local_setup_info.get("integrator_substeps", 3),
+                                          shape=(num_ships, 7))
+
+        self.state = np.zeros((num_ships, 7))
+        self.x_goal = np.zeros(num_ships)
+        self.y_goal = np.zeros(num_ships)
+        self.goal_hat = np.zeros((num_ships, 2))
+        self.episode_steps = np.zeros(num_ships, dtype=np.int64)
+
+    def reset(self) -> np.ndarray:
+        """Reset every ship with a new goal.
+        Returns:
+            obs: (N,4) array of [cross_track_error, course_angle_err, distance, r] per ship."""
+        return self.reset_ships(np.ones(self.num_ships, dtype=bool))
+
+    def reset_ships(self, mask:np.ndarray) -> np.ndarray:
+        """Reset the ships selected by the bool mask, returns the (N,4) observation of every ship
+        (only the rows of reset ships are meaningful)."""
+        n = int(mask.sum())
+        obs = np.zeros((self.num_ships, 4), dtype=np.float32)
+        if self.train_test_flag == 0:
+            self.state[mask] = [1, 0, 0, 0, 0, 0, 0]
+            radius = self.rng.integers(8, 28, size=n)
+            random_theta = 2 * np.pi * self.rng.random(n)
+            self.x_goal[mask] = radius * np.cos(random_theta)
+            self.y_goal[mask] = radius * np.sin(random_theta)
+            start_x = np.zeros(n)
+            start_y = np.zeros(n)
+        else:
+            self.state[mask] = self.initial_obs_state[mask]
+            self.x_goal[mask] = self.test_x_waypoints[mask, 1]
+            self.y_goal[mask] = self.test_y_waypoints[mask, 1]
+            start_x = self.test_x_waypoints[mask, 0]
+            start_y = self.test_y_waypoints[mask, 0]
+        x_goal, y_goal = self.x_goal[mask], self.y_goal[mask]
+        goal_norm = np.hypot(x_goal, y_goal)
+        # Goals at the start have no start -> goal line, as in the ship Engine cross track error
+        # is then measured against the initial heading
+        safe_norm = np.where(goal_norm > 0, goal_norm, 1.0)
+        self.goal_hat[mask] = np.where((goal_norm > 0)[:, None],
+                                       np.stack([x_goal/safe_norm, y_goal/safe_norm], axis=1), [1.0, 0.0])
+        self.episode_steps[mask] = 0
+
+        u, v, psi = self.state[mask, 0], self.state[mask, 1], self.state[mask, 5]
+        x_dot = u * np.cos(psi) - v * np.sin(psi)
+        y_dot = u * np.sin(psi) + v * np.cos(psi)
+        course_angle_err = np.arctan2(y_dot, x_dot) - np.arctan2(y_goal, x_goal)
+        course_angle_err = (course_angle_err + np.pi) % (2 * np.pi) - np.pi
+        obs[mask, 1] = course_angle_err
+        obs[mask, 2] = np.hypot(x_goal - start_x, y_goal - start_y)
+        return obs
+
+    def step(self, actions:np.ndarray):
+        """Enact one rudder action per ship.
+        Returns:
+            obs: (N,4) observations, reset ships already show their new episode's first observation
+            reward: (N,) rewards
+            terminated: (N,) bool flags
+            info: dict with the pre-reset 'final_obs' (N,4), 'final_state' (N,7) and 'episode_steps' (N,)
+                  of every ship"""
+        delta_c = self.action_angles[np.asarray(actions, dtype=np.int64)]
+        self.integrator.step(self.state, delta_c)
+        self.state[:, 5] %= 2 * np.pi
+        self.episode_steps += 1
+        u, v, r, x, y, psi = self.state[:, 0], self.state[:, 1], self.state[:, 2], self.state[:, 3], self.state[:, 4], self.state[:, 5]
+
+        # DISTANCE TO GOAL
+        vec2_x = self.x_goal - x
+        vec2_y = self.y_goal - y
+        distance = np.hypot(vec2_x, vec2_y)
+        # CROSS TRACK ERROR
+        vec1_hat_x, vec1_hat_y = self.goal_hat[:, 0], self.goal_hat[:, 1]
+        cross_track_error = vec2_x*vec1_hat_y - vec2_y*vec1_hat_x
+        # COURSE ANGLE ERROR
+        x_dot = u * np.cos(psi) - v * np.sin(psi)
+        y_dot = u * np.sin(psi) + v * np.cos(psi)
+        course_angle_err = np.arctan2(y_dot, x_dot) - np.arctan2(vec2_y, vec2_x)
+        course_angle_err = (course_angle_err + np.pi) % (2 * np.pi) - np.pi
+
+        # REWARDS
+        R1 = 2 * np.exp(-0.08 * cross_track_error ** 2) - 1
+        R2 = 1.3 * np.exp(-10 * np.abs(course_angle_err)) - 0.3
+        R3 = -distance * 0.25
+        reward = R1 + R2 + R3
+
+        # DESTINATION CHECK
+        reached_goal = distance <= 0.5
+        reward = np.where(reached_goal, 100.0, reward)
+        # TERMINATION CHECK, the goal is behind the ship and the ship has passed it
+        speed = np.hypot(x_dot, y_dot)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cos_23 = (vec2_x*x_dot + vec2_y*y_dot)/(distance*speed)
+            cos_12 = (vec1_hat_x*vec2_x + vec1_hat_y*vec2_y)/distance
+        passed_goal = (~reached_goal & (speed > 0)
+                       & (np.arccos(np.clip(cos_12, -1.0, 1.0)) > np.pi / 2)
+                       & (np.arccos(np.clip(cos_23, -1.0, 1.0)) > np.pi / 2))
+        terminated = reached_goal | passed_goal
+
+        obs = np.stack([cross_track_error, course_angle_err, distance, r], axis=1).astype(np.float32)
+        info = {'final_obs': obs.copy(), 'final_state': self.state.copy(),
+                'episode_steps': self.episode_steps.copy()}
+        # Auto-reset finished ships
+        if terminated.any():
+            obs[terminated] = self.reset_ships(terminated)[terminated]
+        return obs, reward, terminated, info
+
+    def legal_move_generator(self, obs:any=None):
+        """Always 3 discrete rudder actions, same for every ship"""
+        return [0, 1, 2]
+
+    def close(self):
+        """Close/Exit the environment."""
+        pass
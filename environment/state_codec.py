@@ -0,0 +1,66 @@
+# Integer state ids for the sailing Engine
+# - Lossless replacement for the "x_angle" observation strings
+# - x is stored on the obs_precision grid and angle on the 0.1 rad grid
+import math
+
+class StateCodec:
+    # Grid half-widths: x can overshoot the +-10 walls by one step, angle covers +-pi
+    x_limit = 11
+    angle_steps = 32
+
+    def __init__(self, obs_precision:int) -> None:
+        """Maps observations to a compact integer id and back.
+        id = x_index*num_angle + angle_index where each index has one extra slot for a
+        negative zero so strings like "-0.00_0.1" survive the round trip unchanged."""
+        self.obs_precision = obs_precision
+        self.x_scale = 10**obs_precision
+        self.x_offset = self.x_limit*self.x_scale
+        self.angle_offset = self.angle_steps
+        # +1 for zero, +1 for the negative zero slot
+        self.num_x = 2*self.x_offset + 2
+        self.num_angle = 2*self.angle_offset + 2
+        self.num_states = self.num_x*self.num_angle
+        self.x_neg_zero = self.num_x - 1
+        self.angle_neg_zero = self.num_angle - 1
+
+    # --------------------------
+    # Numeric values <-> id
+    def encode(self, x:float, angle:float) -> int:
+        """State id of an (x, angle) pair as formatted by Engine."""
+        x_int = round(x*self.x_scale)
+        if (x_int == 0) and (math.copysign(1, x) < 0):
+            x_idx = self.x_neg_zero
+        else:
+            x_idx = x_int + self.x_offset
+        angle_int = round(angle*10)
+        if (angle_int == 0) and (math.copysign(1, angle) < 0):
+            angle_idx = self.angle_neg_zero
+        else:
+            angle_idx = angle_int + self.angle_offset
+        if (x_idx < 0) or (x_idx >= self.num_x) or (angle_idx < 0) or (angle_idx >= self.num_angle):
+            raise ValueError(f"State x={x}, angle={angle} is outside the StateCodec grid")
+        return x_idx*self.num_angle + angle_idx
+
+    def decode(self, state_id:int) -> tuple:
+        """(x, angle) floats of a state id, equal to float() of the string fields."""
+        x_idx, angle_idx = divmod(int(state_id), self.num_angle)
+        if x_idx == self.x_neg_zero:
+            x = -0.0
+        else:
+            x = (x_idx - self.x_offset)/self.x_scale
+        if angle_idx == self.angle_neg_zero:
+            angle = -0.0
+        else:
+            angle = (angle_idx - self.angle_offset)/10
+        return x, angle
+
+    # --------------------------
+    # "x_angle" string <-> id
+    def from_str(self, state:str) -> int:
+        x = float(state.split('_')[0])
+        angle = float(state.split('_')[1])
+        return self.encode(x, angle)
+
+    def to_str(self, state_id:int) -> str:
+        x, angle = self.decode(state_id)
+        return "{n:.{d}f}".format(n=x, d=self.obs_precision)+'_'+"{:0.1f}".format(angle)
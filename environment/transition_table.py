@@ -0,0 +1,117 @@
+# Precomputed transition/reward lookup table for the sailing Engine
+# - The angle always moves on a 0.1 rad grid so every per-step term of Engine.step
+#   (vel, rew, sin, cos and the rounding) only depends on (angle, action)
+# - Built once per (obs_precision, y_limit, supervised_rewards) and cached to disk
+import os
+import numpy as np
+
+from environment.engine import Engine
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'prerender', 'transition_tables')
+
+
+class TransitionTable:
+    # Angle rows cover -1.7 to 1.7, every |angle|>pi/2 (i.e. >=1.6) is already terminal
+    angle_steps = 17
+    actions = [-0.1, 0.1]
+
+    def __init__(self, obs_precision:int, y_limit:float, supervised_rewards:str) -> None:
+        """Lookup table of the per-angle terms of Engine.step.
+        Row k is the angle round((k-angle_steps)/10, 1), column is the action index.
+        - dx, dy: rounded displacement added to x and y
+        - next_angle, next_row: angle after the action and its row (-1 if off the table)
+        - reward: step reward before any termination override
+        - angle_terminal: True if the next angle exceeds the angle limit"""
+        self.obs_precision = obs_precision
+        self.y_limit = y_limit
+        self.supervised_rewards = supervised_rewards
+        self.angle = None
+        self.angle_str = None
+        self.dx = None
+        self.dy = None
+        self.next_angle = None
+        self.next_row = None
+        self.reward = None
+        self.angle_terminal = None
+
+    @property
+    def key(self) -> str:
+        return f"p{self.obs_precision}_y{self.y_limit}_s{self.supervised_rewards}"
+
+    def build(self):
+        """Evaluate the Engine.step terms once per (angle, action) with the same scalar functions."""
+        num_rows = 2*self.angle_steps+1
+        num_actions = len(self.actions)
+        self.angle = np.array([np.round((k-self.angle_steps)/10, 1) for k in range(num_rows)])
+        self.dx = np.zeros((num_rows, num_actions))
+        self.dy = np.zeros((num_rows, num_actions))
+        self.next_angle = np.zeros((num_rows, num_actions))
+        self.next_row = np.zeros((num_rows, num_actions), dtype=np.int64)
+        self.reward = np.zeros((num_rows, num_actions))
+        self.angle_terminal = np.zeros((num_rows, num_actions), dtype=bool)
+        for k in range(num_rows):
+            angle = self.angle[k]
+            for action, a in enumerate(self.actions):
+                self.dx[k, action] = np.round((Engine.vel(angle + a) * np.sin(angle + a)), self.obs_precision)
+                self.dy[k, action] = np.round((Engine.vel(angle + a) * np.cos(angle + a)), 4)
+                next_angle = np.round(angle+a, 1)
+                self.next_angle[k, action] = next_angle
+                self.next_row[k, action] = self.row(next_angle)
+                if self.supervised_rewards=="True":
+                    self.reward[k, action] = Engine.rew(next_angle)/10
+                self.angle_terminal[k, action] = np.abs(next_angle)>np.pi/2
+        self.angle_str = ["{:0.1f}".format(angle) for angle in self.angle]
+        return self
+
+    def row(self, angle:float) -> int:
+        """Row index of an angle on the 0.1 rad grid, -1 if it is not covered by the table."""
+        k = int(np.round(angle*10)) + self.angle_steps
+        if (k<0) or (k>2*self.angle_steps):
+            return -1
+        return k
+
+    # --------------------------
+    # Disk cache
+    def path(self, cache_dir:str=DEFAULT_CACHE_DIR) -> str:
+        return os.path.join(cache_dir, 'transition_table_'+self.key+'.npz')
+
+    def save(self, cache_dir:str=DEFAULT_CACHE_DIR) -> str:
+        os.makedirs(cache_dir, exist_ok=True)
+        path = self.path(cache_dir)
+        # Write to a temporary file first so parallel runs never read a partial table
+        tmp_path = path + '.' + str(os.getpid()) + '.tmp.npz'
+        np.savez(tmp_path, key=self.key, angle=self.angle, dx=self.dx, dy=self.dy,
+                 next_angle=self.next_angle, next_row=self.next_row,
+                 reward=self.reward, angle_terminal=self.angle_terminal)
+        os.replace(tmp_path, path)
+        return path
+
+    def load(self, cache_dir:str=DEFAULT_CACHE_DIR):
+        with np.load(self.path(cache_dir)) as data:
+            if str(data['key']) != self.key:
+                raise ValueError(f"Transition table key mismatch: {data['key']} != {self.key}")
+            self.angle = data['angle']
+            self.dx = data['dx']
+            self.dy = data['dy']
+            self.next_angle = data['next_angle']
+            self.next_row = data['next_row']
+            self.reward = data['reward']
+            self.angle_terminal = data['angle_terminal']
+        self.angle_str = ["{:0.1f}".format(angle) for angle in self.angle]
+        return self
+
+    @staticmethod
+    def get(obs_precision:int, y_limit:float, supervised_rewards:str, cache_dir:str=DEFAULT_CACHE_DIR):
+        """Load the table for this config from disk, building and caching it on first use."""
+        table = TransitionTable(obs_precision, y_limit, supervised_rewards)
+        if os.path.exists(table.path(cache_dir)):
+            try:
+                return table.load(cache_dir)
+            except (OSError, ValueError, KeyError):
+                pass # Corrupt or stale cache, rebuild below
+        table.build()
+        try:
+            table.save(cache_dir)
+        except OSError:
+            pass # Read-only location, keep the in-memory table
+        return table
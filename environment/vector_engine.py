@@ -0,0 +1,97 @@
+# Vectorized Sailing Simulator
+# - Batched version of environment/engine.py that moves N boats per call
+# - Dynamics, rounding and termination rules are identical to Engine.step
+import numpy as np
+
+from environment.engine import Engine
+
+class VectorEngine:
+    def __init__(self, local_setup_info:dict={}, num_boats:int=1) -> None:
+        """Batched sailing environment holding x, y and angle for N boats in arrays.
+        Expects the same local_setup_info as Engine:
+        - y_limit: vertical distance to reach the goal
+        - supervised_rewards: "True" to give the scaled rew() signal per step
+        - obs_precision: decimal places x is rounded to
+        Boats that terminate are automatically reset to their start position."""
+        self.x_limit = 10
+        self.y_limit = local_setup_info['y_limit']
+        self.angle_limit = np.pi / 2
+        self.supervised_rewards = local_setup_info['supervised_rewards']
+        self.obs_precision = local_setup_info['obs_precision']
+        self.output_size = 2
+        self.num_boats = num_boats
+        # Action index -> angle change, matches [-0.1, 0.1][action] in Engine.step
+        self.action_angles = np.array([-0.1, 0.1])
+        # Start position per boat, set by reset()
+        self.start_x = np.zeros(num_boats)
+        self.start_angle = np.zeros(num_boats)
+        self.x = np.zeros(num_boats)
+        self.y = np.zeros(num_boats)
+        self.angle = np.zeros(num_boats)
+
+    def reset(self, start_obs:str|list=None) -> np.ndarray:
+        """Reset every boat, optionally to a fixed "x_angle" start (one for all or one per boat).
+        Returns:
+            obs: (N,2) array of [x, angle] per boat."""
+        if start_obs:
+            if isinstance(start_obs, str):
+                start_obs = [start_obs]*self.num_boats
+            self.start_x = np.round(np.array([float(obs.split('_')[0]) for obs in start_obs]), self.obs_precision)
+            self.start_angle = np.round(np.array([float(obs.split('_')[1]) for obs in start_obs]), 1)
+        else:
+            self.start_x = np.zeros(self.num_boats)
+            self.start_angle = np.zeros(self.num_boats)
+        self.x = self.start_x.copy()
+        self.y = np.zeros(self.num_boats)
+        self.angle = self.start_angle.copy()
+        return np.stack([self.x, self.angle], axis=1)
+
+    def step(self, actions:np.ndarray):
+        """Enact one action per boat.
+        Returns:
+            obs: (N,2) array of [x, angle], reset boats already show their start position
+            reward: (N,) rewards
+            terminated: (N,) bool flags
+            info: dict with the pre-reset 'final_obs' (N,2) and 'final_y' (N,) of every boat"""
+        a = self.action_angles[np.asarray(actions, dtype=np.int64)]
+        new_angle = self.angle + a
+        velocity = Engine.vel(new_angle)
+        # Same rounding as Engine.step: x to obs_precision dp, y to 4dp, angle to 1dp
+        self.x = self.x + np.round(velocity*np.sin(new_angle), self.obs_precision)
+        self.y = self.y + np.round(velocity*np.cos(new_angle), 4)
+        self.angle = np.round(new_angle, 1)
+
+        if self.supervised_rewards=="True":
+            reward = Engine.rew(self.angle)/10
+        else:
+            reward = np.zeros(self.num_boats)
+
+        # Termination signal, priority order matches the if/elif chain in Engine.step
+        hit_wall = np.abs(self.x)>self.x_limit
+        reached_goal = ~hit_wall & (np.abs(self.y)>self.y_limit)
+        angle_limit = ~hit_wall & ~reached_goal & (np.abs(self.angle)>self.angle_limit)
+        reward = np.where(hit_wall | angle_limit, -1.0, reward)
+        reward = np.where(reached_goal, 1.0, reward)
+        terminated = hit_wall | reached_goal | angle_limit
+
+        info = {'final_obs': np.stack([self.x, self.angle], axis=1),
+                'final_y': self.y.copy()}
+        # Auto-reset finished boats
+        if terminated.any():
+            self.x[terminated] = self.start_x[terminated]
+            self.y[terminated] = 0
+            self.angle[terminated] = self.start_angle[terminated]
+        obs = np.stack([self.x, self.angle], axis=1)
+        return obs, reward, terminated, info
+
+    def obs_to_str(self, obs:np.ndarray) -> list:
+        """Format (N,2) [x, angle] observations as the "x_angle" strings output by Engine."""
+        return ["{n:.{d}f}".format(n=x, d=self.obs_precision)+'_'+"{:0.1f}".format(angle) for x, angle in obs]
+
+    def legal_move_generator(self, obs:any=None):
+        """Action space: [0,1] for turn slightly left or right, same for every boat"""
+        return [0, 1]
+
+    def close(self):
+        """Close/Exit the environment."""
+        pass
@@ -0,0 +1,172 @@
+# Compact binary instruction results store
+# - Replaces the pretty-printed JSON instruction files (e.g. Osborne2025_instruction_results_Sailing_LLM-llama-v1.json)
+#   where every feedback_layer is a list of 384 floats
+# - Directory layout:
+#   - meta.json: format version, storage dtype, feedback layer shape and the instruction results tree with every
+#     feedback_layer replaced by its row in feedback_layers.npy (descriptions, counts, action caps, sub-goals, ...)
+#   - feedback_layers.npy: contiguous (N, *layer_shape) float32/float16 array, opened with numpy.memmap
+# - Any nesting is kept as is, so both the instructions/ files ({plan: {instruction: ...}}) and the
+#   elsciRL_SEARCH results ({instruction: {agent_adapter: ...}}) round trip
+# - Run from the repository root:
+#   python -m instructions.store import instructions/Osborne2025_instruction_results_Sailing_LLM-llama-v1.json instructions/sailing_llm_store
+import os
+import json
+import argparse
+import numpy as np
+
+FORMAT_VERSION = 1
+STORAGE_DTYPES = ['float32', 'float16']
+FEEDBACK_FORMATS = ['array', 'list', 'tensor']
+
+
+class InstructionStore:
+    def __init__(self, path:str) -> None:
+        """Read-only view of an instruction store. Only the small meta.json is read here, the feedback
+        layers are memory-mapped on first access and rows are read when used."""
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as f:
+            self.meta = json.load(f)
+        if self.meta['format_version'] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported instruction store version {self.meta['format_version']}")
+        self.dtype = self.meta['dtype']
+        self.layer_shape = tuple(self.meta['layer_shape'])
+        self.tree = self.meta['tree']
+        self._feedback_layers = None
+
+    def __len__(self) -> int:
+        """Number of feedback layers."""
+        return self.meta['num_layers']
+
+    def __contains__(self, key:str) -> bool:
+        return key in self.tree
+
+    def __getitem__(self, key:str) -> dict:
+        """Results under one top level key (e.g. one plan), exactly as in the JSON file (feedback layers
+        as nested lists), so any consumer of the JSON form accepts it. A new dict on every call,
+        elsciRL_OPTIMIZE edits its instruction_path in place. to_dict(key) gives the memmap rows instead."""
+        return self.to_dict(key, feedback='list')
+
+    def keys(self) -> list:
+        return list(self.tree.keys())
+
+    # --------------------------
+    # Lazily memory-mapped feedback layers
+    @property
+    def feedback_layers(self) -> np.memmap:
+        """Raw stored (N, *layer_shape) array."""
+        if self._feedback_layers is None:
+            self._feedback_layers = np.load(os.path.join(self.path, 'feedback_layers.npy'), mmap_mode='r')
+        return self._feedback_layers
+
+    def feedback_layer(self, row:int, feedback:str='array'):
+        """Feedback layer of a row, as a float32 array (a memmap view for float32 storage), nested list or torch tensor."""
+        layer = self.feedback_layers[row]
+        if feedback == 'array':
+            return layer if self.dtype == 'float32' else layer.astype(np.float32)
+        if feedback == 'list':
+            return np.asarray(layer, dtype=np.float32).tolist()
+        if feedback == 'tensor':
+            import torch
+            return torch.tensor(np.asarray(layer, dtype=np.float32))
+        raise ValueError(f"feedback must be one of {FEEDBACK_FORMATS}, got {feedback}")
+
+    def to_dict(self, key:str=None, feedback:str='array') -> dict:
+        """Results tree (or the subtree under key) with the feedback layers filled back in.
+        feedback='list' gives exactly the JSON file's content, 'tensor' the form elsciRL_SEARCH updates."""
+        tree = self.tree if key is None else self.tree[key]
+        return self._fill(tree, feedback)
+
+    def _fill(self, tree:dict, feedback:str) -> dict:
+        results = {}
+        for key, value in tree.items():
+            if isinstance(value, dict):
+                results[key] = self._fill(value, feedback)
+            elif key == 'feedback_layer':
+                results[key] = self.feedback_layer(value, feedback)
+            else:
+                results[key] = value
+        return results
+
+    # --------------------------
+    # Writing
+    @staticmethod
+    def write(path:str, results:dict, dtype:str='float32'):
+        """Write a complete store from an instruction results dict, feedback layers may be
+        nested lists, NumPy arrays or torch tensors."""
+        if dtype not in STORAGE_DTYPES:
+            raise ValueError(f"dtype must be one of {STORAGE_DTYPES}, got {dtype}")
+        layers = []
+        tree = InstructionStore._split(results, layers)
+        layer_shape = layers[0].shape if layers else (0,)
+        for layer in layers:
+            if layer.shape != layer_shape:
+                raise ValueError(f"All feedback layers must have the same shape, got {layer.shape} and {layer_shape}")
+        os.makedirs(path, exist_ok=True)
+        # Remove the old meta.json first so a partially rewritten store is never opened
+        if os.path.exists(os.path.join(path, 'meta.json')):
+            os.remove(os.path.join(path, 'meta.json'))
+        feedback_layers = np.lib.format.open_memmap(os.path.join(path, 'feedback_layers.npy'), mode='w+',
+                                                    dtype=np.dtype(dtype), shape=(len(layers),)+tuple(layer_shape))
+        for row, layer in enumerate(layers):
+            feedback_layers[row] = layer
+        feedback_layers.flush()
+        del feedback_layers
+        # meta.json last so a partially written store is never opened
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'format_version': FORMAT_VERSION, 'dtype': dtype, 'layer_shape': list(layer_shape),
+                       'num_layers': len(layers), 'tree': tree}, f)
+        return InstructionStore(path)
+
+    @staticmethod
+    def _split(results:dict, layers:list) -> dict:
+        """Copy of results with each feedback_layer replaced by its row, the layers are appended to layers."""
+        tree = {}
+        for key, value in results.items():
+            if isinstance(value, dict):
+                tree[key] = InstructionStore._split(value, layers)
+            elif key == 'feedback_layer':
+                if hasattr(value, 'detach'):
+                    value = value.detach().cpu().numpy()
+                tree[key] = len(layers)
+                layers.append(np.asarray(value, dtype=np.float32))
+            else:
+                tree[key] = value
+        return tree
+
+    # --------------------------
+    # JSON conversion
+    @staticmethod
+    def import_json(json_path:str, path:str, dtype:str='float32'):
+        """Convert a JSON instruction results file."""
+        with open(json_path) as f:
+            results = json.load(f)
+        return InstructionStore.write(path, results, dtype=dtype)
+
+    def export_json(self, json_path:str) -> None:
+        """Write the store back out as a JSON file in the layout of instructions/."""
+        with open(json_path, 'w') as f:
+            json.dump(self.to_dict(feedback='list'), f, indent=4)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Binary instruction results store tools")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    import_parser = subparsers.add_parser('import', help="Convert a JSON instruction results file to a store")
+    import_parser.add_argument('json_path')
+    import_parser.add_argument('store_path')
+    import_parser.add_argument('--dtype', default='float32', choices=STORAGE_DTYPES)
+    export_parser = subparsers.add_parser('export', help="Convert a store back to a JSON instruction results file")
+    export_parser.add_argument('store_path')
+    export_parser.add_argument('json_path')
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        store = InstructionStore.import_json(args.json_path, args.store_path, dtype=args.dtype)
+        print(f"Wrote {len(store.keys())} entries and {len(store)} feedback layers ({store.dtype}) to {args.store_path}")
+    else:
+        InstructionStore(args.store_path).export_json(args.json_path)
+        print(f"Wrote {args.json_path}")
+
+
+if __name__=='__main__':
+    main()
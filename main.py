@@ -1,3 +1,4 @@
+import os
 from datetime import datetime
 import pandas as pd
 # ====== elsciRL IMPORTS =========================================
@@ -14,11 +15,15 @@ from elsciRL.config_local import ConfigSetup
 # ------ Local Environment --------------------------------------
 from environment.engine import Engine
 # ------ ADAPTERS -----------------------------------------------
-from adapters.default import DefaultAdapter
-from adapters.language import LanguageAdapter
+from adapters.default import Adapter as DefaultAdapter
+from adapters.language import Adapter as LanguageAdapter
 ADAPTERS = {"Default": DefaultAdapter, "Language": LanguageAdapter}
 # ------ Visual Analysis -----------------------------------------------
 from elsciRL.analysis.combined_variance_visual import combined_variance_analysis_graph as COMBINED_VARIANCE_ANALYSIS_GRAPH
+# ------ Parallel training repeats ------------------------------------
+from parallel_experiment import ParallelExperiment
+# ------ Resumable instruction search ---------------------------------
+from search_checkpoint import resumable_search, config_hash
 
 
 def main():
@@ -36,6 +41,17 @@ def main():
     num_plans = 50
     num_explor_epi = 100000
     sim_threshold = 0.9
+    feedback_increment = 0.1
+    feedback_repeats = 1
+    action_cap = 100
+    # Search progress is saved here (exploration every checkpoint_episodes episodes and every plan), a rerun
+    # with the same configs resumes from it. Fixed path, save_dir changes every run
+    checkpoint_dir = './output/search_checkpoint'
+    checkpoint_episodes = 5000
+
+    # Training units (agent, adapter, repeat) run across a process pool, seeded from seed
+    num_workers = os.cpu_count()
+    seed = 0
 
     observed_states = None
     instruction_results = None
@@ -44,20 +60,26 @@ def main():
                         Engine=Engine, Adapters=ADAPTERS,
                         save_dir = save_dir+'/Reinforced_Instr_Experiment',
                         num_plans = num_plans, number_exploration_episodes=num_explor_epi, sim_threshold=sim_threshold,
-                        feedback_increment = 0.1, feedback_repeats=1,
+                        feedback_increment = feedback_increment, feedback_repeats=feedback_repeats,
                         observed_states=observed_states, instruction_results=instruction_results)
 
     # Don't provide any instruction information, will be defined by command line input
-    results = search_agent.search(action_cap=100, re_search_override=False, simulated_instr_goal=None)
+    # - Plan count and exploration episodes are left out of the hash so either can be extended on resume
+    search_hash = config_hash(ExperimentConfig, ProblemConfig, list(ADAPTERS.keys()),
+                              {'sim_threshold': sim_threshold, 'feedback_increment': feedback_increment,
+                               'feedback_repeats': feedback_repeats, 'action_cap': action_cap})
+    results = resumable_search(search_agent, checkpoint_dir, search_hash, action_cap=action_cap,
+                               chunk_episodes=checkpoint_episodes, simulated_instr_goal=None)
 
     # Store info for next plan -> assumes we wont see the same instruction twice in one plan
     observed_states = results[0]
     instruction_results = results[1]
     # Take Instruction path now defined with reinforced+unsupervised sub-goal locations and train to these
     # Init experiment setup with sub-goal defined
-    reinforced_experiment = elsciRL_OPTIMIZE(Config=ExperimentConfig, LocalConfig=ProblemConfig, 
+    reinforced_experiment = ParallelExperiment(elsciRL_OPTIMIZE, Config=ExperimentConfig, LocalConfig=ProblemConfig, 
                     Engine=Engine, Adapters=ADAPTERS,
-                    save_dir=save_dir+'/Reinforced_Instr_Experiment', show_figures = 'No', window_size=0.1,
+                    save_dir=save_dir+'/Reinforced_Instr_Experiment', workers=num_workers, seed=seed,
+                    show_figures = 'No', window_size=0.1,
                     instruction_path=instruction_results, predicted_path=None, instruction_episode_ratio=0.05,
                     instruction_chain=True, instruction_chain_how='exact' )
     reinforced_experiment.train()
@@ -65,9 +87,9 @@ def main():
     
     # --------------------------------------------------------------------
     # Flat Baselines
-    flat = STANDARD_RL(Config=ExperimentConfig, LocalConfig=ProblemConfig, 
+    flat = ParallelExperiment(STANDARD_RL, Config=ExperimentConfig, LocalConfig=ProblemConfig, 
                 Engine=Engine, Adapters=ADAPTERS,
-                save_dir=save_dir, show_figures = 'No', window_size=0.1)
+                save_dir=save_dir, workers=num_workers, seed=seed, show_figures = 'No', window_size=0.1)
     flat.train()  
     flat.test()
     # --------------------------------------------------------------------
@@ -0,0 +1,162 @@
+# Process-pool runner for elsciRL experiments
+# - Splits an experiment's training into independent (agent, adapter, repeat) units run across a pool of
+#   worker processes, each unit is a one-repeat run of the same experiment class in its own folder
+# - Every unit is seeded from (seed, agent, adapter, repeat), so results do not depend on scheduling
+# - Unit outputs are merged into the save_dir layout of a serial run (<agent>_<adapter>__training_results_<repeat>
+#   folders plus the variance reports) so COMBINED_VARIANCE_ANALYSIS_GRAPH reads them unchanged
+# - Trained agents are gathered in the parent and tested there as in the serial run ('best' or 'all')
+import os
+import re
+import copy
+import glob
+import random
+import shutil
+import hashlib
+import numpy as np
+import pandas as pd
+import torch
+from concurrent.futures import ProcessPoolExecutor
+
+UNITS_DIR = '.units'
+TRAINING_FOLDER = re.compile(r'^(.*__training_results_(?:.*_)?)(\d+)$')
+
+
+def unit_seed(seed:int, agent:str, adapter:str, repeat:int) -> int:
+    """Deterministic 32 bit seed of a unit."""
+    digest = hashlib.blake2b(f'{seed}|{agent}|{adapter}|{repeat}'.encode(), digest_size=4).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def seed_everything(seed:int) -> None:
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
+
+def config_get(config:any, key:str, default:any=None) -> any:
+    data = config.data if hasattr(config, 'data') else config
+    return data.get(key, default)
+
+
+def unit_config(config:any, agent:str, adapter:str) -> any:
+    """Copy of the experiment config training one agent with one adapter for one repeat.
+    Works on elsciRL config objects (values in .data and as attributes) and plain dicts."""
+    config = copy.deepcopy(config)
+    values = {'agent_select': [agent], 'adapter_select': [adapter], 'adapter_input_dict': {agent: [adapter]},
+              'number_training_repeats': 1}
+    if hasattr(config, 'data'):
+        config.data.update(values)
+        for key, value in values.items():
+            setattr(config, key, value)
+    else:
+        config.update(values)
+    return config
+
+
+def unit_return(experiment_dir:str) -> float:
+    """Final cumulative reward of the unit's training run, the Return elsciRL ranks repeats by."""
+    returns = []
+    for results_path in glob.glob(os.path.join(experiment_dir, '*__training_results_*', 'results.csv')):
+        results = pd.read_csv(results_path, usecols=['cumulative_reward'])
+        if len(results) > 0:
+            returns.append(results['cumulative_reward'].iloc[-1])
+    return float(np.mean(returns)) if returns else float('-inf')
+
+
+def run_unit(experiment_class, config, local_config, engine, adapters:dict, unit_dir:str,
+             experiment_kwargs:dict, agent:str, adapter:str, repeat:int, seed:int) -> dict:
+    """Trains one (agent, adapter, repeat) unit in unit_dir, runs in the worker processes."""
+    seed_everything(seed)
+    # Positional, the local config is ProblemConfig or LocalConfig depending on the experiment class
+    experiment = experiment_class(unit_config(config, agent, adapter), local_config, engine, adapters, unit_dir,
+                                  **experiment_kwargs)
+    experiment.train()
+    return {'agent': agent, 'adapter': adapter, 'repeat': repeat,
+            'experiment_dir': os.path.relpath(experiment.save_dir, unit_dir),
+            'return': unit_return(experiment.save_dir),
+            'trained_agents': experiment.trained_agents,
+            'training_setups': experiment.training_setups}
+
+
+class ParallelExperiment:
+    def __init__(self, experiment_class, Config, LocalConfig, Engine, Adapters:dict, save_dir:str,
+                 workers:int=None, seed:int=0, **experiment_kwargs) -> None:
+        """Drop-in for an elsciRL experiment (STANDARD_RL, elsciRL_OPTIMIZE) whose training repeats run
+        in parallel. experiment_kwargs are passed to the experiment class (show_figures, window_size, ...)."""
+        self.experiment_class = experiment_class
+        self.Config = Config
+        self.LocalConfig = LocalConfig
+        self.Engine = Engine
+        self.Adapters = Adapters
+        self.save_dir = save_dir
+        self.workers = workers if workers else os.cpu_count()
+        self.seed = seed
+        self.experiment_kwargs = experiment_kwargs
+        self.experiment = None
+
+    def units(self) -> list:
+        """(agent, adapter, repeat) of every training unit, repeats numbered from 1 as in elsciRL."""
+        adapter_input_dict = config_get(self.Config, 'adapter_input_dict')
+        if not adapter_input_dict:
+            adapters = config_get(self.Config, 'adapter_select') or list(self.Adapters.keys())
+            adapter_input_dict = {agent: list(adapters) for agent in config_get(self.Config, 'agent_select', [])}
+        repeats = config_get(self.Config, 'number_training_repeats', 1)
+        return [(agent, adapter, repeat) for agent, adapters in adapter_input_dict.items()
+                for adapter in adapters for repeat in range(1, repeats+1)]
+
+    def train(self) -> dict:
+        units_dir = os.path.join(self.save_dir, UNITS_DIR)
+        jobs = []
+        for agent, adapter, repeat in self.units():
+            unit_dir = os.path.join(units_dir, f'{agent}_{adapter}_{repeat}')
+            os.makedirs(unit_dir, exist_ok=True)
+            jobs.append((self.experiment_class, self.Config, self.LocalConfig, self.Engine, self.Adapters, unit_dir,
+                         self.experiment_kwargs, agent, adapter, repeat, unit_seed(self.seed, agent, adapter, repeat)))
+        if self.workers > 1 and len(jobs) > 1:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(jobs))) as pool:
+                results = list(pool.map(run_unit, *zip(*jobs)))
+        else:
+            results = [run_unit(*job) for job in jobs]
+
+        # Experiment in the parent holds the merged agents for testing and defines the final save_dir
+        self.experiment = self.experiment_class(self.Config, self.LocalConfig, self.Engine, self.Adapters, self.save_dir,
+                                                **self.experiment_kwargs)
+        for job, result in zip(jobs, results):
+            self.merge_outputs(job[5], result)
+        self.merge_agents(results)
+        shutil.rmtree(units_dir, ignore_errors=True)
+        self.experiment.analysis.training_variance_report(self.experiment.save_dir, self.experiment.show_figures)
+        return self.experiment.training_setups
+
+    def merge_outputs(self, unit_dir:str, result:dict) -> None:
+        """Moves the unit's training folders into the experiment folder, renumbered by repeat."""
+        unit_experiment_dir = os.path.join(unit_dir, result['experiment_dir'])
+        experiment_dir = os.path.join(self.save_dir, result['experiment_dir'])
+        os.makedirs(experiment_dir, exist_ok=True)
+        for name in sorted(os.listdir(unit_experiment_dir)):
+            match = TRAINING_FOLDER.match(name)
+            if match and os.path.isdir(os.path.join(unit_experiment_dir, name)):
+                target = os.path.join(experiment_dir, match.group(1) + str(result['repeat']))
+                shutil.rmtree(target, ignore_errors=True)
+                shutil.move(os.path.join(unit_experiment_dir, name), target)
+
+    def merge_agents(self, results:list) -> None:
+        """Trained agents per (agent, adapter) and goal, all repeats' agents in repeat order (elsciRL's default) or the best repeat's agent."""
+        test_agent_type = str(config_get(self.Config, 'test_agent_type', 'all')).lower()
+        trained_agents, best_returns = {}, {}
+        for result in sorted(results, key=lambda result: result['repeat']):
+            for key, goals in result['trained_agents'].items():
+                merged = trained_agents.setdefault(key, {})
+                for goal, agent in goals.items():
+                    if test_agent_type == 'all':
+                        merged.setdefault(goal, []).extend(agent if isinstance(agent, list) else [agent])
+                    elif result['return'] > best_returns.get((key, goal), float('-inf')) or goal not in merged:
+                        best_returns[(key, goal)] = result['return']
+                        merged[goal] = agent
+            for key, setup in result['training_setups'].items():
+                self.experiment.training_setups.setdefault(key, setup)
+        self.experiment.trained_agents = trained_agents
+
+    def test(self):
+        """Tests the merged agents with the experiment's own test loop."""
+        return self.experiment.test()
@@ -0,0 +1,237 @@
+# Streaming, resumable prerender generation
+# - Stages:
+#   1. enumerate: breadth-first search of the observations reachable from Engine.reset()
+#   2. encode: describe each state with the language adapter and batch-encode it in chunks
+#   3. assemble: stream the chunks into a PrerenderStore (optionally also the legacy .pt/.txt pair)
+# - Every stage checkpoints to the work directory so an interrupted run resumes where it left off
+# - Run from the repository root:
+#   python -m prerender.generate prerender/sailing_store --obs-precision 3
+import os
+import json
+import hashlib
+import argparse
+import numpy as np
+
+from environment.engine import Engine
+from prerender.store import PrerenderStore, STORAGE_DTYPES
+
+STAGES = ['enumerate', 'encode', 'assemble', 'done']
+
+
+def class_name(cls) -> str:
+    """Module qualified name identifying an adapter or encoder (e.g. the MiniLM_L6v2 LanguageEncoder)."""
+    return f"{cls.__module__}.{cls.__qualname__}"
+
+
+class PrerenderGenerator:
+    def __init__(self, local_setup_info:dict, store_path:str, work_dir:str=None,
+                 chunk_size:int=4096, dtype:str='float32', adapter_setup_info:dict=None) -> None:
+        """Generates a prerendered store for the given local config.
+        The work directory holds:
+        - progress.json: config hash, current stage, BFS level boundaries and encoded chunk count
+        - states.tsv: one "x_angle<TAB>last action" line per enumerated state (appended per level)
+        - chunks/chunk_NNNNN.npy: float32 encodings of each chunk of states"""
+        self.local_setup_info = local_setup_info
+        self.store_path = store_path
+        self.work_dir = work_dir if work_dir else store_path.rstrip('/') + '_work'
+        self.chunk_size = chunk_size
+        self.dtype = dtype
+        self.adapter_setup_info = adapter_setup_info if adapter_setup_info else dict(local_setup_info)
+        self.states_path = os.path.join(self.work_dir, 'states.tsv')
+        self.chunk_dir = os.path.join(self.work_dir, 'chunks')
+        self.progress_path = os.path.join(self.work_dir, 'progress.json')
+        self.adapter = None
+
+    # --------------------------
+    # Checkpoints
+    def config_hash(self) -> str:
+        """Only the settings that change the output invalidate a checkpoint, including the adapter
+        writing the descriptions and the language encoder embedding them."""
+        from adapters import language
+        config = {'obs_precision': self.local_setup_info['obs_precision'],
+                  'y_limit': self.local_setup_info['y_limit'],
+                  'supervised_rewards': self.local_setup_info['supervised_rewards'],
+                  'chunk_size': self.chunk_size,
+                  'adapter': class_name(language.Adapter),
+                  'adapter_obs_precision': self.adapter_setup_info.get('obs_precision', 2),
+                  'encoder': class_name(language.LanguageEncoder)}
+        return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+
+    def load_progress(self) -> dict:
+        if os.path.exists(self.progress_path):
+            with open(self.progress_path) as f:
+                progress = json.load(f)
+            if progress['config_hash'] == self.config_hash():
+                return progress
+            print(f"Config changed since the last run, restarting {self.work_dir}")
+            self.clear()
+        os.makedirs(self.chunk_dir, exist_ok=True)
+        return {'config_hash': self.config_hash(), 'stage': 'enumerate', 'levels': [], 'num_chunks': 0}
+
+    def save_progress(self, progress:dict) -> None:
+        tmp_path = self.progress_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(progress, f)
+        os.replace(tmp_path, self.progress_path)
+
+    def clear(self) -> None:
+        for name in os.listdir(self.chunk_dir) if os.path.isdir(self.chunk_dir) else []:
+            os.remove(os.path.join(self.chunk_dir, name))
+        for path in [self.states_path, self.progress_path]:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def read_states(self, num_states:int=None) -> list:
+        """(key, last action) rows of states.tsv, truncated to the last checkpointed count."""
+        states = []
+        if os.path.exists(self.states_path):
+            with open(self.states_path) as f:
+                for line in f:
+                    if (num_states is not None) and (len(states) >= num_states):
+                        break
+                    key, action = line.rstrip('\n').split('\t')
+                    states.append((key, int(action) if action else None))
+        return states
+
+    # --------------------------
+    # Stage 1: enumerate
+    def enumerate_states(self, progress:dict) -> None:
+        """Level-by-level BFS driving Engine from each observation, checkpointed after every level.
+        Terminal observations (e.g. past the walls) are recorded but not expanded."""
+        engine = Engine(self.local_setup_info | {'history': False})
+        num_states = progress['levels'][-1][1] if progress['levels'] else 0
+        states = self.read_states(num_states)
+        # Drop any lines written after the last checkpoint
+        with open(self.states_path, 'w') as f:
+            f.writelines(key+'\t'+('' if action is None else str(action))+'\n' for key, action in states)
+        seen = set(key for key, _ in states)
+        if progress['levels']:
+            # Non-terminal states of the last completed level
+            frontier = progress['expandable']
+        else:
+            start_obs = engine.reset()
+            seen.add(start_obs)
+            with open(self.states_path, 'a') as f:
+                f.write(start_obs+'\t\n')
+            frontier = [start_obs]
+            progress['levels'].append([0, 1])
+            progress['expandable'] = frontier
+            self.save_progress(progress)
+
+        while frontier:
+            level_start = progress['levels'][-1][1]
+            new_states = []
+            expandable = []
+            for obs in frontier:
+                for action in engine.legal_move_generator(obs):
+                    engine.reset(start_obs=obs)
+                    next_obs, _, terminated, _ = engine.step(obs, action)
+                    if next_obs not in seen:
+                        seen.add(next_obs)
+                        new_states.append((next_obs, action))
+                        if not terminated:
+                            expandable.append(next_obs)
+            with open(self.states_path, 'a') as f:
+                f.writelines(key+'\t'+str(action)+'\n' for key, action in new_states)
+                f.flush()
+                os.fsync(f.fileno())
+            progress['levels'].append([level_start, level_start+len(new_states)])
+            progress['expandable'] = expandable
+            self.save_progress(progress)
+            frontier = expandable
+        progress['stage'] = 'encode'
+        progress.pop('expandable', None)
+        self.save_progress(progress)
+        print(f"Enumerated {progress['levels'][-1][1]} states in {len(progress['levels'])} levels")
+
+    # --------------------------
+    # Stage 2: describe + encode
+    def get_adapter(self):
+        if self.adapter is None:
+            from adapters.language import Adapter
+            self.adapter = Adapter(self.adapter_setup_info)
+        return self.adapter
+
+    def describe(self, key:str, action:int) -> str:
+        return self.get_adapter().adapter(key, episode_action_history=[] if action is None else [action], encode=False)
+
+    def encode_chunk(self, sentences:list) -> np.ndarray:
+        """Batch-encode the distinct sentences of a chunk that are not yet cached."""
+        adapter = self.get_adapter()
+        missing = [s for s in dict.fromkeys(sentences) if s not in adapter.embedding_cache]
+        if missing:
+            encoded = adapter.encoder.encode(state=missing)
+            for i, sentence in enumerate(missing):
+                adapter.embedding_cache.put(sentence, encoded[i:i+1])
+        return np.concatenate([adapter.embedding_cache.get(s).detach().cpu().float().numpy() for s in sentences])
+
+    def chunk_path(self, idx:int) -> str:
+        return os.path.join(self.chunk_dir, f"chunk_{idx:05d}.npy")
+
+    def encode_states(self, progress:dict) -> None:
+        num_states = progress['levels'][-1][1]
+        states = self.read_states(num_states)
+        num_chunks = (num_states + self.chunk_size - 1)//self.chunk_size
+        for idx in range(progress['num_chunks'], num_chunks):
+            chunk = states[idx*self.chunk_size:(idx+1)*self.chunk_size]
+            vectors = self.encode_chunk([self.describe(key, action) for key, action in chunk])
+            tmp_path = self.chunk_path(idx) + '.tmp.npy'
+            np.save(tmp_path, vectors.astype(np.float32))
+            os.replace(tmp_path, self.chunk_path(idx))
+            progress['num_chunks'] = idx + 1
+            self.save_progress(progress)
+            print(f"Encoded chunk {idx+1}/{num_chunks}")
+        progress['stage'] = 'assemble'
+        self.save_progress(progress)
+
+    # --------------------------
+    # Stage 3: assemble
+    def assemble(self, progress:dict) -> PrerenderStore:
+        num_states = progress['levels'][-1][1]
+        states = self.read_states(num_states)
+        keys = [key for key, _ in states]
+        descriptions = [self.describe(key, action) for key, action in states]
+        chunks = (np.load(self.chunk_path(idx), mmap_mode='r') for idx in range(progress['num_chunks']))
+        dim = np.load(self.chunk_path(0), mmap_mode='r').shape[1]
+        store = PrerenderStore.write_chunks(self.store_path, keys, descriptions, chunks, dim, dtype=self.dtype)
+        progress['stage'] = 'done'
+        self.save_progress(progress)
+        return store
+
+    def run(self) -> PrerenderStore:
+        progress = self.load_progress()
+        if progress['stage'] == 'enumerate':
+            self.enumerate_states(progress)
+        if progress['stage'] == 'encode':
+            self.encode_states(progress)
+        if progress['stage'] == 'assemble':
+            return self.assemble(progress)
+        return PrerenderStore(self.store_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a prerendered state embedding store")
+    parser.add_argument('store_path')
+    parser.add_argument('--config', default='./configs/config_local.json')
+    parser.add_argument('--obs-precision', type=int, default=None, help="Override obs_precision from the config")
+    parser.add_argument('--work-dir', default=None)
+    parser.add_argument('--chunk-size', type=int, default=4096)
+    parser.add_argument('--dtype', default='float32', choices=STORAGE_DTYPES)
+    parser.add_argument('--legacy-pt', default=None, help="Also write an encoded_observed_states.pt file")
+    parser.add_argument('--legacy-txt', default=None, help="Also write an observed_states.txt file")
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        local_setup_info = json.load(f)
+    if args.obs_precision is not None:
+        local_setup_info['obs_precision'] = args.obs_precision
+    generator = PrerenderGenerator(local_setup_info, args.store_path, work_dir=args.work_dir,
+                                   chunk_size=args.chunk_size, dtype=args.dtype)
+    store = generator.run()
+    print(f"Store {args.store_path}: {len(store)} states, {store.dtype}")
+    if args.legacy_pt and args.legacy_txt:
+        store.export_legacy(args.legacy_pt, args.legacy_txt)
+
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,178 @@
+# Top-k cosine similarity index over prerendered state embeddings
+# - Vectors are normalized once when the index is built, each query is then a blocked matrix multiply
+#   over the (N, D) matrix keeping a running top-k, so memory stays bounded by block_rows as N grows
+# - Queries are batched: (Q, D) instruction sentence vectors are scored against every block at once
+# - An optional feedback layer per query gives the similarity used by elsciRL_SEARCH,
+#   cos(state + feedback, instruction), computed exactly from the normalized vectors and row norms
+# - Approximate mode (build_clusters) is an inverted file index: spherical k-means clusters of the states,
+#   a query only scores the states of its nprobe most similar clusters. recall() reports its recall
+#   against the exact search
+import json
+import numpy as np
+
+from prerender.store import PrerenderStore
+
+EPS = 1e-8
+
+
+class SimilarityIndex:
+    def __init__(self, vectors:np.ndarray, keys:list=None, block_rows:int=65536) -> None:
+        """Index of (N, D) state embeddings, keys are the "x_angle" state keys of the rows."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.norms = np.linalg.norm(vectors, axis=1)
+        self.normalized = vectors/np.maximum(self.norms, EPS)[:, None]
+        self.keys = list(keys) if keys is not None else list(range(len(vectors)))
+        if len(self.keys) != len(vectors):
+            raise ValueError("keys and vectors must have the same number of rows")
+        self.block_rows = block_rows
+        self.centroids = None
+        self.cluster_rows = None
+
+    def __len__(self) -> int:
+        return len(self.normalized)
+
+    @classmethod
+    def from_store(cls, path:str, **kwargs):
+        """Index of a PrerenderStore (prerender/store.py)."""
+        store = PrerenderStore(path)
+        return cls(store.vectors(), [str(key) for key in store.keys], **kwargs)
+
+    @classmethod
+    def from_legacy(cls, pt_path:str, txt_path:str, **kwargs):
+        """Index of an encoded_observed_states.pt / observed_states.txt pair."""
+        import torch
+        encoded = torch.load(pt_path, map_location='cpu')
+        with open(txt_path) as f:
+            observed_states = json.load(f)
+        return cls(encoded.float().numpy(), list(observed_states.keys()), **kwargs)
+
+    # --------------------------
+    # Exact search
+    def block_scores(self, start:int, stop:int, queries:np.ndarray, feedback:np.ndarray=None) -> np.ndarray:
+        """(stop-start, Q) cosine similarities of rows start:stop to the queries.
+        queries are unit vectors, feedback (Q, D) is added to the states before the cosine."""
+        normalized = self.normalized[start:stop]
+        scores = normalized @ queries.T
+        if feedback is None:
+            return scores
+        # cos(s+f, q) = (s.q + f.q)/(|s+f||q|), |s+f|^2 = |s|^2 + 2 s.f + |f|^2 with s = norm*normalized
+        norms = self.norms[start:stop, None]
+        state_feedback = normalized @ feedback.T
+        feedback_query = np.einsum('qd,qd->q', feedback, queries)
+        feedback_norms = np.einsum('qd,qd->q', feedback, feedback)
+        lengths = np.sqrt(np.maximum(norms**2 + 2*norms*state_feedback + feedback_norms, 0))
+        return (norms*scores + feedback_query)/np.maximum(lengths, EPS)
+
+    def scores(self, queries:np.ndarray, feedback:np.ndarray=None) -> np.ndarray:
+        """(Q, N) similarity of every state to every query."""
+        queries, feedback = self.prepare(queries, feedback)
+        return np.concatenate([self.block_scores(start, min(start + self.block_rows, len(self)), queries, feedback)
+                               for start in range(0, len(self), self.block_rows)], axis=0).T
+
+    def search(self, queries:np.ndarray, k:int=1, feedback:np.ndarray=None, nprobe:int=None) -> tuple:
+        """(scores, rows), both (Q, k) and sorted by descending similarity, of the k states most similar to
+        each query. nprobe uses the approximate index (build_clusters first), only without feedback."""
+        if nprobe is not None:
+            if feedback is not None:
+                raise ValueError("Approximate search does not support feedback layers")
+            return self.search_approximate(queries, k, nprobe)
+        queries, feedback = self.prepare(queries, feedback)
+        k = min(k, len(self))
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        for start in range(0, len(self), self.block_rows):
+            stop = min(start + self.block_rows, len(self))
+            scores = self.block_scores(start, stop, queries, feedback).T
+            rows = np.broadcast_to(np.arange(start, stop), scores.shape)
+            best_scores, best_rows = top_k(np.concatenate([best_scores, scores], axis=1),
+                                           np.concatenate([best_rows, rows], axis=1), k)
+        return best_scores, best_rows
+
+    def match(self, instruction_vector:np.ndarray, feedback_layer:np.ndarray=None, k:int=1,
+              threshold:float=None) -> tuple:
+        """elsciRL_SEARCH's match of one instruction, the mean similarity over its sentences
+        ((S, D) instruction_vector, feedback_layer). Returns (keys, scores) of the k best states, or of
+        every state scoring at least threshold if given."""
+        scores = self.scores(instruction_vector, feedback_layer).mean(axis=0)
+        if threshold is not None:
+            rows = np.flatnonzero(scores >= threshold)
+            rows = rows[np.argsort(-scores[rows], kind='stable')]
+        else:
+            rows = top_k(scores[None, :], np.arange(len(scores))[None, :], min(k, len(scores)))[1][0]
+        return [self.keys[row] for row in rows], scores[rows]
+
+    def prepare(self, queries:np.ndarray, feedback:np.ndarray=None) -> tuple:
+        """(Q, D) float32 unit queries and matching (Q, D) feedback layers (accepts torch tensors and 1-D vectors)."""
+        queries = as_matrix(queries)
+        queries = queries/np.maximum(np.linalg.norm(queries, axis=1), EPS)[:, None]
+        if feedback is not None:
+            feedback = np.broadcast_to(as_matrix(feedback), queries.shape)
+        return queries, feedback
+
+    # --------------------------
+    # Approximate search
+    def build_clusters(self, num_clusters:int=None, iterations:int=10, sample:int=None, seed:int=0) -> None:
+        """Spherical k-means clusters of the states (default sqrt(N) clusters), trained on a sample of
+        up to 64 states per cluster. Every state is then assigned to its most similar centroid."""
+        rng = np.random.default_rng(seed)
+        num_clusters = min(num_clusters or max(1, int(np.sqrt(len(self)))), len(self))
+        sample = min(sample or 64*num_clusters, len(self))
+        training = self.normalized[rng.choice(len(self), sample, replace=False)]
+        centroids = training[rng.choice(sample, num_clusters, replace=False)]
+        for _ in range(iterations):
+            assignment = np.argmax(training @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, training)
+            counts = np.bincount(assignment, minlength=num_clusters)
+            # Empty clusters keep their centroid
+            sums[counts == 0] = centroids[counts == 0]
+            centroids = sums/np.maximum(np.linalg.norm(sums, axis=1), EPS)[:, None]
+        assignment = np.concatenate([np.argmax(self.normalized[start:start + self.block_rows] @ centroids.T, axis=1)
+                                     for start in range(0, len(self), self.block_rows)])
+        order = np.argsort(assignment, kind='stable')
+        offsets = np.searchsorted(assignment[order], np.arange(num_clusters + 1))
+        self.centroids = centroids.astype(np.float32)
+        self.cluster_rows = [order[offsets[c]:offsets[c + 1]] for c in range(num_clusters)]
+
+    def search_approximate(self, queries:np.ndarray, k:int=1, nprobe:int=8) -> tuple:
+        """(scores, rows) as search(), scoring only the states of the nprobe clusters nearest to each query.
+        Rows not found are -1 with score -inf."""
+        if self.centroids is None:
+            self.build_clusters()
+        queries, _ = self.prepare(queries)
+        nprobe = min(nprobe, len(self.centroids))
+        probes = np.argpartition(-(queries @ self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+        best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        best_rows = np.full((len(queries), k), -1, dtype=np.int64)
+        for i, query in enumerate(queries):
+            rows = np.concatenate([self.cluster_rows[c] for c in probes[i]])
+            scores = self.normalized[rows] @ query
+            found = min(k, len(rows))
+            best_scores[i, :found], best_rows[i, :found] = [a[0] for a in top_k(scores[None, :], rows[None, :], found)]
+        return best_scores, best_rows
+
+    def recall(self, queries:np.ndarray, k:int=10, nprobe:int=8) -> float:
+        """Mean fraction of the exact top-k the approximate search finds. Many states share a description
+        (and embedding), so results are compared by score: a returned state counts if it scores at least
+        the exact k-th best."""
+        exact_scores = self.search(queries, k)[0]
+        approximate_scores = self.search_approximate(queries, k, nprobe)[0]
+        found = approximate_scores >= exact_scores[:, -1:] - 1e-6
+        return float(found.mean())
+
+
+def as_matrix(vectors) -> np.ndarray:
+    if hasattr(vectors, 'detach'):
+        vectors = vectors.detach().cpu().numpy()
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors.reshape(-1, vectors.shape[-1])
+
+
+def top_k(scores:np.ndarray, rows:np.ndarray, k:int) -> tuple:
+    """k best (scores, rows) of each row of a (Q, M) score matrix, sorted by descending score."""
+    if scores.shape[1] > k:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(scores, part, axis=1)
+        rows = np.take_along_axis(rows, part, axis=1)
+    order = np.argsort(-scores, axis=1, kind='stable')
+    return np.take_along_axis(scores, order, axis=1), np.take_along_axis(rows, order, axis=1)
@@ -0,0 +1,217 @@
+# Memory-mapped prerendered state embedding store
+# - Replaces the encoded_observed_states.pt torch pickle + observed_states.txt JSON pair
+# - Directory layout:
+#   - meta.json: format version, storage dtype, shape and list of distinct descriptions
+#   - embeddings.npy: contiguous (N, D) float32/float16/int8 matrix, opened with numpy.memmap
+#   - scales.npy: per-row float32 scale (int8 storage only)
+#   - keys.npy: fixed-width "x_angle" state key of each row (the offset index)
+#   - description_idx.npy: row -> index into meta.json descriptions
+# - Run from the repository root:
+#   python -m prerender.store import prerender/encoded_observed_states.pt prerender/observed_states.txt prerender/sailing_store --dtype float16
+import os
+import json
+import argparse
+import numpy as np
+
+FORMAT_VERSION = 1
+STORAGE_DTYPES = ['float32', 'float16', 'int8']
+
+
+class PrerenderStore:
+    def __init__(self, path:str) -> None:
+        """Read-only view of a prerendered store, all arrays are memory-mapped on first access
+        so loading is near-instant and worker processes share the same pages."""
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as f:
+            self.meta = json.load(f)
+        if self.meta['format_version'] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported prerender store version {self.meta['format_version']}")
+        self.dtype = self.meta['dtype']
+        self.shape = tuple(self.meta['shape'])
+        self.descriptions = self.meta['descriptions']
+        self._embeddings = None
+        self._scales = None
+        self._keys = None
+        self._description_idx = None
+        self._rows = None
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    # --------------------------
+    # Lazily memory-mapped arrays
+    def _load(self, name:str) -> np.ndarray:
+        return np.load(os.path.join(self.path, name), mmap_mode='r')
+
+    @property
+    def embeddings(self) -> np.memmap:
+        """Raw stored matrix (quantized for float16/int8 storage)."""
+        if self._embeddings is None:
+            self._embeddings = self._load('embeddings.npy')
+        return self._embeddings
+
+    @property
+    def scales(self) -> np.memmap:
+        if self._scales is None:
+            self._scales = self._load('scales.npy')
+        return self._scales
+
+    @property
+    def keys(self) -> np.memmap:
+        if self._keys is None:
+            self._keys = self._load('keys.npy')
+        return self._keys
+
+    @property
+    def description_idx(self) -> np.memmap:
+        if self._description_idx is None:
+            self._description_idx = self._load('description_idx.npy')
+        return self._description_idx
+
+    # --------------------------
+    # Lookups
+    def row(self, key:str) -> int:
+        """Row of an "x_angle" state key, -1 if it was not prerendered."""
+        if self._rows is None:
+            self._rows = {str(k): i for i, k in enumerate(self.keys)}
+        return self._rows.get(key, -1)
+
+    def vectors(self, rows=None) -> np.ndarray:
+        """float32 embeddings of the given rows (all rows if None)."""
+        rows = slice(None) if rows is None else rows
+        vectors = np.asarray(self.embeddings[rows], dtype=np.float32)
+        if self.dtype == 'int8':
+            vectors = vectors*np.asarray(self.scales[rows], dtype=np.float32)[..., None]
+        return vectors
+
+    def vector(self, key:str) -> np.ndarray:
+        row = self.row(key)
+        if row < 0:
+            raise KeyError(key)
+        return self.vectors(row)
+
+    def description(self, key:str) -> str:
+        row = self.row(key)
+        if row < 0:
+            raise KeyError(key)
+        return self.descriptions[self.description_idx[row]]
+
+    def observed_states(self) -> dict:
+        """State key -> language description dict, as stored in observed_states.txt."""
+        return {str(k): self.descriptions[i] for k, i in zip(self.keys, self.description_idx)}
+
+    # --------------------------
+    # Writing
+    @staticmethod
+    def quantize(vectors:np.ndarray, dtype:str):
+        """Returns (stored matrix, per-row scales or None)."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if dtype == 'float32':
+            return vectors, None
+        if dtype == 'float16':
+            return vectors.astype(np.float16), None
+        if dtype == 'int8':
+            scales = np.abs(vectors).max(axis=1)/127
+            scales[scales == 0] = 1
+            return np.round(vectors/scales[:, None]).astype(np.int8), scales.astype(np.float32)
+        raise ValueError(f"dtype must be one of {STORAGE_DTYPES}, got {dtype}")
+
+    @staticmethod
+    def write(path:str, keys:list, descriptions:list, vectors:np.ndarray, dtype:str='float32'):
+        """Write a complete store from in-memory keys, per-row descriptions and (N, D) vectors."""
+        if len(keys) != len(vectors):
+            raise ValueError("keys and vectors must have the same number of rows")
+        return PrerenderStore.write_chunks(path, keys, descriptions, [vectors], np.shape(vectors)[1], dtype=dtype)
+
+    @staticmethod
+    def write_chunks(path:str, keys:list, descriptions:list, chunks, dim:int, dtype:str='float32'):
+        """Write a store from an iterable of (n_i, dim) float chunks in row order.
+        Only one chunk is held in memory at a time, rows are written straight into the memmap."""
+        if len(keys) != len(descriptions):
+            raise ValueError("keys and descriptions must have the same number of rows")
+        if dtype not in STORAGE_DTYPES:
+            raise ValueError(f"dtype must be one of {STORAGE_DTYPES}, got {dtype}")
+        os.makedirs(path, exist_ok=True)
+        # Remove the old meta.json first so a partially rewritten store is never opened
+        if os.path.exists(os.path.join(path, 'meta.json')):
+            os.remove(os.path.join(path, 'meta.json'))
+        num_rows = len(keys)
+        embeddings = np.lib.format.open_memmap(os.path.join(path, 'embeddings.npy'), mode='w+',
+                                               dtype=np.dtype(dtype), shape=(num_rows, dim))
+        scales = None
+        if dtype == 'int8':
+            scales = np.lib.format.open_memmap(os.path.join(path, 'scales.npy'), mode='w+',
+                                               dtype=np.float32, shape=(num_rows,))
+        row = 0
+        for chunk in chunks:
+            stored, chunk_scales = PrerenderStore.quantize(chunk, dtype)
+            if row + len(stored) > num_rows:
+                raise ValueError(f"chunks contain more than the {num_rows} rows given by keys")
+            embeddings[row:row+len(stored)] = stored
+            if scales is not None:
+                scales[row:row+len(stored)] = chunk_scales
+            row += len(stored)
+        if row != num_rows:
+            raise ValueError(f"chunks contain {row} rows but {num_rows} keys were given")
+        embeddings.flush()
+        del embeddings
+        if scales is not None:
+            scales.flush()
+            del scales
+        np.save(os.path.join(path, 'keys.npy'), np.array(keys, dtype=str))
+        distinct = list(dict.fromkeys(descriptions))
+        lookup = {d: i for i, d in enumerate(distinct)}
+        np.save(os.path.join(path, 'description_idx.npy'), np.array([lookup[d] for d in descriptions], dtype=np.int32))
+        # meta.json last so a partially written store is never opened
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'format_version': FORMAT_VERSION, 'dtype': dtype,
+                       'shape': [num_rows, dim], 'descriptions': distinct}, f)
+        return PrerenderStore(path)
+
+    # --------------------------
+    # Legacy .pt/.txt conversion
+    @staticmethod
+    def import_legacy(pt_path:str, txt_path:str, path:str, dtype:str='float32'):
+        """Convert an encoded_observed_states.pt / observed_states.txt pair.
+        Row i of the tensor is the encoding of the i-th key of the JSON dict."""
+        import torch
+        encoded = torch.load(pt_path, map_location='cpu')
+        with open(txt_path) as f:
+            observed_states = json.load(f)
+        if encoded.shape[0] != len(observed_states):
+            raise ValueError(f"{pt_path} has {encoded.shape[0]} rows but {txt_path} has {len(observed_states)} states")
+        return PrerenderStore.write(path, list(observed_states.keys()), list(observed_states.values()),
+                                    encoded.float().numpy(), dtype=dtype)
+
+    def export_legacy(self, pt_path:str, txt_path:str) -> None:
+        """Write the store back out as the .pt/.txt pair read by elsciRL."""
+        import torch
+        torch.save(torch.from_numpy(np.array(self.vectors())), pt_path)
+        with open(txt_path, 'w') as f:
+            json.dump(self.observed_states(), f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory-mapped prerender store tools")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    import_parser = subparsers.add_parser('import', help="Convert a legacy .pt/.txt pair to a store")
+    import_parser.add_argument('pt_path')
+    import_parser.add_argument('txt_path')
+    import_parser.add_argument('store_path')
+    import_parser.add_argument('--dtype', default='float32', choices=STORAGE_DTYPES)
+    export_parser = subparsers.add_parser('export', help="Convert a store back to a legacy .pt/.txt pair")
+    export_parser.add_argument('store_path')
+    export_parser.add_argument('pt_path')
+    export_parser.add_argument('txt_path')
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        store = PrerenderStore.import_legacy(args.pt_path, args.txt_path, args.store_path, dtype=args.dtype)
+        print(f"Wrote {len(store)} states ({store.dtype}) to {args.store_path}")
+    else:
+        PrerenderStore(args.store_path).export_legacy(args.pt_path, args.txt_path)
+        print(f"Wrote {args.pt_path} and {args.txt_path}")
+
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,217 @@
+# Checkpointed, resumable elsciRL instruction search
+# - The exploration episodes run in chunks, the observed states (and exploring agent) are saved after each chunk
+# - Plans run one at a time, the instruction results are saved after each plan
+# - Checkpoint files follow the repo's existing formats:
+#   - observed_states.txt: JSON {engine observation: adapted description}, as prerender/observed_states.txt
+#   - instruction_results.json: JSON instruction results with feedback layers as nested lists, as instructions/
+#   - meta.json: config hash, exploration episodes and plans completed
+#   - explore_agent.pkl: exploring agent, so resumed exploration continues learning
+# - A checkpoint is only resumed if its config hash matches the current configs and search parameters,
+#   otherwise its files are removed before the new search writes any
+import os
+import json
+import pickle
+import hashlib
+import torch
+from matplotlib.figure import Figure
+
+from elsciRL.instruction_following.elsciRL_instruction_search import AGENT_TYPES
+
+FORMAT_VERSION = 1
+CHECKPOINT_FILES = ['meta.json', 'observed_states.txt', 'instruction_results.json', 'explore_agent.pkl']
+
+
+def config_data(config:any) -> dict:
+    return config.data if hasattr(config, 'data') else config
+
+
+def config_hash(*parts) -> str:
+    """sha256 of the canonical JSON of the configs and parameters that decide the search results."""
+    text = json.dumps([config_data(part) for part in parts], sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def write_atomic(path:str, write) -> None:
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as file:
+        write(file)
+    os.replace(tmp_path, path)
+
+
+def instruction_results_to_json(instruction_results:dict) -> dict:
+    """Tensors (feedback layers) to nested lists."""
+    if isinstance(instruction_results, dict):
+        return {key: instruction_results_to_json(value) for key, value in instruction_results.items()}
+    if isinstance(instruction_results, torch.Tensor):
+        return instruction_results.detach().cpu().tolist()
+    return instruction_results
+
+
+def instruction_results_from_json(instruction_results:dict) -> dict:
+    """Feedback layers back to the float32 tensors the search updates in place."""
+    results = {}
+    for key, value in instruction_results.items():
+        if isinstance(value, dict):
+            results[key] = instruction_results_from_json(value)
+        elif key == 'feedback_layer':
+            results[key] = torch.tensor(value, dtype=torch.float32)
+        else:
+            results[key] = value
+    return results
+
+
+class SearchCheckpoint:
+    def __init__(self, path:str, config_hash:str) -> None:
+        """Checkpoint folder of one search, only valid for the configs that produced config_hash."""
+        self.path = path
+        self.config_hash = config_hash
+        self.meta = {'format_version': FORMAT_VERSION, 'config_hash': config_hash,
+                     'exploration_episodes': 0, 'plans': 0}
+        self.observed_states = {}
+        self.instruction_results = {}
+        self.feedback_results = {}
+        self.agent = None
+
+    def load(self) -> bool:
+        """Loads the latest checkpoint if it matches the config hash, returns whether it did."""
+        meta_path = os.path.join(self.path, 'meta.json')
+        if not os.path.exists(meta_path):
+            return False
+        with open(meta_path) as file:
+            meta = json.load(file)
+        if (meta.get('format_version') != FORMAT_VERSION) or (meta.get('config_hash') != self.config_hash):
+            print(f"Search checkpoint {self.path} was made with different configs, starting a new search.")
+            self.clear()
+            return False
+        self.meta = meta
+        with open(os.path.join(self.path, 'observed_states.txt')) as file:
+            self.observed_states = json.load(file)
+        results_path = os.path.join(self.path, 'instruction_results.json')
+        # Only results of completed plans, a file without any is left over from an interrupted save
+        if meta['plans'] > 0 and os.path.exists(results_path):
+            with open(results_path) as file:
+                checkpoint = json.load(file)
+            self.instruction_results = instruction_results_from_json(checkpoint['instruction_results'])
+            self.feedback_results = {agent_adapter: {int(plan): counts for plan, counts in plans.items()}
+                                     for agent_adapter, plans in checkpoint['feedback_results'].items()}
+        agent_path = os.path.join(self.path, 'explore_agent.pkl')
+        if os.path.exists(agent_path):
+            with open(agent_path, 'rb') as file:
+                self.agent = pickle.load(file)
+        return True
+
+    def clear(self) -> None:
+        """Removes the checkpoint files, so files of a previous search are never mixed into this one."""
+        for name in CHECKPOINT_FILES:
+            for path in [os.path.join(self.path, name), os.path.join(self.path, name + '.tmp')]:
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def save_meta(self) -> None:
+        write_atomic(os.path.join(self.path, 'meta.json'), lambda file: file.write(json.dumps(self.meta, indent=2).encode()))
+
+    def save_exploration(self, observed_states:dict, agent:any, episodes:int) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        self.observed_states = observed_states
+        write_atomic(os.path.join(self.path, 'observed_states.txt'),
+                     lambda file: file.write(json.dumps(observed_states).encode()))
+        try:
+            write_atomic(os.path.join(self.path, 'explore_agent.pkl'), lambda file: pickle.dump(agent, file))
+        except (pickle.PicklingError, TypeError, AttributeError):
+            # Resumed exploration then continues with a fresh agent, not one from an earlier chunk
+            for path in [os.path.join(self.path, 'explore_agent.pkl'), os.path.join(self.path, 'explore_agent.pkl.tmp')]:
+                if os.path.exists(path):
+                    os.remove(path)
+        self.meta['exploration_episodes'] = episodes
+        self.save_meta()
+
+    def save_plan(self, observed_states:dict, instruction_results:dict, feedback_results:dict, plans:int) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        self.observed_states = observed_states
+        write_atomic(os.path.join(self.path, 'observed_states.txt'),
+                     lambda file: file.write(json.dumps(observed_states).encode()))
+        checkpoint = {'instruction_results': instruction_results_to_json(instruction_results),
+                      'feedback_results': feedback_results}
+        write_atomic(os.path.join(self.path, 'instruction_results.json'),
+                     lambda file: file.write(json.dumps(checkpoint, indent=4).encode()))
+        self.meta['plans'] = plans
+        self.save_meta()
+
+
+def explore(search_agent, checkpoint:SearchCheckpoint, action_cap:int, chunk_episodes:int) -> dict:
+    """The search's exploration run (first agent and adapter) in chunks of chunk_episodes, continuing
+    from the checkpoint. The agent and observed states are carried over between chunks."""
+    setup_info = search_agent.setup_info
+    agent_type = setup_info['agent_select'][0]
+    adapter = setup_info['adapter_select'][0]
+    agent_parameters = setup_info['agent_parameters'][agent_type]
+    train_setup_info = setup_info.copy()
+    train_setup_info.update({'training_action_cap': action_cap, 'agent_type': agent_type,
+                             'agent_name': f'{agent_type}_{adapter}_{agent_parameters}', 'adapter_select': adapter,
+                             'train': True, 'training_results': False, 'experience_sampling': False,
+                             'live_env': True, 'sub_goal': None})
+    agent = checkpoint.agent if checkpoint.agent is not None else AGENT_TYPES[agent_type](**agent_parameters)
+    observed_states = checkpoint.observed_states
+    episodes = checkpoint.meta['exploration_episodes']
+    total = search_agent.number_exploration_episodes
+    while episodes < total:
+        chunk = min(chunk_episodes, total - episodes)
+        train_setup_info['number_training_episodes'] = chunk
+        train_setup_info['agent'] = agent
+        train_setup_info['observed_states'] = observed_states if observed_states else False
+        live_env = search_agent.env(Engine=search_agent.engine, Adapters=search_agent.adapters,
+                                    local_setup_info=train_setup_info)
+        live_env.episode_loop()
+        agent = live_env.agent
+        observed_states = live_env.elsciRL.observed_states
+        episodes += chunk
+        checkpoint.save_exploration(observed_states, agent, episodes)
+        print(f"Search checkpoint: {episodes}/{total} exploration episodes, {len(observed_states)} observed states")
+    return observed_states
+
+
+def plot_feedback(search_agent) -> None:
+    """reinforcement_results.png of search() over every plan, search() itself only sees the current one."""
+    figure = Figure()
+    ax = figure.add_subplot(1, 1, 1)
+    for agent_adapter, plans in search_agent.feedback_results.items():
+        plan_numbers = sorted(plans)
+        ax.plot(plan_numbers, [plans[plan]['feedback_count']/plans[plan]['instr_count'] for plan in plan_numbers],
+                label='Num Searches')
+    ax.set_title('Amount of Feedback for each Instruction by Plan')
+    ax.set_ylabel('Feedback Needed per Instr')
+    ax.set_xlabel('Plan Number')
+    figure.tight_layout()
+    figure.savefig(search_agent.save_dir+'/reinforcement_results.png', dpi=100)
+
+
+def resumable_search(search_agent, checkpoint_path:str, config_hash:str, action_cap:int=5,
+                     chunk_episodes:int=5000, simulated_instr_goal:any=None) -> tuple:
+    """Runs search_agent.search (elsciRL_SEARCH) with checkpoints, resuming from checkpoint_path if its
+    config hash matches. Returns (observed_states, instruction_results) as search() does."""
+    checkpoint = SearchCheckpoint(checkpoint_path, config_hash)
+    if checkpoint.load():
+        print(f"Resuming search from {checkpoint_path}: {checkpoint.meta['exploration_episodes']} exploration "
+              f"episodes and {checkpoint.meta['plans']} plans done")
+    search_agent.observed_states = explore(search_agent, checkpoint, action_cap, chunk_episodes)
+    search_agent.instruction_results = checkpoint.instruction_results
+    search_agent.feedback_results = checkpoint.feedback_results
+
+    num_plans = search_agent.num_plans
+    search_agent.num_plans = 1
+    results = (search_agent.observed_states, search_agent.instruction_results)
+    for plan in range(checkpoint.meta['plans'], num_plans):
+        # search() numbers its plans from 0, earlier plans are set aside so this one is logged as plan
+        earlier = {agent_adapter: plans for agent_adapter, plans in search_agent.feedback_results.items()}
+        search_agent.feedback_results = {}
+        results = search_agent.search(action_cap=action_cap, re_search_override=False,
+                                      simulated_instr_goal=simulated_instr_goal)
+        for agent_adapter, plans in search_agent.feedback_results.items():
+            earlier.setdefault(agent_adapter, {})[plan] = plans[0]
+        search_agent.feedback_results = earlier
+        checkpoint.save_plan(search_agent.observed_states, search_agent.instruction_results,
+                             search_agent.feedback_results, plan + 1)
+    search_agent.num_plans = num_plans
+    if search_agent.feedback_results:
+        plot_feedback(search_agent)
+    return results